@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency benchmark of inverse search
+Usage: python bench_inverse.py [--nvim nvim] [--repeat 20] [--output result.json]
+
+It starts headless neovim with --listen and runs InverseSearch.py like pdf viewer does.
+Each call is checked that the cursor of neovim is moved to the requested line.
+The result is printed as json.
+    process : latency of InverseSearch.py as new process (python startup + import + rpc)
+    inprocess : latency of ServerManager + Commands.jump_to_line without python startup
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+bench_dir = Path(__file__).resolve().parent
+rplugin_dir = bench_dir.parent / 'rplugin' / 'python3'
+sys.path.insert(0, str(rplugin_dir))
+
+
+def get_servername(tmp:str) -> str:
+    """ get servername which is recognized as full servername by ServerManager.is_fullservername() """
+    if sys.platform == 'win32':
+        return rf'\\.\pipe\nvim.{os.getpid()}.0'
+    return os.path.join(tmp, f'nvim.{os.getpid()}.0')
+
+
+def start_nvim(nvim:str, servername:str, timeout:float=10) -> subprocess.Popen[bytes]:
+    """ start headless neovim and wait until the server is ready """
+    proc = subprocess.Popen([nvim, '--clean', '--headless', '--listen', servername],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    import pynvim
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            pynvim.attach('socket', path=servername).close()
+            return proc
+        except Exception:
+            if time.perf_counter() > deadline or proc.poll() is not None:
+                proc.kill()
+                raise RuntimeError('cannot start neovim server : ' + servername)
+            time.sleep(0.05)
+
+
+def summary(times:list[float]) -> dict[str, float]:
+    """ get statistics of latency in milliseconds """
+    times = sorted(t * 1000 for t in times)
+    return {
+        'min_ms': round(times[0], 2),
+        'median_ms': round(statistics.median(times), 2),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))], 2),
+        'max_ms': round(times[-1], 2),
+    }
+
+
+def bench_process(texfile:str, servername:str, repeat:int, env:dict[str, str]) -> tuple[list[float], int]:
+    """ run InverseSearch.py as external command, return latencies and the number of wrong jumps """
+    import pynvim
+    times:list[float] = []
+    wrong = 0
+    with pynvim.attach('socket', path=servername) as nvim:
+        for i in range(repeat):
+            line = i % 400 + 1
+            start = time.perf_counter()
+            _ = subprocess.run([sys.executable, str(rplugin_dir / 'InverseSearch.py'), texfile, str(line), servername],
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+            times.append(time.perf_counter() - start)
+            if nvim.current.window.cursor[0] != line:
+                wrong += 1
+    return times, wrong
+
+
+def bench_inprocess(texfile:str, servername:str, repeat:int) -> tuple[list[float], int]:
+    """ call jump_to_line in this process, return latencies and the number of wrong jumps """
+    import pynvim
+    from utils.commands import Commands
+    from utils.server import ServerManager
+    times:list[float] = []
+    wrong = 0
+    with pynvim.attach('socket', path=servername) as nvim:
+        for i in range(repeat):
+            line = (i * 7) % 400 + 1
+            start = time.perf_counter()
+            mg = ServerManager(None, servername)
+            Commands(mg.nvim).jump_to_line(texfile, line)
+            mg.nvim.close()
+            times.append(time.perf_counter() - start)
+            if nvim.current.window.cursor[0] != line:
+                wrong += 1
+    return times, wrong
+
+
+def get_args() -> argparse.Namespace:
+    """ parse command line arguments """
+    parser = argparse.ArgumentParser(prog='bench_inverse', description='latency benchmark of inverse search')
+    _ = parser.add_argument('--nvim', default='nvim', help='neovim executable')
+    _ = parser.add_argument('--repeat', type=int, default=20, help='the number of inverse search calls')
+    _ = parser.add_argument('--output', default=None, help='write result json to file instead of stdout')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    nvim = shutil.which(args.nvim)
+    if nvim is None:
+        print(f'cannot find neovim executable : {args.nvim}', file=sys.stderr)
+        sys.exit(2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # isolate server file of texflow from user data
+        env = dict(os.environ, XDG_DATA_HOME=tmp, PYTHONIOENCODING='utf-8')
+        os.environ['XDG_DATA_HOME'] = tmp
+
+        texfile = os.path.join(tmp, 'main.tex')
+        with open(texfile, 'w', encoding='utf-8') as f:
+            _ = f.write(''.join(f'line {i} of document\n' for i in range(1, 501)))
+
+        servername = get_servername(tmp)
+        proc = start_nvim(nvim, servername)
+        try:
+            process_times, process_wrong = bench_process(texfile, servername, args.repeat, env)
+            inprocess_times, inprocess_wrong = bench_inprocess(texfile, servername, args.repeat)
+        finally:
+            proc.kill()
+            _ = proc.wait()
+
+    result:dict[str, Any] = {
+        'python': platform.python_version(),
+        'platform': sys.platform,
+        'repeat': args.repeat,
+        'process': dict(summary(process_times), wrong=process_wrong),
+        'inprocess': dict(summary(inprocess_times), wrong=inprocess_wrong),
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            _ = f.write(text + '\n')
+    else:
+        print(text)
+
+    if process_wrong or inprocess_wrong:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Benchmark and golden output check of log parser
+Usage: python bench_parse.py [--size 5M] [--repeat 5] [--output result.json] [--compare baseline.json]
+       python bench_parse.py --update-golden
+
+1) golden : parse logs (*.log, *.blg, *.ilg) in bench/corpus with every engine and compare with <name>.jsonl
+             logs are also wrapped at 79 like TeX does, and parsed with unwrap to get the same output.
+             logs as they are written are parsed with unwrap too, nothing must be joined wrongly.
+             logs are also converted to CRLF (log of Windows), they must give the same output.
+             include graph of small project is checked, commands like \\includegraphics are not included files.
+2) timing : parse synthetic log which is made by loggen.py and report time / peak memory of each configuration
+The result is printed as json, it can be compared with the result of previous release by --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+bench_dir = Path(__file__).resolve().parent
+corpus_dir = bench_dir / 'corpus'
+rplugin_dir = bench_dir.parent / 'rplugin' / 'python3'
+sys.path.insert(0, str(rplugin_dir))
+
+from loggen import LogGenerator, get_size  # noqa: E402
+from utils import patterns, project  # noqa: E402
+from utils.parser import ParseState, Parser, compact_record, parse_log, unique_records  # noqa: E402
+
+# configurations of parser which are measured, (name, engine, use_mmap, jobs)
+# parallel parsing always uses mmap, it is measured with --jobs even if the log is smaller than PARALLEL_MIN_SIZE
+configs = [
+    ('regex', 'regex', False, 1),
+    ('regex-mmap', 'regex', True, 1),
+    ('dispatch', 'dispatch', False, 1),
+    ('dispatch-mmap', 'dispatch', True, 1),
+    ('regex-parallel', 'regex', True, 4),
+    ('dispatch-parallel', 'dispatch', True, 4),
+]
+# logs of corpus which have golden output, latex log / bibliography log (biber, bibtex) / index log (makeindex)
+golden_extensions = ('.log', '.blg', '.ilg')
+
+
+def run_parser(logfile:str, state:ParseState|None, compiledir:str|None, main:str|None,
+               engine:str, use_mmap:bool, jobs:int, unwrap:int=0):
+    """ parse log file, parallel parsing is used regardless of file size if jobs is more than 1 """
+    if jobs > 1:
+        p = Parser(logfile, patterns.get_regex(), compiledir, main, use_mmap, engine)
+        return unique_records(p.get_matches_parallel(jobs))
+    return parse_log(logfile, state, compiledir, main, use_mmap, engine, unwrap=unwrap)
+
+
+def tex_wrap(data:bytes, width:int) -> bytes:
+    """
+    wrap lines like TeX does with max_print_line (pdfTeX counts bytes).
+    TeX writes its own new line after a line of exactly width, so an empty line follows it.
+    The first line (banner) is not wrapped.
+    """
+    lines = data.split(b'\n')
+    wrapped = lines[:1]
+    for line in lines[1:]:
+        wrapped.extend([line[i:i + width] for i in range(0, len(line), width)] or [b''])
+        if line and len(line) % width == 0:
+            wrapped.append(b'')
+    return b'\n'.join(wrapped)
+
+
+def get_records(logfile:Path, engine:str, use_mmap:bool, jobs:int=1, tail_parts:int=0,
+                wrap:int=0, unwrap:int|None=None, crlf:bool=False) -> list[dict[str, Any]]:
+    """
+    parse log file of corpus and make paths relative to corpus directory to compare with golden output
+
+    Args:
+        tail_parts(int) : If it is not 0, write log file by parts and parse it with tail mode
+        wrap(int) : If it is not 0, wrap log file at this width and parse it with unwrap
+        unwrap(int) : width to parse with unwrap, it is wrap if it is None.
+                      Set it without wrap to parse the log as it is written by TeX (lines of the width exist already)
+        crlf(bool) : If true, convert new lines of log file to CRLF like TeX on Windows writes
+    """
+    unwrap = wrap if unwrap is None else unwrap
+    main = str(logfile.parent / 'main.tex')
+    result = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data = logfile.read_bytes()
+        if wrap:
+            data = tex_wrap(data, wrap)
+        if crlf:
+            data = data.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+        if wrap or crlf:
+            logpath = Path(tmp) / logfile.name
+            _ = logpath.write_bytes(data)
+        else:
+            logpath = logfile
+        if tail_parts:
+            step = len(data) // tail_parts + 1
+            state = ParseState()
+            part = Path(tmp) / ('part_' + logfile.name)
+            for i in range(0, len(data), step):
+                with open(part, 'ab') as f:
+                    _ = f.write(data[i:i + step])
+                result = parse_log(str(part), state, str(logfile.parent), main, use_mmap, engine, unwrap=unwrap)
+        else:
+            result = run_parser(str(logpath), None, str(logfile.parent), main, engine, use_mmap, jobs, unwrap)
+
+    records = []
+    for record in result:
+        record = compact_record(record)
+        if 'file' in record:
+            record['file'] = Path(os.path.relpath(record['file'], logfile.parent)).as_posix()
+        records.append(record)
+    return records
+
+
+def check_golden(update:bool=False) -> dict[str, Any]:
+    """ compare parse result of corpus with golden output, or write golden output if update is true """
+    failed:list[str] = []
+    logs = sorted(log for ext in golden_extensions for log in corpus_dir.glob('*' + ext))
+    for logfile in logs:
+        golden = logfile.with_suffix('.jsonl')
+        if update:
+            records = get_records(logfile, 'regex', False)
+            with open(golden, 'w', encoding='utf-8', newline='\n') as f:
+                for record in records:
+                    _ = f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            continue
+
+        with open(golden, 'r', encoding='utf-8') as f:
+            expected = [json.loads(line) for line in f if line.strip()]
+        for name, engine, use_mmap, jobs in configs:
+            if logfile.suffix != '.log':
+                # *.blg / *.ilg are parsed serially without unwrap, only mmap and tail mode are different
+                if engine != 'regex' or jobs > 1:
+                    continue
+                if get_records(logfile, engine, use_mmap) != expected:
+                    failed.append(f'{logfile.name}:{name}')
+                if get_records(logfile, engine, use_mmap, tail_parts=7) != expected:
+                    failed.append(f'{logfile.name}:{name}-tail')
+                if get_records(logfile, engine, use_mmap, crlf=True) != expected:
+                    failed.append(f'{logfile.name}:{name}-crlf')
+                continue
+            if get_records(logfile, engine, use_mmap, jobs) != expected:
+                failed.append(f'{logfile.name}:{name}')
+            if jobs == 1 and get_records(logfile, engine, use_mmap, tail_parts=7) != expected:
+                failed.append(f'{logfile.name}:{name}-tail')
+            if jobs == 1 and get_records(logfile, engine, use_mmap, wrap=79) != expected:
+                failed.append(f'{logfile.name}:{name}-unwrap')
+            if jobs == 1 and get_records(logfile, engine, use_mmap, tail_parts=7, wrap=79) != expected:
+                failed.append(f'{logfile.name}:{name}-unwrap-tail')
+            if jobs == 1 and get_records(logfile, engine, use_mmap, unwrap=79) != expected:
+                failed.append(f'{logfile.name}:{name}-unwrap-raw')
+            if get_records(logfile, engine, use_mmap, jobs, crlf=True) != expected:
+                failed.append(f'{logfile.name}:{name}-crlf')
+            if jobs == 1 and get_records(logfile, engine, use_mmap, tail_parts=7, crlf=True) != expected:
+                failed.append(f'{logfile.name}:{name}-crlf-tail')
+            if jobs == 1 and get_records(logfile, engine, use_mmap, tail_parts=7, wrap=79, crlf=True) != expected:
+                failed.append(f'{logfile.name}:{name}-crlf-unwrap-tail')
+    return {'logs': len(logs), 'failed': failed}
+
+
+# tex files of project to check include graph, commands which start with \input / \include are not included files
+project_files = {
+    'main.tex': '\n'.join([
+        r'\documentclass{article}',
+        r'\usepackage{graphicx}',
+        r'\inputencoding{latin1}',
+        r'\includeonly{ch1}',
+        r'\begin{document}',
+        r'\include{ch1}',
+        r'\input{ch2}',
+        r'\input ch3',
+        r'\subfile{ch4}',
+        r'\includegraphics[width=3cm]{fig.png}',
+        r'\end{document}',
+    ]),
+    'ch1.tex': r'\section{one}',
+    'ch2.tex': r'\section{two}',
+    'ch3.tex': r'\section{three}',
+    'ch4.tex': r'\section{four}',
+}
+
+
+def check_project() -> dict[str, Any]:
+    """ check include graph of project index (utils/project.py) """
+    failed:list[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, contents in project_files.items():
+            _ = (Path(tmp) / name).write_text(contents + '\n', encoding='utf-8')
+        index = project.ProjectIndex(str(Path(tmp) / 'main.tex'))
+        children = [Path(child).name for child in index.graph[index.mainpath]]
+        if children != ['ch1.tex', 'ch2.tex', 'ch3.tex', 'ch4.tex']:
+            failed.append('graph:' + ','.join(children))
+        if sorted(Path(file).name for file in index.files.values()) != sorted(project_files):
+            failed.append('files')
+        if index.get_package_line('graphicx') != (index.mainpath, 2):
+            failed.append('packages')
+    return {'files': len(project_files), 'failed': failed}
+
+
+def measure(logfile:str, engine:str, use_mmap:bool, jobs:int, repeat:int) -> dict[str, Any]:
+    """ measure parsing time and peak memory of python objects """
+    times:list[float] = []
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(run_parser(logfile, None, None, None, engine, use_mmap, jobs))
+        times.append(time.perf_counter() - start)
+
+    # tracemalloc makes parsing slow, measure memory with another run
+    # memory of worker processes is not traced with parallel parsing
+    tracemalloc.start()
+    _ = run_parser(logfile, None, None, None, engine, use_mmap, jobs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'engine': engine,
+        'mmap': use_mmap,
+        'jobs': jobs,
+        'records': count,
+        'min_s': round(min(times), 4),
+        'median_s': round(statistics.median(times), 4),
+        'peak_kb': peak // 1024,
+    }
+
+
+def get_revision() -> str|None:
+    """ get git revision of repository to identify the result """
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=bench_dir,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result:dict[str, Any], baseline_file:str, threshold:float) -> list[str]:
+    """ get configurations which are slower than baseline more than threshold ratio """
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions:list[str] = []
+    for name, now in result['timing'].items():
+        before = baseline.get('timing', {}).get(name)
+        if before and now['min_s'] > before['min_s'] * (1 + threshold):
+            regressions.append(f"{name}: {before['min_s']}s -> {now['min_s']}s")
+    return regressions
+
+
+def get_args() -> argparse.Namespace:
+    """ parse command line arguments """
+    parser = argparse.ArgumentParser(prog='bench_parse', description='benchmark and golden check of log parser')
+    _ = parser.add_argument('--log', default=None, help='log file to measure, synthetic log is generated if it is not given')
+    _ = parser.add_argument('--size', default='5M', help='size of synthetic log')
+    _ = parser.add_argument('--depth', type=int, default=20, help='max nesting depth of synthetic log')
+    _ = parser.add_argument('--density', type=float, default=0.05, help='ratio of error/warning lines of synthetic log')
+    _ = parser.add_argument('--wrap', type=int, default=79, help='max_print_line of synthetic log')
+    _ = parser.add_argument('--encoding', default='euc-kr', help='encoding of file names of synthetic log')
+    _ = parser.add_argument('--repeat', type=int, default=5, help='the number of runs of each configuration')
+    _ = parser.add_argument('--output', default=None, help='write result json to file instead of stdout')
+    _ = parser.add_argument('--compare', default=None, help='result json of previous run to check regression')
+    _ = parser.add_argument('--threshold', type=float, default=0.1, help='allowed ratio of slowdown with --compare')
+    _ = parser.add_argument('--update-golden', action='store_true', help='rewrite golden output of corpus')
+    _ = parser.add_argument('--skip-timing', action='store_true', help='check golden output only')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    if args.update_golden:
+        _ = check_golden(update=True)
+        return
+
+    result:dict[str, Any] = {
+        'revision': get_revision(),
+        'python': platform.python_version(),
+        'platform': sys.platform,
+        'golden': check_golden(),
+        'project': check_project(),
+        'timing': {},
+    }
+
+    if not args.skip_timing:
+        with tempfile.TemporaryDirectory() as tmp:
+            logfile = args.log
+            if logfile is None:
+                gen = LogGenerator(0, args.depth, args.density, args.wrap, args.encoding)
+                logfile = os.path.join(tmp, 'bench.log')
+                with open(logfile, 'wb') as f:
+                    _ = f.write(gen.generate(get_size(args.size)))
+            result['input'] = {'file': args.log, 'bytes': os.path.getsize(logfile)}
+            for name, engine, use_mmap, jobs in configs:
+                result['timing'][name] = measure(logfile, engine, use_mmap, jobs, args.repeat)
+
+    regressions = compare(result, args.compare, args.threshold) if args.compare else []
+    result['regressions'] = regressions
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            _ = f.write(text + '\n')
+    else:
+        print(text)
+
+    # non-zero exit code makes it possible to use in CI
+    if result['golden']['failed'] or result['project']['failed'] or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
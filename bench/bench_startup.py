@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Startup time check of python scripts which are executed once per user action
+Usage: python bench_startup.py [--repeat 20] [--budget 100] [--importtime] [--output result.json]
+
+LogParser.py and InverseSearch.py are started as new process at every build / click in pdf viewer,
+so python startup and imports are most of their latency.
+Each scenario is run repeatedly and its median is compared with bare interpreter (python -c pass).
+It exits with 1 if the overhead of some scenario is larger than budget.
+    --importtime : run each scenario with `python -X importtime` and print the most expensive modules
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+bench_dir = Path(__file__).resolve().parent
+rplugin_dir = bench_dir.parent / 'rplugin' / 'python3'
+corpus_dir = bench_dir / 'corpus'
+sys.path.insert(0, str(rplugin_dir))
+
+STARTUP_BUDGET = 100 # ms, overhead of each scenario over bare interpreter
+
+
+def get_scenarios() -> dict[str, list[str]]:
+    """ get arguments of each scenario, python executable is prepended at run """
+    logparser = str(rplugin_dir / 'LogParser.py')
+    inverse = str(rplugin_dir / 'InverseSearch.py')
+    logfile = str(corpus_dir / 'sample.log')
+    texfile = str(corpus_dir / 'sample.tex')
+    return {
+        'baseline': ['-c', 'pass'],
+        'logparser-invalid': [logparser, str(corpus_dir / 'missing.log')],  # argument validation only
+        'logparser-cached': [logparser, logfile],                           # result from cache
+        'logparser-parse': [logparser, logfile, '--no-cache'],              # parse small log
+        'inverse-invalid': [inverse, texfile, 'x'],                         # argument validation only
+        'inverse-broker': [inverse, texfile, '1', 'recent'],                # fast path with broker
+    }
+
+
+def start_broker() -> socket.socket:
+    """
+    start dummy broker which answers ok to every request.
+    It measures the fast path of InverseSearch.py without neovim and pynvim.
+    """
+    from utils import client
+    token = 'bench'
+    if hasattr(socket, 'AF_UNIX') and sys.platform != 'win32':
+        sock_file = client.get_address_file().with_name('texflow_broker.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(str(sock_file))
+        address:dict[str, Any] = {'family': 'unix', 'address': str(sock_file), 'token': token}
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        address = {'family': 'tcp', 'address': list(sock.getsockname()), 'token': token}
+    sock.listen(8)
+    with open(client.get_address_file(), 'w', encoding='utf-8') as f:
+        json.dump(address, f)
+
+    def serve() -> None:
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return # socket is closed
+            with conn, conn.makefile('rb') as f:
+                _ = f.readline()
+                conn.sendall(b'{"ok": true}\n')
+
+    threading.Thread(target=serve, daemon=True).start()
+    return sock
+
+
+def run(args:list[str], env:dict[str, str], repeat:int) -> list[float]:
+    """ run scenario repeatedly and return wall times """
+    times:list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _ = subprocess.run([sys.executable, *args], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           check=False)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def importtime(args:list[str], env:dict[str, str], top:int) -> list[dict[str, Any]]:
+    """
+    get import cost of modules from `python -X importtime`
+
+    Return:
+        modules(list[dict]) : {module, self_ms, cumulative_ms} of the most expensive modules by self time
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *args], env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=False)
+    modules:list[dict[str, Any]] = []
+    for line in proc.stderr.splitlines():
+        # import time:       self [us] |  cumulative | imported package
+        m = re.match(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+        if m:
+            modules.append({'module': m.group(4), 'self_ms': int(m.group(1)) / 1000,
+                            'cumulative_ms': int(m.group(2)) / 1000})
+    modules.sort(key=lambda module: module['self_ms'], reverse=True)
+    return modules[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='startup time check of LogParser.py / InverseSearch.py')
+    _ = parser.add_argument('--repeat', type=int, default=20)
+    _ = parser.add_argument('--budget', type=float, default=STARTUP_BUDGET,
+                            help='allowed overhead of each scenario over bare interpreter (ms)')
+    _ = parser.add_argument('--importtime', action='store_true', help='print the most expensive modules of scenarios')
+    _ = parser.add_argument('--top', type=int, default=10, help='the number of modules to print with --importtime')
+    _ = parser.add_argument('--output', default=None, help='save result json to this file')
+    args = parser.parse_args()
+
+    # isolated data directory, cache / broker address of user are not touched
+    tmp = tempfile.mkdtemp(prefix='texflow_bench_')
+    env = dict(os.environ, XDG_DATA_HOME=tmp)
+    os.environ['XDG_DATA_HOME'] = tmp
+    from utils import paths
+    paths.get_data_dir().mkdir(parents=True, exist_ok=True)
+    broker = start_broker()
+
+    result:dict[str, Any] = {'python': sys.version.split()[0], 'budget_ms': args.budget, 'scenarios': {}}
+    failed:list[str] = []
+    try:
+        scenarios = get_scenarios()
+        _ = run(scenarios['logparser-cached'], env, 1) # warm cache
+        baseline = statistics.median(run(scenarios['baseline'], env, args.repeat))
+        for name, scenario in scenarios.items():
+            if args.importtime:
+                if name != 'baseline':
+                    result['scenarios'][name] = {'modules': importtime(scenario, env, args.top)}
+                continue
+            times = run(scenario, env, args.repeat)
+            median = statistics.median(times)
+            overhead = (median - baseline) * 1000
+            result['scenarios'][name] = {
+                'min_ms': round(min(times) * 1000, 2),
+                'median_ms': round(median * 1000, 2),
+                'overhead_ms': round(overhead, 2),
+            }
+            if name != 'baseline' and overhead > args.budget:
+                failed.append(name)
+    finally:
+        broker.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    result['over_budget'] = failed
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if failed:
+        print('over budget : ' + ', '.join(failed), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Benchmark and golden output check of synctex index
+Usage: python bench_synctex.py [--pages 500] [--repeat 200] [--output result.json]
+       python bench_synctex.py --update-golden
+
+1) golden : forward / inverse lookups of bench/corpus/sample.synctex are compared with sample.synctex.json.
+            The index which is saved and loaded again must give the same results.
+2) timing : build / save / load of synthetic synctex file and latency of forward / inverse lookups.
+            Inverse lookups are compared with linear scan of all records of the page.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+bench_dir = Path(__file__).resolve().parent
+corpus_dir = bench_dir / 'corpus'
+rplugin_dir = bench_dir.parent / 'rplugin' / 'python3'
+sys.path.insert(0, str(rplugin_dir))
+
+from utils.synctex import SP_PER_BP, SyncTexIndex  # noqa: E402
+
+sample = corpus_dir / 'sample.synctex'
+golden = corpus_dir / 'sample.synctex.json'
+
+
+def relative(result:dict[str, Any]|None) -> dict[str, Any]|None:
+    """ make file of inverse result relative to corpus directory to compare with golden output """
+    if result and 'file' in result:
+        result = {**result, 'file': Path(os.path.relpath(result['file'], corpus_dir)).as_posix()}
+    return result
+
+
+def rounded(result:dict[str, Any]|None) -> dict[str, Any]|None:
+    """ round coordinates of forward result, big point is float """
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in result.items()} \
+        if result else None
+
+
+def lookup(index:SyncTexIndex, queries:dict[str, list[dict[str, Any]]]) -> dict[str, list[dict[str, Any]]]:
+    """ run forward / inverse queries of golden file and add the results """
+    return {
+        'forward': [{**q, 'expect': rounded(index.forward(str(corpus_dir / q['file']), q['line']))}
+                    for q in queries['forward']],
+        'inverse': [{**q, 'expect': relative(index.inverse(q['page'], q['x'], q['y']))}
+                    for q in queries['inverse']],
+    }
+
+
+def check_golden(update:bool=False) -> dict[str, Any]:
+    """ compare lookups of sample synctex with golden output, or write golden output if update is true """
+    with open(golden, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    index = SyncTexIndex(str(sample))
+    result = lookup(index, expected)
+    if update:
+        with open(golden, 'w', encoding='utf-8', newline='\n') as f:
+            json.dump(result, f, indent=2)
+            _ = f.write('\n')
+        return {'queries': len(result['forward']) + len(result['inverse']), 'failed': []}
+
+    failed = [f'{kind}:{i}' for kind in ('forward', 'inverse')
+              for i, (got, want) in enumerate(zip(result[kind], expected[kind])) if got != want]
+    # saved index must be the same with the built one
+    with tempfile.TemporaryFile() as f:
+        index.dump(f)
+        _ = f.seek(0)
+        loaded = SyncTexIndex.load(f)
+    if loaded is None or lookup(loaded, expected) != expected:
+        failed.append('load')
+    return {'queries': len(expected['forward']) + len(expected['inverse']), 'failed': failed}
+
+
+def make_synctex(file:Path, pages:int, lines:int=45, seed:int=1) -> None:
+    """ write synthetic synctex file, each page has page vbox, text lines with glue / kern and some figures """
+    rng = random.Random(seed)
+    sp = lambda bp: int(bp * SP_PER_BP) # noqa: E731
+    out = ['SyncTeX Version:1', 'Input:1:./main.tex', 'Output:pdf', 'Magnification:1000', 'Unit:1',
+           'X Offset:0', 'Y Offset:0', 'Content:']
+    line = 1
+    for page in range(1, pages + 1):
+        out += [f'{{{page}', f'[1,{line}:{sp(72)},{sp(720)}:{sp(468)},{sp(648)},0']
+        for n in range(lines):
+            y = 84 + n * 14
+            out.append(f'(1,{line}:{sp(72)},{sp(y)}:{sp(468)},{sp(8)},{sp(2)}')
+            for _ in range(rng.randint(2, 6)):
+                out.append(f'g1,{line}:{sp(rng.uniform(72, 540))},{sp(y)}')
+            out.append(')')
+            if rng.random() < 0.05:
+                out.append(f'v1,{line}:{sp(150)},{sp(y)}:{sp(300)},{sp(120)},0')
+            line += rng.randint(1, 2)
+        out += [']', f'}}{page}']
+    _ = file.write_text('\n'.join(out) + '\n', encoding='utf-8')
+
+
+def linear_inverse(index:SyncTexIndex, page:int, x:float, y:float) -> int:
+    """ inverse lookup which checks every record of page, reference of SyncTexIndex.inverse() """
+    start, end = index.page_start.get(page, (0, 0))
+    h = (x - index.x_offset) / index.unit
+    v = (y - index.y_offset) / index.unit
+    best, best_area, nearest, nearest_dist = -1, 0, -1, 0.0
+    for i in range(start, end):
+        if not index.is_source(i):
+            continue
+        dist = abs(index.h[i] - h) + abs(index.v[i] - v)
+        if nearest < 0 or dist < nearest_dist:
+            nearest, nearest_dist = i, dist
+        width = index.width[i]
+        if width > 0 and index.h[i] <= h <= index.h[i] + width \
+            and index.v[i] - index.height[i] <= v <= index.v[i] + index.depth[i]:
+            area = width * (index.height[i] + index.depth[i])
+            if best < 0 or area < best_area:
+                best, best_area = i, area
+    return best if best >= 0 else nearest
+
+
+def measure(pages:int, repeat:int) -> dict[str, Any]:
+    """ measure build / load time of index and latency of lookups """
+    rng = random.Random(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        file = Path(tmp) / 'bench.synctex'
+        make_synctex(file, pages)
+        start = time.perf_counter()
+        index = SyncTexIndex(str(file))
+        build = time.perf_counter() - start
+
+        index_file = Path(tmp) / 'bench.index'
+        start = time.perf_counter()
+        with open(index_file, 'wb') as f:
+            index.dump(f)
+        save = time.perf_counter() - start
+        start = time.perf_counter()
+        with open(index_file, 'rb') as f:
+            loaded = SyncTexIndex.load(f)
+        load = time.perf_counter() - start
+        assert loaded is not None
+
+        points = [(rng.randint(1, pages), rng.uniform(0, 612), rng.uniform(0, 792)) for _ in range(repeat)]
+        inverse_times:list[float] = []
+        mismatch = 0
+        for page, x, y in points:
+            start = time.perf_counter()
+            result = index.inverse(page, x, y)
+            inverse_times.append(time.perf_counter() - start)
+            idx = linear_inverse(index, page, x, y)
+            if result != ({'file': index.inputs[index.tags[idx]], 'line': index.lines[idx]} if idx >= 0 else None):
+                mismatch += 1
+
+        forward_times:list[float] = []
+        main = index.inputs[1]
+        for _ in range(repeat):
+            line = rng.randint(1, max(index.lines))
+            start = time.perf_counter()
+            _ = index.forward(main, line)
+            forward_times.append(time.perf_counter() - start)
+
+        return {
+            'pages': pages,
+            'records': len(index.kinds),
+            'synctex_mb': round(file.stat().st_size / (1 << 20), 2),
+            'index_mb': round(index_file.stat().st_size / (1 << 20), 2),
+            'build_s': round(build, 3),
+            'save_ms': round(save * 1000, 2),
+            'load_ms': round(load * 1000, 2),
+            'forward_us': round(statistics.median(forward_times) * 1e6, 1),
+            'inverse_us': round(statistics.median(inverse_times) * 1e6, 1),
+            'inverse_mismatch': mismatch,
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='benchmark of synctex index')
+    _ = parser.add_argument('--pages', type=int, default=500, help='pages of synthetic synctex file')
+    _ = parser.add_argument('--repeat', type=int, default=200, help='the number of lookups to measure')
+    _ = parser.add_argument('--output', help='write result json to this file')
+    _ = parser.add_argument('--update-golden', action='store_true', help='rewrite golden output of sample synctex')
+    _ = parser.add_argument('--skip-timing', action='store_true', help='check golden output only')
+    args = parser.parse_args()
+
+    result:dict[str, Any] = {'python': sys.version.split()[0], 'platform': sys.platform}
+    result['golden'] = check_golden(args.update_golden)
+    if not args.skip_timing and not args.update_golden:
+        result['timing'] = measure(args.pages, args.repeat)
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        _ = Path(args.output).write_text(output, encoding='utf-8')
+    failed = result['golden']['failed'] or result.get('timing', {}).get('inverse_mismatch')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Synthetic LaTeX log generator for benchmark
+Usage: python loggen.py <output.log> [--size 5M] [--depth 20] [--density 0.05] [--wrap 79] [--encoding euc-kr]
+
+The log imitates the structure of pdflatex log file.
+    - nested '(file' groups of package stack which are closed with ')'
+    - errors with file:line:error style and '! ' style with 'l.NN'
+    - LaTeX / Package / pdfTeX warnings, Overfull / Underfull boxes, missing files
+    - lines are wrapped at max_print_line like TeX does
+    - file names of the document can be encoded with other encoding than utf-8
+"""
+import argparse
+import random
+
+# file names of the document, they are encoded with --encoding
+doc_files = ['./main.tex', './chapter/intro.tex', './chapter/결과.tex', './그림/표.tex', './appendix/부록.tex']
+
+# lines which are not matched with any pattern
+filler_lines = [
+    r'\OT1/cmr/m/n/10 some text here and there (with parens) and more (nested (deep)) text',
+    'Document Class: article 2022/07/02 v1.4n Standard LaTeX document class',
+    r'\c@part=\count185',
+    'File: size10.clo 2022/07/02 v1.4n Standard LaTeX file (size option)',
+    'Package: hyperref 2023-02-07 v7.00v Hypertext links for LaTeX',
+    r'\openout1 = `main.aux''.',
+    '[1{/usr/share/texlive/texmf-var/fonts/map/pdftex/updmap/pdftex.map}] [2] [3]',
+]
+
+
+class LogGenerator:
+    rng:      random.Random
+    depth:    int   # max nesting depth of '(file' groups
+    density:  float # ratio of lines which are error/warning
+    wrap:     int   # max_print_line, 0 means no wrapping
+    encoding: str   # encoding of file names of the document
+    stack:    list[str]
+
+    def __init__(self, seed:int=0, depth:int=20, density:float=0.05, wrap:int=79, encoding:str='utf-8'):
+        self.rng = random.Random(seed)
+        self.depth = depth
+        self.density = density
+        self.wrap = wrap
+        self.encoding = encoding
+        self.stack = []
+
+    def wrap_line(self, line:str) -> str:
+        """ wrap line at max_print_line, TeX breaks lines by the number of characters """
+        if self.wrap <= 0 or len(line) <= self.wrap:
+            return line
+        return '\n'.join(line[i:i + self.wrap] for i in range(0, len(line), self.wrap))
+
+    def message(self) -> str:
+        """ get one error/warning message """
+        rng = self.rng
+        line = rng.randint(1, 2000)
+        doc = self.stack[-1] if self.stack and self.stack[-1] in doc_files else './main.tex'
+        pkg = rng.choice(['hyperref', 'natbib', 'geometry', 'fontspec', 'babel'])
+        kind = rng.randrange(10)
+        if kind == 0:
+            return f'{doc}:{line}: Undefined control sequence.\nl.{line} \\foo\n'
+        if kind == 1:
+            return f'! LaTeX Error: File `missing{line}.sty\' not found.\n\nl.{line} \\usepackage\n'
+        if kind == 2:
+            return f'! Undefined control sequence.\nl.{line} \\bar\n'
+        if kind == 3:
+            return f'Package {pkg} Error: Option clash for package {pkg}.\n\n'
+        if kind == 4:
+            return f"LaTeX Warning: Reference `fig:{line}' on page 1 undefined on input line {line}.\n"
+        if kind == 5:
+            return (f'Package {pkg} Warning: Token not allowed in a PDF string,\n'
+                    f'({pkg})                removing `\\textbf\' on input line {line}.\n\n')
+        if kind == 6:
+            return f'pdfTeX warning (ext4): destination with the same identifier (name{{page.{line}}})    has been already used\n'
+        if kind == 7:
+            return f'Overfull \\hbox (1.{line}pt too wide) in paragraph at lines {line}--{line + 1}\n[]\\OT1/cmr/m/n/10 text\n'
+        if kind == 8:
+            return 'Underfull \\vbox (badness 10000) has occurred while \\output is active\n[]\n'
+        return f'No file main{line}.bbl.\n'
+
+    def open_file(self) -> str:
+        """ get '(file' line of package or document file """
+        rng = self.rng
+        if rng.random() < 0.2:
+            name = rng.choice(doc_files)
+        else:
+            name = f'/usr/share/texlive/texmf-dist/tex/latex/pkg{rng.randint(1, 500)}/pkg{rng.randint(1, 50)}.sty'
+        self.stack.append(name)
+        return '(' + name
+
+    def generate(self, size:int) -> bytes:
+        """
+        generate log file contents
+
+        Args:
+            size(int) : approximate size of log file in bytes
+
+        Return:
+            contents(bytes) : log file contents, file names of the document are encoded with self.encoding
+        """
+        rng = self.rng
+        chunks:list[bytes] = [b'This is pdfTeX, Version 3.141592653-2.6-1.40.25 (TeX Live 2023) (preloaded format=pdflatex)\n']
+        self.stack = []
+        line = self.open_file()
+        n = 0
+        while n < size:
+            r = rng.random()
+            if r < self.density:
+                text = self.message()
+            elif r < self.density + 0.15 and len(self.stack) < self.depth:
+                text = self.wrap_line(self.open_file()) + '\n'
+            elif r < self.density + 0.3 and len(self.stack) > 1:
+                _ = self.stack.pop()
+                text = ')'
+            else:
+                text = self.wrap_line(rng.choice(filler_lines)) + '\n'
+            data = (line + text).encode(self.encoding if any(doc in text for doc in doc_files) else 'utf-8')
+            chunks.append(data)
+            n += len(data)
+            line = ''
+        chunks.append((')' * len(self.stack) + '\n').encode('utf-8'))
+        return b''.join(chunks)
+
+
+def get_size(text:str) -> int:
+    """ convert size string like 5M, 200K to bytes """
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    text = text.upper()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def get_args() -> argparse.Namespace:
+    """ parse command line arguments """
+    parser = argparse.ArgumentParser(prog='loggen', description='generate synthetic latex log file')
+    _ = parser.add_argument('output', help='output *.log file path')
+    _ = parser.add_argument('--size', default='1M', help='approximate size of log file (e.g. 500K, 5M)')
+    _ = parser.add_argument('--depth', type=int, default=20, help='max nesting depth of (file groups')
+    _ = parser.add_argument('--density', type=float, default=0.05, help='ratio of error/warning lines')
+    _ = parser.add_argument('--wrap', type=int, default=79, help='max_print_line, 0 means no wrapping')
+    _ = parser.add_argument('--encoding', default='utf-8', help='encoding of file names of the document')
+    _ = parser.add_argument('--seed', type=int, default=0, help='random seed')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    gen = LogGenerator(args.seed, args.depth, args.density, args.wrap, args.encoding)
+    with open(args.output, 'wb') as f:
+        _ = f.write(gen.generate(get_size(args.size)))
+
+
+if __name__ == '__main__':
+    main()
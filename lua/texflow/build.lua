@@ -8,10 +8,12 @@ local Check = require('texflow.check')
 ---@class texflow.job_id
 ---@field compile number?
 ---@field viewer number?
+---@field broker number?
 local job_id = { -- check job is running
 	compile = nil,
 	viewer = nil,
 	cleanup = nil,
+	broker = nil,
 }
 
 ---@class texflow.valid check valid condition
@@ -134,12 +136,36 @@ local function valid_check(type, opts)
 	end
 
 	-- check max_print_line was set in *.ini file.
-	Check.check_max_print_line()
+	-- log parser joins wrapped lines itself with unwrap_log, *.ini file doesn't need to be changed
+	if not opts.latex.unwrap_log then
+		Check.check_max_print_line()
+	end
 
 	valid[type].execute = true
 	return valid[type].execute
 end
 
+-- start inverse search broker, it lives until neovim is closed
+---@param opts texflow.config
+local function start_broker(opts)
+	if not opts.viewer.broker or (job_id.broker and job_clear('broker')) then
+		return
+	end
+	local cmd = Utils.replace_cmd_token({
+		shell = opts.latex.shell,
+		shellcmdflag = opts.latex.shellcmdflag,
+		engine = vim.g.python3_host_prog,
+		args = { '@InverseSearch', '--serve', },
+	})
+	-- If other neovim instance runs broker already, this job exits immediately
+	job_id.broker = vim.fn.jobstart(cmd, {
+		detach = false,
+		on_exit = function ()
+			job_id.broker = nil
+		end,
+	})
+end
+
 -- open viewer
 ---@param opts texflow.config
 local function view_core(opts)
@@ -149,6 +175,7 @@ local function view_core(opts)
 
 	-- show viewer start
 	vim.fn.Texflow_save_server_mapping(Utils.sep_unify(file.filepath, '/'))
+	start_broker(opts)
 	set_autocmd('viewer', file)
 	local jid = vim.fn.jobstart(cmd, {
 		cwd = file.filedir,
@@ -261,7 +288,7 @@ local function compile_core(opts)
 						progress_items.title = 'compiling(pvc) ' .. file.compilename
 						if string.find(str, '^=== Watching for updated files') then -- check end of compile
 							str = ''
-							Diag.errorCheck(opts)
+							Diag.errorCheck(opts, {tail = true})
 							if opts.latex.openAfter then
 								M.view(opts)
 							end
@@ -13,6 +13,7 @@ local default_config = {
 	---@field clear_ext table file extensions which is forced clear before tex file is compiled
 	---@field openAfter boolean open viewer after compile.
 	---@field onSave string? method to compile automatically after save
+	---@field unwrap_log boolean join lines of log file which are wrapped at max_print_line
 	latex = {
 		shell = vim.api.nvim_get_option_value('shell', {scope = 'global'}),
 		shellcmdflag = vim.api.nvim_get_option_value('shellcmdflag', {scope = 'global'}),
@@ -47,6 +48,9 @@ local default_config = {
 		-- 'plugin' : If latex engine doesn't supports consecutive compile mode, use it.
 		-- 			  It simulates 'inherit' mode in texflow.nvim itself.
 		onSave = nil,
+		-- boolean : join lines of log file which are wrapped at max_print_line (79) before parsing.
+		-- If false, max_print_line of *.ini file of latex distribution is checked and increased before compile.
+		unwrap_log = true,
 	},
 
 	---@class texflow.config.viewer
@@ -54,6 +58,7 @@ local default_config = {
 	---@field shellcmdflag string shell command arguments (ex, /c /n)
 	---@field engine string compile engine for pdf viewer
 	---@field args table arguments for pdf viewer
+	---@field broker boolean run inverse search broker while viewer is opened
 	viewer = {
 		shell = vim.api.nvim_get_option_value('shell', {scope = 'global'}),
 		shellcmdflag = vim.api.nvim_get_option_value('shellcmdflag', {scope = 'global'}),
@@ -66,6 +71,10 @@ local default_config = {
 			'--forward-search-line @line',
 			'@pdf',
 		},
+		-- boolean : If true, start inverse search broker (`InverseSearch.py --serve`) when viewer is opened.
+		-- The broker keeps connections to neovim servers, so inverse search doesn't need python to import pynvim
+		-- and connect to neovim at every click. If the broker isn't running, inverse search works as before.
+		broker = false,
 	}
 }
 
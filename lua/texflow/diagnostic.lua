@@ -5,27 +5,22 @@ local Config = require('texflow.config')
 -- texflow diagnostic id
 local ns_name = 'texflow'
 local ns_id = vim.api.nvim_create_namespace(ns_name)
-
--- lua cannot support |(OR) for pattern
-local captures = {
-	filename   = "^%((.+)$",
-	error1     = "^[^:]+:(%d+): (.+)$",
-	error2     = "^!%s+l%.(%d+)%s(.+)$",
-	error_pkg   = "^Package (%w+) Error:.*",
-	warn       = "LaTeX Warning:%s+(.*) on input line (%d+)%.",
-	warn_only  = "^LaTeX Warning:%s+[^%d]+%.",
-	warn_over  = "^Overfull.*at lines (%d+)",
-	warn_under = "^Underfull.*at lines (%d+)",
-	warn_other = "^%w+ warning l%.(%d+) (.+)$",
-	warn_toc   = "^warning.*",
-	warn_pkg   = "^Package (%w+) Warning:.*",
-	warn_nofile   = "^No file (.+)$",
-}
-
+-- the first errors which resident parser sends before the result of huge log file, the result replaces them
+local ns_preview_id = vim.api.nvim_create_namespace(ns_name .. '.preview')
 
 ---@type table<string, texflow.diagnosticItem[]> key is absolute filepath
 local diagnostics = {} -- show diagnostics in statuscolumn
 
+-- records of current diagnostics by stable id, python log parser sends changes of them (delta output)
+---@type table<string, texflow.record>
+local records_by_id = {}
+-- token of the last applied output of python log parser, python sends changes since this output
+---@type string?
+local delta_token = nil
+-- tex files of project from include graph of python (Texflow_project), nil if remote plugin is not registered
+---@type table<string, boolean>?
+local project_files = nil
+
 
 ---@param namespace_id integer
 local function update_quickfix(namespace_id)
@@ -79,10 +74,48 @@ local function update_quickfix(namespace_id)
 	})
 end
 
+-- get file which shows the diagnostic of record
+---@param record texflow.record
+---@param file texflow.filedata
+---@return string filepath
+local function get_record_filepath(record, file)
+	return record.file and Utils.sep_unify(record.file) or file.mainpath
+end
+
+-- make diagnostic item from record of python log parser
+---@param record texflow.record
+---@param file texflow.filedata
+---@return string filepath file which shows the diagnostic
+---@return texflow.diagnosticItem item
+local function make_item(record, file)
+	-- packages warning which is allocated in miktex runtime file like .sty,
+	-- has the line of \usepackage already from python log parser.
+	local lnum = record.line
+	local filepath = get_record_filepath(record, file)
+
+	---@class texflow.diagnosticItem
+	---@field lnum number
+	---@field col number
+	---@field end_col number
+	---@field severity number?
+	---@field message string
+	---@field source string
+	---@field namespace number
+	local item = {
+		lnum = lnum and tonumber(lnum)-1 or 0,
+		col = lnum and 0 or 1,
+		end_col = lnum and 0 or 1,
+		severity = vim.diagnostic.severity[record.severity],
+		message = record.message,
+		source = ns_name,
+		namespace = ns_id,
+	}
+	return filepath, item
+end
+
 -- add diagnostic
----@param data table output data table from python log parser
-local function add_diagnostic(data)
-	local hashes = {} -- hash to track duplicated items
+---@param records texflow.record[] diagnostic records from python log parser
+local function add_diagnostic(records)
 	local file = Utils.get_filedata()
 
 	-- remove previous diagnostic messages
@@ -90,111 +123,11 @@ local function add_diagnostic(data)
 	diagnostics = {}
 
 	-- add item to show diagnostics
-	local filepath = ''
-	for _, line in ipairs(data) do
-		local filename   = {line:match(captures.filename)}
-		local error1     = {line:match(captures.error1)}
-		local error2     = {line:match(captures.error2)}
-		local error_pkg  = {line:match(captures.error_pkg)}
-		local warn       = {line:match(captures.warn)}
-		local warn_only  = {line:match(captures.warn_only)}
-		local warn_other = {line:match(captures.warn_other)}
-		local warn_over  = {line:match(captures.warn_over)}
-		local warn_under = {line:match(captures.warn_under)}
-		local warn_toc   = {line:match(captures.warn_toc)}
-		local warn_pkg   = {line:match(captures.warn_pkg)}
-		local warn_nofile   = {line:match(captures.warn_nofile)}
-
-
-		-- get diagnostics
-		local lnum, msg = nil, nil
-		local mtype = nil
-		if filename[1] then -- get target filename which shows diagnostic
-			-- get absolute path of filename
-			local _filename = unpack(filename)
-			_filename = string.gsub(_filename, '^[^%w]*/','') -- remove first characters before slash like ./
-			-- Relative paths are relative to the path where the latex engine was run.
-			_filename = Utils.is_AbsolutePath(_filename) and _filename or vim.fn.fnamemodify(file.compiledir .. '/' .. _filename, ':p')
-			filepath = Utils.sep_unify(_filename)
-		elseif error1[1] then
-			lnum, msg = unpack(error1)
-			mtype = vim.diagnostic.severity.ERROR
-		elseif error2[1] then
-			lnum, msg = unpack(error2)
-			mtype = vim.diagnostic.severity.ERROR
-		elseif warn[1] then
-			msg, lnum = unpack(warn)
-			mtype = vim.diagnostic.severity.WARN
-		elseif warn_only[1] then -- if line number don't exist, this warning is displayed at 0 row
-			msg = unpack(warn_only)
-			mtype = vim.diagnostic.severity.WARN
-		elseif warn_other[1] then -- like pdfTeX warning
-			lnum, msg = unpack(warn_other)
-			mtype = vim.diagnostic.severity.WARN
-		elseif warn_over[1] then
-			msg = line
-			lnum = unpack(warn_over)
-			mtype = vim.diagnostic.severity.INFO
-		elseif warn_under[1] then
-			msg = line
-			lnum = unpack(warn_under)
-			mtype = vim.diagnostic.severity.INFO
-		elseif warn_toc[1] then
-			msg = line
-			mtype = vim.diagnostic.severity.WARN
-		elseif warn_pkg[1] then
-			-- packages warning which is allocated in miktex runtime file like .sty,
-			-- is shown in main file to notify user.
-			local pkg = unpack(warn_pkg)
-			local pattern = '\\usepackage.*%{' .. pkg .. '%}'
-			lnum = Utils.get_lineinfo_from_pattern(file.mainpath, pattern)
-			msg = line
-			mtype = vim.diagnostic.severity.WARN
-		elseif error_pkg[1] then
-			local pkg = unpack(error_pkg)
-			local pattern = '\\usepackage.*%{' .. pkg .. '%}'
-			lnum = Utils.get_lineinfo_from_pattern(file.mainpath, pattern)
-			msg = line
-			mtype = vim.diagnostic.severity.ERROR
-		elseif warn_nofile[1] then
-			msg = line
-			mtype = vim.diagnostic.severity.WARN
-		end
-
-		if msg then
-			-- if filepath is not in compile directory, the message shows the path too.
-			if (warn_pkg[1] or error_pkg[1]) and not string.match(filepath, file.mainpath) then
-				filepath = Utils.get_relative_path(filepath, file.maindir)
-				msg = 'In ' .. filepath .. '\n' .. msg
-				filepath = (warn_pkg[1] or error_pkg[1]) and file.mainpath or file.filepath
-			end
-
-			---@class texflow.diagnosticItem
-			---@field lnum number
-			---@field col number
-			---@field end_col number
-			---@field severity number?
-			---@field message string
-			---@field source string
-			---@field namespace number
-			local item = {
-				lnum = lnum and tonumber(lnum)-1 or 0,
-				col = lnum and 0 or 1,
-				end_col = lnum and 0 or 1,
-				severity = mtype,
-				message = msg,
-				source = ns_name,
-				namespace = ns_id,
-			}
-
-			-- remove duplicated item
-			local key = vim.inspect(item)
-			if not hashes[key] then
-				hashes[key] = true
-				diagnostics[filepath] = diagnostics[filepath] or {} -- create new key
-				table.insert(diagnostics[filepath], item)
-			end
-		end
+	for _, record in ipairs(records) do
+		local filepath, item = make_item(record, file)
+		-- duplicated records are already removed in python log parser
+		diagnostics[filepath] = diagnostics[filepath] or {} -- create new key
+		table.insert(diagnostics[filepath], item)
 	end
 
 	update_quickfix(ns_id) -- add diagnostics to quickfix
@@ -211,6 +144,99 @@ local function add_diagnostic(data)
 	end
 end
 
+-- apply changes of diagnostics from delta output of python log parser.
+-- Only the files whose diagnostics are changed are updated, quickfix is not touched if nothing is changed.
+---@param ops texflow.record[] the first item is header {op = 'reset'|'delta', token, base}, others are changes
+local function apply_delta(ops)
+	local header = table.remove(ops, 1)
+	if header.op == 'delta' and header.base ~= delta_token then
+		-- output of older request arrives late, python has newer base already
+		return
+	end
+	local file = Utils.get_filedata()
+
+	---@type table<string, boolean> files whose diagnostics are changed
+	local changed = {}
+	if header.op == 'reset' then
+		for path, _ in pairs(diagnostics) do
+			changed[path] = true
+		end
+		records_by_id = {}
+	end
+	for _, op in ipairs(ops) do
+		local prev = records_by_id[op.id]
+		if prev then
+			changed[get_record_filepath(prev, file)] = true -- file of previous record loses the diagnostic
+		end
+		if op.op == 'remove' then
+			records_by_id[op.id] = nil
+		else
+			records_by_id[op.id] = op
+			changed[get_record_filepath(op, file)] = true
+		end
+	end
+	delta_token = header.token
+	if vim.tbl_isempty(changed) then
+		return
+	end
+
+	-- rebuild diagnostics of changed files only
+	for path, _ in pairs(changed) do
+		diagnostics[path] = nil
+	end
+	for _, record in pairs(records_by_id) do
+		if changed[get_record_filepath(record, file)] then
+			local filepath, item = make_item(record, file)
+			diagnostics[filepath] = diagnostics[filepath] or {}
+			table.insert(diagnostics[filepath], item)
+		end
+	end
+	for path, _ in pairs(changed) do
+		if diagnostics[path] then
+			table.sort(diagnostics[path], function(a, b) return a.lnum < b.lnum end)
+		end
+		local bufnr = vim.fn.bufnr(path)
+		if vim.fn.bufloaded(bufnr) == 1 then
+			vim.diagnostic.set(ns_id, bufnr, diagnostics[path] or {})
+		end
+	end
+	update_quickfix(ns_id)
+end
+
+-- update files of project from resident python host, the index is rebuilt only if tex files are changed
+local function update_project_files()
+	project_files = nil
+	if vim.fn.exists('*Texflow_project') ~= 1 then
+		return
+	end
+	local file = Utils.get_filedata()
+	local ok, project = pcall(vim.fn.Texflow_project, file.mainpath)
+	if not ok or type(project) ~= 'table' then
+		return
+	end
+	---@cast project {main: string, files: string[], graph: table<string, string[]>, bibliographies: string[]}
+	project_files = {}
+	for _, path in ipairs(project.files) do
+		project_files[Utils.sep_unify(path)] = true
+	end
+	for _, path in ipairs(project.bibliographies) do
+		project_files[Utils.sep_unify(path)] = true
+	end
+end
+
+-- check the file belongs to latex project
+---@param filepath string absolute path of file
+---@param file texflow.filedata
+---@return boolean
+local function is_project_file(filepath, file)
+	if project_files and project_files[filepath] then
+		return true
+	end
+	-- files under compile directory which are not in include graph (local .sty, .cls, .bib ...),
+	-- or all files under it if include graph is not available
+	return filepath:sub(1, #file.compiledir) == file.compiledir
+end
+
 local function set_diagnostic_autocmd()
 	local file = Utils.get_filedata()
 
@@ -232,7 +258,7 @@ local function set_diagnostic_autocmd()
 		callback = function (args)
 			local filepath = Utils.sep_unify(vim.api.nvim_buf_get_name(args.buf))
 			-- add diagnostics of project to quickfix list It current buffer is in latex project
-			if (filepath and filepath ~= '') and string.match(filepath, '^' .. file.compiledir) then
+			if (filepath and filepath ~= '') and is_project_file(filepath, file) then
 				local ns_list = vim.diagnostic.get_namespaces()
 				for id, ns in pairs(ns_list) do
 					if string.find(ns.name, 'texlab') or string.find(ns.name, 'texflow') then
@@ -244,8 +270,51 @@ local function set_diagnostic_autocmd()
 	})
 end
 
+-- show diagnostics from diagnostic records of python log parser
+---@param records texflow.record[] records, or delta output if the first item has 'op'
+local function apply_records(records)
+	set_diagnostic_autocmd()
+	update_project_files()
+	vim.diagnostic.reset(ns_preview_id)
+	if records[1] and records[1].op then
+		apply_delta(records)
+	else
+		records_by_id, delta_token = {}, nil -- the next output is full snapshot
+		add_diagnostic(records)
+	end
+end
+
+-- decode output lines of python log parser, each line is one json record
+---@param data string[] output lines of python log parser
+---@return texflow.record[]
+local function decode_records(data)
+	---@class texflow.record
+	---@field kind string group name of pattern in python log parser
+	---@field severity string 'ERROR'|'WARN'|'INFO'
+	---@field file string? absolute path of file which the message belongs to
+	---@field line number? line number (1-index)
+	---@field message string
+	---@field package string? package name of package warning/error
+	---@field op string? 'reset'|'delta'|'add'|'change'|'remove' of delta output
+	---@field id string? stable id of record in delta output
+	---@field token string? token of this output in header of delta output
+	---@field base string? token of the output which this delta is based on
+	local records = {}
+	for _, v in ipairs(data) do
+		local line = v:gsub('\r', '') -- remove additional \r for windows
+		if line ~= '' then
+			local ok, record = pcall(vim.json.decode, line, {luanil = {object = true}})
+			if ok and type(record) == 'table' then
+				records[#records+1] = record
+			end
+		end
+	end
+	return records
+end
+
 ---@param opts texflow.config
-local function get_log_core_py(opts)
+---@param check texflow.checkopts
+local function get_log_core_py(opts, check)
 	local file = Utils.get_filedata()
 
 	-- make cmd
@@ -256,8 +325,22 @@ local function get_log_core_py(opts)
 		args = {
 			'@LogParser',
 			file.logfile,
+			'--compiledir', file.compiledir,
+			'--main', file.mainpath,
+			'--mmap', -- scan log file without decoding whole contents
+			'--engine', 'dispatch', -- try relevant pattern at the beginning of line only
+			'--discover', -- parse *.blg / *.ilg and logs of subfiles of the same build together
+			'--delta=' .. (delta_token or ''), -- get changes since the last applied output only
 		}
 	}
+	-- parse appended part of log file only in watch mode
+	if check.tail then
+		table.insert(cmd.args, '--tail')
+	end
+	-- join lines which are wrapped at max_print_line
+	if opts.latex.unwrap_log then
+		table.insert(cmd.args, '--unwrap')
+	end
 	cmd = Utils.replace_cmd_token(cmd)
 
 	-- load job
@@ -266,35 +349,107 @@ local function get_log_core_py(opts)
 		stdout_buffered = true,
 		on_stdout = function(_, data)
 			if not data then return end
+			apply_records(decode_records(data))
+		end
+	})
+end
 
-			-- remove additional \r for windows
-			local ndata = {}
-			for _, v in ipairs(data) do
-				local line = v:gsub('\r', '')
-				if line ~= '' then
-					-- add residue message If warn_pkg has multiple sentences.
-					local residue_warn_pkg = string.match(line, '^%(%w+%)%s*(.*)')
-					if residue_warn_pkg then
-						ndata[#ndata] = ndata[#ndata] .. '\n' .. residue_warn_pkg
-					else
-						table.insert(ndata, line)
-					end
-				end
-			end
+-- the latest request of resident parser, it is used to fallback to python script if resident parser fails
+---@type {opts: texflow.config, check: texflow.checkopts}?
+local pending_request = nil
 
-			-- add diagnostics
-			set_diagnostic_autocmd()
-			add_diagnostic(ndata)
-		end
+-- parse log file using resident parser in python host of neovim.
+-- It doesn't need to start new python process for every check.
+---@param opts texflow.config
+---@param check texflow.checkopts
+---@return boolean true if the request is sent to resident parser
+local function get_log_core_rplugin(opts, check)
+	if vim.fn.exists('*Texflow_parse_log') ~= 1 then
+		return false
+	end
+
+	local file = Utils.get_filedata()
+	pending_request = {opts = opts, check = check}
+	local ok = pcall(vim.fn.Texflow_parse_log, file.logfile, {
+		tail = check.tail or false,
+		compiledir = file.compiledir,
+		main = file.mainpath,
+		mmap = true,
+		engine = 'dispatch',
+		discover = true,
+		delta = delta_token or '',
+		unwrap = opts.latex.unwrap_log and 79 or 0,
 	})
+	if not ok then
+		pending_request = nil
+	end
+	return ok
+end
+
+-- callback from resident parser (LogParserService) in python host
+---@param data texflow.record[]? diagnostic records from python log parser
+---@param err string? error message if resident parser fails
+M.on_parsed = function(data, err)
+	local request = pending_request
+	pending_request = nil
+	-- None of python is converted to vim.NIL
+	data = data ~= vim.NIL and data or nil
+	err = err ~= vim.NIL and err or nil
+	if err or not data then
+		-- fallback to python script
+		if request then
+			get_log_core_py(request.opts, request.check)
+		end
+		return
+	end
+	apply_records(data)
+end
+
+-- callback from resident parser with the first errors which are found before the end of parsing
+---@param errors texflow.record[] error records, it contains all errors which are found until now
+M.on_preview = function(errors)
+	if not pending_request then
+		return -- the result has arrived already
+	end
+	local file = Utils.get_filedata()
+
+	---@type table<string, texflow.diagnosticItem[]>
+	local previews = {}
+	for _, record in ipairs(errors) do
+		local filepath, item = make_item(record, file)
+		-- error which is shown already from the previous check doesn't need to be shown again
+		local shown = vim.tbl_contains(diagnostics[filepath] or {}, function (diag)
+			return diag.lnum == item.lnum and diag.message == item.message
+		end, {predicate = true})
+		if not shown then
+			item.namespace = ns_preview_id
+			previews[filepath] = previews[filepath] or {}
+			table.insert(previews[filepath], item)
+		end
+	end
+
+	vim.diagnostic.reset(ns_preview_id)
+	for path, diag in pairs(previews) do
+		local bufnr = vim.fn.bufnr(path)
+		if vim.fn.bufloaded(bufnr) == 1 then
+			vim.diagnostic.set(ns_preview_id, bufnr, diag)
+		end
+	end
 end
 
 
 -- check *.log file to find errors using rg and show to statuscolumn
 ---@param opts texflow.config
-M.errorCheck = function (opts)
+---@param check texflow.checkopts?
+M.errorCheck = function (opts, check)
 	opts = vim.tbl_deep_extend('force', Config.get(), opts or {})
-	get_log_core_py(opts)
+
+	---@class texflow.checkopts
+	---@field tail boolean? parse appended part of log file only since previous check, it is used in watch mode
+	check = check or {}
+	if not get_log_core_rplugin(opts, check) then
+		get_log_core_py(opts, check)
+	end
 end
 
 
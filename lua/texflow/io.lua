@@ -15,61 +15,167 @@ local Utils = require('texflow.utils')
 -- So it is used to only startup
 
 
+-- INFO: server file is append log (one json per line) which is shared with rplugin/python3/utils/store.py
+-- Each line is {"k": alias, "v": servername} and the last line of the alias is valid.
+-- {"k": alias, "v": null} deletes the alias. python compacts the file when it grows.
+-- lua takes the same lock file with python before appending, or the line which is appended
+-- while python rewrites the file for compaction is lost.
+
+
 -- set texflow server file
-local serverfile = vim.fn.stdpath('data')
-serverfile = serverfile ..  '/texflow/texflow_server.json'
-serverfile = Utils.sep_unify(serverfile)
+local datadir = Utils.sep_unify(vim.fn.stdpath('data') .. '/texflow')
+local serverfile = Utils.sep_unify(datadir .. '/texflow_server.jsonl')
+local legacyfile = Utils.sep_unify(datadir .. '/texflow_server.json') -- whole json file of previous version
+local lockfile = Utils.sep_unify(datadir .. '/texflow_server.lock') -- it exists while a writer has the lock
+local lock_timeout = 5000 -- ms to wait lock of other writer, same with LOCK_TIMEOUT of lock.py
+local lock_stale = 10 -- seconds after which lock file is regarded as left by crashed process
+local lock_retry = 10 -- ms between attempts to take lock, it is retried with timer not to block the editor
+
+local pending = {} -- lines which wait lock file, they are written in order of append_serverdata()
+local deadline = nil -- hrtime until which lock is retried, nil if retry is not scheduled
+
+-- take lock file, it is created exclusively like python does
+---@return integer? fd file descriptor of lock file, nil if other writer has the lock or open is failed
+---@return string? err error of open except of the lock of other writer
+local function try_lock()
+	local fd, open_err, errname = vim.uv.fs_open(lockfile, 'wx', tonumber('644', 8))
+	if fd then
+		return fd
+	end
+	if errname ~= 'EEXIST' then
+		return nil, open_err
+	end
+	local stat = vim.uv.fs_stat(lockfile)
+	if stat and os.time() - stat.mtime.sec > lock_stale then
+		vim.uv.fs_unlink(lockfile) -- lock of crashed process, it is taken at the next try
+	end
+	return nil
+end
 
--- JSON file processing function
----@return table json data table from serverfile
-local function load_serverdata()
-	-- Create the directory if it does not exist
-	if vim.fn.filereadable(serverfile) ~= 1 then
-        local dir = vim.fs.dirname(vim.fn.fnamemodify(serverfile, ':h'))
-        vim.fn.mkdir(dir, 'p')
-		return {}
+-- append lines to serverfile, the lock must be held.
+-- If the last line is written partially by crashed writer, new line is added first like ServerStore.append()
+---@param lines string[]
+local function write_lines(lines)
+	local text = table.concat(lines, '\n') .. '\n'
+	local stat = vim.uv.fs_stat(serverfile)
+	if stat and stat.size > 0 then
+		local fd = vim.uv.fs_open(serverfile, 'r', 0)
+		if fd then
+			if vim.uv.fs_read(fd, 1, stat.size - 1) ~= '\n' then
+				text = '\n' .. text
+			end
+			vim.uv.fs_close(fd)
+		end
+	end
+	local fd, err = vim.uv.fs_open(serverfile, 'a', tonumber('644', 8))
+	if not fd then
+		error(err)
 	end
+	vim.uv.fs_write(fd, text)
+	vim.uv.fs_close(fd)
+end
 
-	-- check the json file has contents
-	-- use io.open / read() to remain json indented form to compatible python
-	local file = io.open(serverfile, 'r')
-	if not file then
-		return {}
+-- write pending lines while holding lock file.
+-- If other writer (python) has the lock, it is tried again with timer until lock_timeout,
+-- waiting the lock in this function would freeze the editor.
+local function flush_pending()
+	if #pending == 0 then
+		deadline = nil
+		return
+	end
+	local fd, err = try_lock()
+	if fd then
+		local lines = pending
+		pending, deadline = {}, nil
+		local ok, write_err = pcall(write_lines, lines)
+		vim.uv.fs_close(fd)
+		vim.uv.fs_unlink(lockfile)
+		if not ok then
+			print("TexFlow: Failed to write file, " .. tostring(write_err))
+		end
+		return
+	end
+	deadline = deadline or (vim.uv.hrtime() + lock_timeout * 1e6)
+	if err or vim.uv.hrtime() > deadline then
+		pending, deadline = {}, nil
+		print("TexFlow: Failed to write file, " .. (err or ('timeout to wait lock file ' .. lockfile)))
+		return
+	end
+	vim.defer_fn(flush_pending, lock_retry)
+end
+
+-- append entries to serverfile, they are written after the entries which wait lock file
+---@param entries table[] list of {k = alias, v = servername|vim.NIL}
+local function append_serverdata(entries)
+	if #entries == 0 then
+		return
+	end
+	for _, entry in ipairs(entries) do
+		table.insert(pending, vim.json.encode(entry))
+	end
+	vim.fn.mkdir(datadir, 'p')
+	if not deadline then -- retry is not scheduled
+		flush_pending()
 	end
+end
 
-	-- read contents
+-- make serverfile from legacy json file
+local function migrate_serverdata()
+	if vim.fn.filereadable(serverfile) == 1 or vim.fn.filereadable(legacyfile) ~= 1 then
+		return
+	end
+	local file = io.open(legacyfile, 'r')
+	if not file then
+		return
+	end
 	local contents = file:read('*a')
 	io.close(file)
 
-	if not contents or #contents == 0 then
-		vim.notify('TexFlow: Cannot read texflow_server.json file', vim.log.levels.WARN)
-		return {}
+	local ok, json_data = pcall(vim.json.decode, contents or '')
+	if ok and type(json_data) == 'table' then
+		local entries = {}
+		for key, servername in pairs(json_data) do
+			table.insert(entries, {k = key, v = servername})
+		end
+		append_serverdata(entries)
 	end
+end
 
-	local ok, json_data = pcall(vim.json.decode, contents)
-	if ok and type(json_data) == 'table' then
-		return json_data
-	else
+-- read live entries from serverfile
+---@return table<string, string> alias to servername
+local function load_serverdata()
+	-- Create the directory if it does not exist
+	vim.fn.mkdir(datadir, 'p')
+	migrate_serverdata()
+	if vim.fn.filereadable(serverfile) ~= 1 then
 		return {}
 	end
+
+	local data = {}
+	for line in io.lines(serverfile) do
+		-- broken line can be remained if other process is crashed while writing
+		local ok, entry = pcall(vim.json.decode, line)
+		if ok and type(entry) == 'table' and type(entry.k) == 'string' then
+			if type(entry.v) == 'string' then
+				data[entry.k] = entry.v
+			else
+				data[entry.k] = nil
+			end
+		end
+	end
+	return data
 end
 
 
 -- add servername of current neovim instance to serverfile
 ---@param filepath string alias or tex file path which is corresponding with servername
 M.add_serverdata = function(filepath)
-	local data = load_serverdata()
+	vim.fn.mkdir(datadir, 'p')
+	migrate_serverdata()
 
-    -- update current active neovim instance servername to json file
+	-- update current active neovim instance servername, only one line is appended
 	filepath = Utils.sep_unify(filepath, '/')
-	data[filepath] = vim.v.servername
-
-	-- native vim library only supports compressed json format, but it can be read by python
-    local json_data = {vim.json.encode(data)}
-    local ok, err = pcall(vim.fn.writefile, json_data, serverfile)
-	if not ok then
-        print("TexFlow: Failed to write file, " .. (err or "Unknown error"))
-    end
+	append_serverdata({{k = filepath, v = vim.v.servername}})
 end
 
 
@@ -77,23 +183,19 @@ M.prune_serverdata = function ()
 	local data = load_serverdata()
 
 	-- check the server is alive
+	local entries = {}
 	for key, servername in pairs(data) do
 		local ok, chan = pcall(vim.fn.sockconnect, 'pipe', servername, {rpc = false})
 		if not ok or chan <= 0 then -- delete dead keys from texflow server
-			data[key] = nil
+			table.insert(entries, {k = key, v = vim.NIL})
 		else
 			vim.fn.chanclose(chan) -- close activation
 		end
 	end
 
-	-- write
-    local json_data = {vim.json.encode(data)}
-    local ok, err = pcall(vim.fn.writefile, json_data, serverfile)
-	if not ok then
-        print("TexFlow: Failed to write file, " .. (err or "Unknown error"))
-    end
+	-- write deletion only
+	append_serverdata(entries)
 end
 
 
 return M
-
@@ -2,12 +2,13 @@
 """
 SyncTeX Inverse Search Script for Neovim
 Usage: python inverse_search.py <server_name> <tex_file> <line_number>
+       python inverse_search.py --serve  (run broker which keeps connections to neovim servers)
+       python inverse_search.py --synctex <pdf> <page> <x> <y> [alias]
+                                (find tex file and line from position of pdf with texflow's synctex index)
 """
 import sys
 
-from utils.commands import Commands
 from utils.errors import err_notify
-from utils.server import ServerManager
 
 
 def main():
@@ -28,6 +29,17 @@ def main():
     Returns:
         None
     """
+    # run inverse search broker which keeps connections to neovim servers
+    if sys.argv[1:] == ['--serve']:
+        from utils.broker import serve
+        serve()
+        return
+
+    # find tex file and line from position in pdf, for viewers which give position instead of tex line
+    if sys.argv[1:2] == ['--synctex']:
+        synctex_search(sys.argv[2:])
+        return
+
     # check argument is valid
     len_args = len(sys.argv)
     if len_args <= 2 or len_args >= 5:
@@ -43,15 +55,60 @@ def main():
 
     # set filename as servername if argument is void
     alias = sys.argv[3] if len_args == 4 else filename
+    jump(filename, line, alias)
+
+
+def synctex_search(args:list[str]) -> None:
+    """
+    Inverse search with position of pdf file
+
+    Args:
+        args(list[str]) : [pdf, page, x, y, alias(optional)]
+            pdf (str) : path of pdf file or its synctex file
+            page (int) : page number starts with 1
+            x, y (float) : position from the top-left of page in big point (pdf unit)
+            alias (str, optional) : same with alias of main(), tex file path is used if it is empty
+    """
+    if len(args) not in (4, 5):
+        err_notify('--synctex needs <pdf> <page> <x> <y> [alias]')
+        sys.exit(1)
+
+    from utils import synctex
+    synctex_file = synctex.find_synctex(args[0])
+    if synctex_file is None:
+        err_notify('There is no synctex file of ' + args[0])
+        sys.exit(1)
+    try:
+        result = synctex.inverse(synctex_file, int(args[1]), float(args[2]), float(args[3]))
+    except (OSError, ValueError, EOFError) as e:
+        err_notify('Cannot read synctex file : ' + synctex_file, str(e))
+        sys.exit(1)
+    if result is None:
+        err_notify(f'There is no source line at page {args[1]} of ' + args[0])
+        sys.exit(1)
+    jump(result['file'], result['line'], args[4] if len(args) == 5 else result['file'])
+
+
+def jump(filename:str, line:int, alias:str) -> None:
+    """ jump to line of tex file in neovim which is matched with alias """
+    # request to broker first, it doesn't need to import pynvim and connect to neovim
+    from utils import client
+    if client.inverse_search(filename, line, alias):
+        return
 
     # connect to nvim instance and jump to line
-    mg = ServerManager(None, alias) # get server instance
+    from utils import server
+    from utils.commands import Commands
+    mg = server.ServerManager(None, alias) # get server instance
     cmd = Commands(mg.nvim)
     cmd.jump_to_line(filename, line)
 
 
 if __name__ == "__main__":
     main()
+else:
+    # neovim python host loads this file as remote plugin, register ServerManager.
+    from utils.server import ServerManager  # noqa: F401
 
 
 
@@ -1,80 +1,168 @@
+import argparse
+import json
 import os
-import re
 import sys
 
 from utils.errors import err_notify
-from utils.parser import Parser
+
+
+def get_args() -> argparse.Namespace:
+    """ parse command line arguments """
+    parser = argparse.ArgumentParser(prog='LogParser', description='parse errors/warnings of latex log file')
+    _ = parser.add_argument('files', nargs='*', metavar='file',
+                            help='*.log file path. *.blg (biber/bibtex) and *.ilg (makeindex) can be added, '
+                                 'all files are parsed concurrently and the results are merged')
+    _ = parser.add_argument('--discover', action='store_true',
+                            help='parse *.blg / *.ilg of the same name and logs of subfiles next to the first log file')
+    _ = parser.add_argument('--tail', action='store_true',
+                            help='parse appended part of log file only since the previous call with --tail')
+    _ = parser.add_argument('--compiledir', default=None,
+                            help='directory where latex engine runs, default is directory of log file')
+    _ = parser.add_argument('--main', default=None, help='absolute path of main tex file')
+    _ = parser.add_argument('--mmap', action='store_true',
+                            help='scan memory-mapped log file and decode matched messages only')
+    _ = parser.add_argument('--engine', choices=['regex', 'dispatch'], default='regex',
+                            help='scanner engine, dispatch tries the relevant pattern at the beginning of line only')
+    _ = parser.add_argument('--unwrap', type=int, nargs='?', const=79, default=0, metavar='WIDTH',
+                            help='join lines which are wrapped by TeX at max_print_line (default 79), '
+                                 'max_print_line of texmf.cnf doesn\'t need to be changed')
+    _ = parser.add_argument('--jobs', type=int, default=None,
+                            help='the number of processes to parse large log file in parallel, it is ignored with --tail. '
+                                 'With --batch, the number of processes to parse documents (default is the number of cpus)')
+    _ = parser.add_argument('--stream', action='store_true',
+                            help='print each record as soon as it is found, the first error of huge log file is shown '
+                                 'without waiting the end of parsing. It is ignored with --tail / --delta')
+    _ = parser.add_argument('--max-errors', type=int, default=None, metavar='N',
+                            help='stop after N errors, parsing of the rest of log file is skipped with --stream')
+    _ = parser.add_argument('--severity', choices=['ERROR', 'WARN', 'INFO'], default=None,
+                            help='print records of this severity or higher only')
+    _ = parser.add_argument('--batch', action='store_true',
+                            help='parse many documents for CI. files can be log files, directories (*.log recursively) '
+                                 'or glob patterns. The result of each document is printed as json line when it is '
+                                 'completed, and the summary is printed at last')
+    _ = parser.add_argument('--no-cache', action='store_true',
+                            help='parse log file even if the result of unchanged log file is cached')
+    _ = parser.add_argument('--cache-stats', action='store_true', help='print hit/miss counters of cache and exit')
+    _ = parser.add_argument('--delta', nargs='?', const='', default=None, metavar='TOKEN',
+                            help='print changes since the previous output of TOKEN (the first line is header). '
+                                 'full snapshot is printed if TOKEN is empty or it is not the latest output')
+    _ = parser.add_argument('--trace', nargs='?', const='stderr', default=None, metavar='FILE',
+                            help='write wall time / size / match counts of each phase as json lines '
+                                 'to FILE or stderr. TEXFLOW_TRACE environment variable does the same')
+    return parser.parse_args()
 
 
 def main():
 
-    if len(sys.argv) != 2:
+    if len(sys.argv) < 2:
         err_notify('LogParser must have 1 argument : *.log file path')
         sys.exit(1)
 
-    file = sys.argv[1]
-    if not os.path.exists(file):
-        err_notify('LogParse cannot find the log file : ' + file)
-        sys.exit(1)
+    args = get_args()
+    if args.cache_stats:
+        from utils import cache
+        print(json.dumps(cache.get_stats()))
+        return
+    if args.batch:
+        batch_main(args)
+        return
+
+    files = args.files
+    for file in files or ['']:
+        if not file or not os.path.exists(file):
+            err_notify('LogParse cannot find the log file : ' + file)
+            sys.exit(1)
+    file = files[0]
+
+    # parser is imported after validation of arguments, invalid call doesn't pay for it
+    from utils import trace
+    from utils.parser import (
+        compact_record,
+        discover_logs,
+        filter_records,
+        iter_logs,
+        parse_logs,
+    )
+    if args.trace:
+        trace.enable(args.trace)
+
+    if args.discover:
+        discovered = discover_logs(file)
+        files = discovered + [other for other in files[1:] if other not in discovered]
+
+    if args.stream and not args.tail and args.delta is None:
+        # each record is flushed as soon as it is found, editor / CI shows the first error immediately
+        with trace.phase('stream', file=file, logs=len(files), engine=args.engine) as ph:
+            count = 0
+            for record in iter_logs(files, args.compiledir, args.main, args.engine, not args.no_cache,
+                                    args.max_errors, args.severity, args.unwrap):
+                print(json.dumps(compact_record(record), ensure_ascii=False, separators=(',', ':')), flush=True)
+                count += 1
+            ph['records'] = count
+        return
+
+    jobs = args.jobs or 1
+    with trace.phase('main', file=file, logs=len(files), tail=args.tail, mmap=args.mmap, engine=args.engine,
+                     jobs=jobs) as ph:
+        if args.tail:
+            # watch mode checks the same log file repeatedly, parse the appended part of the first log file only
+            from utils import tail
+            state = tail.load_state(file)
+            result = parse_logs(files, state, args.compiledir, args.main, args.mmap, args.engine,
+                                use_cache=not args.no_cache, unwrap=args.unwrap)
+            tail.save_state(file, state)
+        else:
+            result = parse_logs(files, None, args.compiledir, args.main, args.mmap, args.engine, jobs,
+                                not args.no_cache, args.unwrap)
+        if args.max_errors or args.severity:
+            result = list(filter_records(result, args.max_errors, args.severity))
 
+        # print one record per line with json format
+        with trace.phase('serialize', records=len(result), delta=args.delta is not None) as ph_out:
+            if args.delta is not None:
+                from utils.delta import make_delta
+                items = make_delta(file, result, args.delta, args.compiledir, args.main)
+            else:
+                items = [compact_record(record) for record in result]
+            lines = [json.dumps(item, ensure_ascii=False, separators=(',', ':')) for item in items]
+            output = '\n'.join(lines)
+            ph_out['chars'] = len(output)
+        print(output)
+        ph['records'] = len(result)
 
-    # error/warning patterns of latex log file
-    # use $ to get all sentence without \n
-    # (?:a) includes a
-    # (?=a) not includes a
-    # add \.(?:\n|$) to detect multiline message, It detects dot is the last of sentence.
-    # but some warning like 'pdfTeX warning', doesn't have a dot at end of sentence.
-    patterns = {
-        # "filestart": r'\((?P<filestart>[^\)\(\n]*)(?:\n|$)', it has problem.
-        # 1) capture ends until (,),\n with [^\)\(\n]*
-        # 2) and check the next character is ended with \n or $ with (?:\n|$).
-        # if the text is (./some/path/file),  it captures until (./some/path/file, and next character is ), not \n|$.
-        # so this whole matching line will be discard.
-
-        # filestart : Capture from the opening parenthesis until the closing parenthesis ')' or \n appears.
-        # start with '(' at anywhere, capture any word except of ')' and '\n'
-        # [^\)\(*] means the capture will be end before (,), the (,) won't be included in capture group(0).
-        # so the next match will starts from (,). it makes next match can capture <fileend>.
-        # (?:\n|$) means the capture will be end before \n|$, but \n|$ are included in capture group(0).
-        # the next match will starts from next character of \n|$.
-        # "filestart": r'\((?P<filestart>[^\)\(\n]*)(?:\(|\)|\n|$)',
-        "filestart": r'(?P<filestart>\([^\)\(\n]*)\n?',
-        # "filestart": r'\((?P<filestart>[^\)\(\n]*)',
-        "fileend": r'(?P<fileend>[\)])',                                 # fileend : capture all ')'
-        "error1": r'^(?P<error1>[^\n]*\.tex:\d+:.*?\.)(?:\n|$)',         # test2.tex:42: LaTeX Error: ~
-        # <error2> : ! LaTeX Error: message
-        # It captures all strings from '!' to \n or $ after dot(.).
-        # '.*?' means non-greedy capture '.*' + '?'. because '.*' means greedy capture which captures more than one line.
-        "error2": r'^(?P<error2>! .*?\.)(?:\n|$)',                       # ! LaTeX Error: ~
-        "error_pkg": r'^(?P<error_pkg>Package \w+ Error:.*?\.)(?:\n\n|\n$)',
-        # <line> : l.21 \beigne~
-        # capture <l.21> only, \b is added to distinguish word boundary.
-        # If \b doesn't exist, \w word right after l.21 will be captured. the line number always add white space.
-        "line": r'^(?P<line>l\.\d+)\b',                                  # l.21 ~
-        "warn_latex": r'^(?P<warn_latex>LaTeX Warning:.*?\.)(?:\n|$)',   # LaTeX Warning: There were undefined references.
-        # Package <name> Warning: messages,
-        # It can be multiple sentences with starting '(name)', so the end condition must be \n\n
-        "warn_pkg": r'^(?P<warn_pkg>Package \w+ Warning:.*?\.)(?:\n\n|\n$)',
-        "warn_pdftex": r'^(?P<warn_pdftex>pdfTeX warning.*?)(?=\s{3,})', # pdfTex warning (ext4): ~ end with multiple white spaces
-        # <warn_toc> : warning (pdf backend) : ~~ \n[1
-        # it capture until \[ but excludes \n or $
-        "warn_toc": r'^(?P<warn_toc>warning.*?)(?:\n|$)(?=\[)', # pdfTex warning (ext4): ~ end with multiple white spaces
-        "warn_over": r'^(?P<warn_over>(Overfull|Underfull).*?)(?:\n|$)(?=\[)',   # 'overfull|underfull' to before ~ 59--60 []
-
-        # If it is failed to detect some files, It shows error
-        "warn_nofile": r'^(?P<warn_nofile>No file.*?\.)(?:\n|$)',   # No file <filename>.bbl
-    }
-
-    combined_patterns = r'|'.join(f"{pattern}" for pattern in patterns.values()) # combine patterns to string with '|',
-    err_regex  = re.compile(combined_patterns, re.MULTILINE|re.DOTALL) # make compile command to re-usability
-    # re.MULTILINE makes '$' means end of line, not end of document, '\Z' means end of document.
-    # If not re.MULTILINE, '$' means end of document.
-
-    p = Parser(file, err_regex)
-    result = p.get_matches_all()
-    result = '\n'.join(result)
-    print(result)
+
+def batch_main(args:argparse.Namespace) -> None:
+    """ parse many documents on process pool with the same parser and patterns of editor """
+    import time
+
+    from utils import trace
+    from utils.batch import collect_logs, get_summary, run_batch
+    if args.trace:
+        trace.enable(args.trace)
+
+    files = collect_logs(args.files)
+    if not files:
+        err_notify('LogParser cannot find log files of batch : ' + ' '.join(args.files))
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = []
+    with trace.phase('batch', documents=len(files)):
+        for result in run_batch(files, args.jobs or os.cpu_count() or 1, args.discover, args.mmap, args.engine,
+                                not args.no_cache, args.unwrap):
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False, separators=(',', ':')), flush=True)
+    summary = get_summary(results, time.perf_counter() - start)
+    print(json.dumps(summary, ensure_ascii=False, separators=(',', ':')), flush=True)
+    if summary['failed']:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
     main()
+elif __name__ != '__mp_main__':
+    # neovim python host loads this file as remote plugin, register the resident parser, synctex and project index.
+    # It is not imported when this file is executed as script, to keep the startup of fallback path fast.
+    # worker process of parallel parsing (--jobs) imports this file as '__mp_main__', it doesn't need the plugin.
+    from utils.service import LogParserService, ProjectService, SyncTexService  # noqa: F401
+
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import glob
+import os
+import time
+from collections.abc import Iterator
+from typing import Any, TypedDict
+
+from . import cache
+from .parser import compact_record, discover_logs, parse_logs
+
+
+class DocumentResult(TypedDict):
+    """ result of one document in batch mode, it is printed as one json line """
+    type:     str             # 'document'
+    file:     str             # main log file of document
+    logs:     list[str]       # parsed log files (main log, *.blg, *.ilg, logs of subfiles with discover)
+    bytes:    int             # total size of parsed log files
+    ms:       float           # wall time to parse the document in worker
+    errors:   int
+    warnings: int
+    records:  list[dict[str, Any]]
+    failed:   str|None        # error message if the document cannot be parsed
+
+
+def collect_logs(paths:list[str]) -> list[str]:
+    """
+    get log files of batch from arguments
+
+    Args:
+        paths(list[str]) : log file, directory (walked recursively for *.log) or glob pattern (e.g. build/**/*.log)
+
+    Return:
+        files(list[str]) : absolute paths of log files without duplicated one, in order of arguments
+    """
+    files:list[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = [os.path.join(root, name) for root, _, names in os.walk(path)
+                     for name in names if name.endswith('.log')]
+        elif glob.has_magic(path):
+            found = [file for file in glob.glob(path, recursive=True) if os.path.isfile(file)]
+        else:
+            found = [path]
+        files.extend(sorted(os.path.abspath(file) for file in found))
+    return list(dict.fromkeys(files))
+
+
+def parse_document(logfile:str, discover:bool=False, use_mmap:bool=False, engine:str='regex',
+                   use_cache:bool=False, unwrap:int=0) -> DocumentResult:
+    """
+    parse log files of one document, it runs in worker process of batch.
+    Main tex file is <name>.tex next to log file (if it exists), it is used to find the line of package messages.
+    """
+    start = time.perf_counter()
+    result:DocumentResult = {'type': 'document', 'file': logfile, 'logs': [logfile], 'bytes': 0, 'ms': 0,
+                             'errors': 0, 'warnings': 0, 'records': [], 'failed': None}
+    try:
+        logs = discover_logs(logfile) if discover else [logfile]
+        mainpath = os.path.splitext(logfile)[0] + '.tex'
+        records = parse_logs(logs, None, None, mainpath if os.path.isfile(mainpath) else None,
+                             use_mmap, engine, 1, use_cache, unwrap)
+        result['logs'] = logs
+        result['bytes'] = sum(os.path.getsize(log) for log in logs)
+        result['errors'] = sum(record['severity'] == 'ERROR' for record in records)
+        result['warnings'] = sum(record['severity'] == 'WARN' for record in records)
+        result['records'] = [compact_record(record) for record in records]
+    except Exception as e:
+        result['failed'] = f'{type(e).__name__}: {e}' # one broken log doesn't stop the batch
+    if use_cache:
+        cache.flush_stats() # worker process of pool exits without atexit
+    result['ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+def run_batch(files:list[str], jobs:int, discover:bool=False, use_mmap:bool=False, engine:str='regex',
+              use_cache:bool=False, unwrap:int=0) -> Iterator[DocumentResult]:
+    """
+    parse documents on process pool and yield the result of each document as soon as it is completed.
+    The order of results is the order of completion, not the order of files.
+
+    Args:
+        files(list[str]) : main log file of each document
+        jobs(int) : the number of worker processes, documents are parsed in this process if it is 1
+        others : same with parse_document()
+    """
+    if jobs <= 1 or len(files) <= 1:
+        for file in files:
+            yield parse_document(file, discover, use_mmap, engine, use_cache, unwrap)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as pool:
+        futures = [pool.submit(parse_document, file, discover, use_mmap, engine, use_cache, unwrap)
+                   for file in files]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def get_summary(results:list[DocumentResult], elapsed:float) -> dict[str, Any]:
+    """
+    get summary of batch
+
+    Args:
+        results(list[DocumentResult]) : results of all documents
+        elapsed(float) : wall time of whole batch in seconds
+    """
+    total_bytes = sum(result['bytes'] for result in results)
+    return {
+        'type': 'summary',
+        'documents': len(results),
+        'failed': sum(result['failed'] is not None for result in results),
+        'errors': sum(result['errors'] for result in results),
+        'warnings': sum(result['warnings'] for result in results),
+        'bytes': total_bytes,
+        'seconds': round(elapsed, 3),
+        'mb_per_s': round(total_bytes / (1 << 20) / elapsed, 2) if elapsed > 0 else None,
+        # errors / warnings of each document, documents with errors first
+        'per_document': [{'file': result['file'], 'errors': result['errors'], 'warnings': result['warnings']}
+                         for result in sorted(results, key=lambda result: (-result['errors'], result['file']))],
+    }
@@ -0,0 +1,237 @@
+import json
+import os
+import secrets
+import signal
+import socket
+import sys
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, TypeVar
+
+import pynvim
+
+from . import client, paths, probe, server
+from .commands import jump_to_line_lua
+from .store import ServerStore
+
+RPC_TIMEOUT = 1.0 # seconds, deadline of attach / rpc to neovim. client waits client.REQUEST_TIMEOUT in total
+
+T = TypeVar('T')
+
+
+class Broker:
+    """
+    long-running process which accepts inverse search requests from utils/client.py.
+    It keeps connections to neovim servers, so a click in pdf viewer doesn't need
+    python startup with pynvim, server file parsing and new socket connection.
+    """
+    sock:          socket.socket|None
+    token:         str                     # secret which client reads from address file
+    address:       dict[str, Any]          # contents of address file
+    servers:       dict[str, pynvim.Nvim]  # warm connections of servername
+    store:         ServerStore
+    mapping:       dict[str, str]          # server mapping which is loaded from store file
+    mapping_mtime: tuple[int, int]         # (mtime, size) of store file when mapping is loaded
+
+    def __init__(self):
+        """ initialize variable at creation """
+        self.sock = None
+        self.token = secrets.token_hex(16)
+        self.address = {}
+        self.servers = {}
+        self.store = ServerStore()
+        self.mapping = {}
+        self.mapping_mtime = (-1, -1)
+
+    def start(self) -> bool:
+        """
+        listen local socket and write its address to address file
+
+        Return:
+            result(bool) : False if other broker is running already
+        """
+        if (client.send_request({'ping': True}) or {}).get('ok'):
+            return False
+
+        data_dir = paths.get_data_dir()
+        data_dir.mkdir(parents=True, exist_ok=True)
+        if hasattr(socket, 'AF_UNIX') and sys.platform != 'win32':
+            sock_file = data_dir / 'texflow_broker.sock'
+            sock_file.unlink(missing_ok=True) # socket file of dead broker
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(str(sock_file))
+            self.address = {'family': 'unix', 'address': str(sock_file), 'token': self.token}
+        else:
+            # windows doesn't support unix socket in python, use loopback only
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.bind(('127.0.0.1', 0))
+            self.address = {'family': 'tcp', 'address': list(self.sock.getsockname()), 'token': self.token}
+        self.sock.listen(8)
+
+        # write address file atomically, client can read it at the same time
+        address_file = client.get_address_file()
+        tmp_file = address_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.address, f)
+        if os.name != 'nt':
+            os.chmod(tmp_file, 0o600) # token is secret of current user
+        os.replace(tmp_file, address_file)
+        return True
+
+    def serve_forever(self) -> None:
+        """ handle requests one by one, inverse search is requested by user click """
+        assert self.sock is not None
+        while True:
+            conn, _ = self.sock.accept()
+            with conn:
+                try:
+                    conn.settimeout(client.REQUEST_TIMEOUT)
+                    with conn.makefile('rb') as f:
+                        request = json.loads(f.readline())
+                    response = self.handle(request)
+                    conn.sendall(json.dumps(response).encode('utf-8') + b'\n')
+                except (OSError, ValueError):
+                    continue # client is gone or sent broken request, it will use the direct path
+
+    def handle(self, request:dict[str, Any]) -> dict[str, Any]:
+        """ handle one request and make response """
+        if not isinstance(request, dict) or not secrets.compare_digest(str(request.get('token')), self.token):
+            return {'ok': False, 'error': 'invalid token'}
+        if request.get('ping'):
+            return {'ok': True}
+        try:
+            self.jump(str(request['file']), int(request['line']), str(request.get('alias') or ''))
+            return {'ok': True}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def jump(self, filename:str, line:int, alias:str) -> None:
+        """
+        jump to line in neovim server which is matched with alias.
+        It follows the rule of ServerManager.get_server(), 'recent' is used if the server of alias is dead.
+        """
+        texname = paths.path_normalize(filename)
+        error:Exception = RuntimeError('There are no opened neovim instance to connect')
+        for servername in self.get_servernames(alias):
+            # warm connection can be closed if neovim is restarted with same servername, attach again once
+            for _ in range(2):
+                warm = servername in self.servers
+                try:
+                    nvim = self.attach(servername)
+                    _ = call_with_timeout(nvim.exec_lua, jump_to_line_lua, texname, line)
+                    return
+                except pynvim.NvimError:
+                    raise # neovim is alive but jumping is failed
+                except TimeoutError as e:
+                    error = e
+                    _ = self.servers.pop(servername, None) # connection is used by hung worker, don't close it
+                    break # neovim is hung, try the next server
+                except Exception as e:
+                    error = e
+                    self.detach(servername)
+                    if not warm:
+                        break # new connection is failed, neovim is not alive
+        raise error
+
+    def get_servernames(self, alias:str) -> list[str]:
+        """ get servernames to try in order from alias """
+        alias = alias or 'recent'
+        mapping = self.load_mapping()
+        if server.ServerManager.is_fullservername(alias):
+            names = [alias]
+        else:
+            names = [mapping.get(alias) or mapping.get('recent', '')]
+        if alias != 'recent':
+            names.append(mapping.get('recent', ''))
+
+        result:list[str] = []
+        for name in names:
+            if name and name not in result:
+                result.append(name)
+        return result
+
+    def load_mapping(self) -> dict[str, str]:
+        """ load server mapping again if store file is changed """
+        try:
+            self.store.migrate()
+            stat = os.stat(self.store.file)
+            if (stat.st_mtime_ns, stat.st_size) != self.mapping_mtime:
+                self.mapping = self.store.load()
+                self.mapping_mtime = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass # use previous mapping
+        return self.mapping
+
+    def attach(self, servername:str) -> pynvim.Nvim:
+        """
+        get warm connection of neovim server.
+        New connection is made only if neovim responds to probe (utils/probe.py) in time,
+        pynvim.attach() to half-dead neovim doesn't return.
+        """
+        nvim = self.servers.get(servername)
+        if nvim is None:
+            if not probe.check_alive([servername]).get(servername):
+                raise ConnectionError('neovim server is not responding : ' + servername)
+            nvim = call_with_timeout(pynvim.attach, 'socket', path=servername)
+            self.servers[servername] = nvim
+        return nvim
+
+    def detach(self, servername:str) -> None:
+        """ close connection of neovim server """
+        nvim = self.servers.pop(servername, None)
+        if nvim is not None:
+            try:
+                nvim.close()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        """ close all connections and remove address file if it is written by this broker """
+        for servername in list(self.servers):
+            self.detach(servername)
+        if self.sock is not None:
+            self.sock.close()
+            if self.address.get('family') == 'unix':
+                Path(self.address['address']).unlink(missing_ok=True)
+        if client.load_address() == self.address:
+            client.get_address_file().unlink(missing_ok=True)
+
+
+def call_with_timeout(func:Callable[..., T], *args:Any, **kwargs:Any) -> T:
+    """
+    call func on worker thread and wait it until RPC_TIMEOUT.
+    pynvim has no deadline of rpc, so hung neovim blocks the worker thread only, not the accept loop.
+    The connection whose call is timed out must not be used again, the worker still waits its response.
+    TimeoutError is raised if func doesn't return in time.
+    """
+    result:list[T] = []
+    errors:list[Exception] = []
+
+    def run() -> None:
+        try:
+            result.append(func(*args, **kwargs))
+        except Exception as e:
+            errors.append(e) # raised in the thread of accept loop
+
+    worker = threading.Thread(target=run, daemon=True) # hung worker doesn't block exit of broker
+    worker.start()
+    worker.join(RPC_TIMEOUT)
+    if errors:
+        raise errors[0]
+    if not result:
+        raise TimeoutError(f'neovim doesn\'t respond in {RPC_TIMEOUT}s')
+    return result[0]
+
+
+def serve() -> None:
+    """ run broker until the process is terminated """
+    broker = Broker()
+    if not broker.start():
+        return # other broker is running
+    # jobstop() of neovim sends SIGTERM, clean up address file before exit
+    _ = signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        broker.serve_forever()
+    finally:
+        broker.close()
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from . import paths
+from .lock import file_lock
+
+if TYPE_CHECKING:
+    from .record import Record
+
+CACHE_MAX_ENTRIES = 64       # the number of cached log files across projects
+CACHE_MAX_SIZE = 64 << 20    # total bytes of cache files
+HASH_BLOCK_SIZE = 1 << 20    # read size to calculate hash of log file
+# version of parse result, increase it when parser or patterns change the result of the same log file.
+# cached results of previous version are not used after plugin update.
+CACHE_VERSION = 2
+STATS_FLUSH_INTERVAL = 10.0  # seconds, counters of resident parser are written to stats file at this interval
+
+
+def get_cache_dir() -> Path:
+    """ get directory to save parse result of log files """
+    return paths.get_data_dir() / 'cache'
+
+
+def get_stats_file() -> Path:
+    """ get file path to save hit/miss counters of cache """
+    return paths.get_data_dir() / 'cache_stats.json'
+
+
+def get_stats_lock_file() -> Path:
+    """ get lock file of stats file, processes which parse log files at the same time add counters to it """
+    return paths.get_data_dir() / 'cache_stats.lock'
+
+
+def get_cache_file(logfile:str, compiledir:str|None, mainpath:str|None, unwrap:int=0, engine:str='regex') -> Path:
+    """
+    get file path to save parse result of log file.
+    compiledir and mainpath change the file path of records, unwrap and engine change the records,
+    so they are a part of key with the version of parse result.
+    """
+    parts = [f'v{CACHE_VERSION}', os.path.abspath(logfile), compiledir or '', mainpath or '',
+             f'unwrap={unwrap}', f'engine={engine}']
+    key = '\n'.join(parts)
+    return get_cache_dir() / (hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest() + '.json')
+
+
+def get_file_hash(logfile:str) -> str:
+    """ get hash of contents of log file """
+    h = hashlib.blake2b(digest_size=16)
+    with open(logfile, 'rb') as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_result(logfile:str, compiledir:str|None=None, mainpath:str|None=None, unwrap:int=0,
+                engine:str='regex') -> list[Record]|None:
+    """
+    get parse result of log file from cache if the log file is not changed.
+    If size and mtime are same with cached one, the result is returned without reading log file.
+    If only mtime is changed (e.g. latex engine rewrites same log), it compares hash of contents.
+
+    Return:
+        result(list[Record]) : cached result, None if there are no valid cache
+    """
+    cache_file = get_cache_file(logfile, compiledir, mainpath, unwrap, engine)
+    try:
+        stat = os.stat(logfile)
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if entry['size'] == stat.st_size:
+            if entry['mtime'] == stat.st_mtime_ns:
+                update_stats('hit')
+                os.utime(cache_file) # the most recently used entry is evicted at last
+                return entry['result']
+            if entry['hash'] == get_file_hash(logfile):
+                update_stats('hit_hash')
+                entry['mtime'] = stat.st_mtime_ns
+                write_json(cache_file, entry)
+                return entry['result']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    update_stats('miss')
+    return None
+
+
+def save_result(logfile:str, result:list[Record], compiledir:str|None=None, mainpath:str|None=None,
+                unwrap:int=0, engine:str='regex') -> None:
+    """ save parse result of log file to cache and evict least recently used entries """
+    try:
+        stat = os.stat(logfile)
+        entry = {
+            'log': os.path.abspath(logfile),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'hash': get_file_hash(logfile),
+            'result': result,
+        }
+        # log file is changed while parsing, the result may not be matched with contents
+        if os.stat(logfile).st_mtime_ns != stat.st_mtime_ns:
+            return
+        write_json(get_cache_file(logfile, compiledir, mainpath, unwrap, engine), entry)
+        evict()
+    except OSError:
+        pass # cache is optional, the log file will be parsed again
+
+
+def evict() -> None:
+    """ remove least recently used entries if the cache is over its limits """
+    entries:list[tuple[float, int, Path]] = []
+    for cache_file in get_cache_dir().glob('*.json'):
+        try:
+            stat = cache_file.stat()
+            entries.append((stat.st_mtime, stat.st_size, cache_file))
+        except OSError:
+            continue
+    entries.sort(reverse=True) # recently used first
+
+    total = 0
+    for i, (_, size, cache_file) in enumerate(entries):
+        total += size
+        if i >= CACHE_MAX_ENTRIES or total > CACHE_MAX_SIZE:
+            try:
+                cache_file.unlink()
+            except OSError:
+                pass
+
+
+def write_json(file:Path, data:Any) -> None:
+    """ write json file atomically, another process can read the file at the same time """
+    file.parent.mkdir(parents=True, exist_ok=True)
+    # log files of one build are parsed in threads, they can write stats file at the same time
+    tmp_file = file.with_name(f'{file.stem}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_file, file)
+
+
+_pending_stats:dict[str, int] = {} # counters of this process which are not written to stats file yet
+_stats_lock = threading.Lock()      # log files of one build are parsed in threads
+_stats_flushed = time.monotonic()
+
+
+def read_stats() -> dict[str, int]:
+    """ read hit/miss counters of stats file """
+    try:
+        with open(get_stats_file(), 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+        return stats if isinstance(stats, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def get_stats() -> dict[str, int]:
+    """ get hit/miss counters of cache, including counters of this process which are not written yet """
+    stats = read_stats()
+    with _stats_lock:
+        for counter, n in _pending_stats.items():
+            stats[counter] = stats.get(counter, 0) + n
+    return stats
+
+
+def update_stats(counter:str) -> None:
+    """
+    increase hit/miss counter of cache in memory, lookup of cache doesn't write stats file.
+    Counters are written at exit of process or every STATS_FLUSH_INTERVAL in resident parser.
+    counters : 'hit' (same size and mtime), 'hit_hash' (same contents), 'miss'
+    """
+    with _stats_lock:
+        _pending_stats[counter] = _pending_stats.get(counter, 0) + 1
+    if time.monotonic() - _stats_flushed > STATS_FLUSH_INTERVAL:
+        flush_stats()
+
+
+@atexit.register
+def flush_stats() -> None:
+    """ add counters of this process to stats file under lock, counters of other processes are not lost """
+    global _stats_flushed
+    with _stats_lock:
+        pending = _pending_stats.copy()
+        _pending_stats.clear()
+        _stats_flushed = time.monotonic()
+    if not pending:
+        return
+    try:
+        get_stats_file().parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(get_stats_lock_file()):
+            stats = read_stats()
+            for counter, n in pending.items():
+                stats[counter] = stats.get(counter, 0) + n
+            write_json(get_stats_file(), stats)
+    except OSError:
+        with _stats_lock: # keep counters to write them at the next flush
+            for counter, n in pending.items():
+                _pending_stats[counter] = _pending_stats.get(counter, 0) + n
@@ -0,0 +1,80 @@
+# client of inverse search broker (utils/broker.py)
+# It is imported at every click in pdf viewer, so it must not import heavy modules like pynvim.
+from __future__ import annotations
+
+import json
+import socket
+
+from . import paths
+
+TYPE_CHECKING = False # typing is not imported at runtime, it costs startup time of every click
+if TYPE_CHECKING:
+    from typing import Any
+
+CONNECT_TIMEOUT = 0.5 # seconds, broker is local process. If it doesn't respond soon, it is not alive.
+REQUEST_TIMEOUT = 3.0 # seconds, jump to line needs one rpc to neovim in broker
+
+
+def get_address_file():
+    """ get file path where broker writes its address and token """
+    return paths.get_data_dir() / 'texflow_broker.json'
+
+
+def load_address() -> dict[str, Any]|None:
+    """
+    load address of broker
+
+    Return:
+        address(dict) : {family = 'unix'|'tcp', address = str|[host, port], token = str}
+                        None if broker isn't started
+    """
+    try:
+        with open(get_address_file(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def send_request(request:dict[str, Any], address:dict[str, Any]|None=None) -> dict[str, Any]|None:
+    """
+    send one request to broker and receive its response
+
+    Args:
+        request(dict) : request without token, {file = str, line = int, alias = str} or {ping = true}
+        address(dict) : result of load_address(), it is loaded if None
+
+    Return:
+        response(dict) : {ok = bool, error = str}, None if broker isn't running
+    """
+    address = address or load_address()
+    if not address:
+        return None
+    try:
+        if address['family'] == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            target = address['address']
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            target = tuple(address['address'])
+        with sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(target)
+            sock.settimeout(REQUEST_TIMEOUT)
+            data = dict(request, token=address['token'])
+            sock.sendall(json.dumps(data).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as f:
+                response = f.readline()
+        return json.loads(response) if response else None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def inverse_search(filename:str, line:int, alias:str) -> bool:
+    """
+    request inverse search to broker
+
+    Return:
+        result(bool) : True if broker moves the cursor, False if the direct path is needed
+    """
+    response = send_request({'file': filename, 'line': line, 'alias': alias})
+    return bool(response and response.get('ok'))
@@ -3,6 +3,32 @@ import pynvim
 from . import paths
 from .errors import err_notify
 
+# lua chunk to find buffer of tex file and jump to line.
+# It is sent with one exec_lua request, the number of rpc doesn't depend on the number of buffers.
+jump_to_line_lua = """
+local texname, line = ...
+local target = nil
+for _, buf in ipairs(vim.api.nvim_list_bufs()) do
+    if vim.api.nvim_buf_get_name(buf) == texname then
+        target = buf
+        break
+    end
+end
+
+-- open buffer
+if target then
+    vim.api.nvim_set_current_buf(target)
+    vim.bo[target].buflisted = true
+else
+    vim.cmd('edit ' .. vim.fn.fnameescape(texname))
+end
+
+-- move cursor
+vim.api.nvim_win_set_cursor(0, {line, 0}) -- move to line number
+vim.cmd('normal! zz') -- move screen to center cursor
+vim.cmd('redraw') -- focus
+"""
+
 
 class Commands:
     nvim: pynvim.Nvim # declare pynvim.Nvim as type of nvim
@@ -12,32 +38,8 @@ class Commands:
 
     def jump_to_line(self, texname: str, line: int):
         try:
-            buffers = self.nvim.buffers
             texname = paths.path_normalize(texname)
-
-            # get target buffer object
-            target_buf = None
-            for buf in buffers:
-                try:
-                    if buf.name == texname:
-                        target_buf = buf
-                        break
-                except Exception:
-                    continue # skip invalid buffer name
-
-            # open buffer
-            if target_buf is None:
-                self.nvim.command(f"edit {texname}")
-                target_buf = self.nvim.current.buffer
-            else:
-                self.nvim.current.buffer = target_buf
-                target_buf.options['buflisted'] = True
-
-            # move cursor
-            self.nvim.current.window.cursor = (line, 0) # move to line number
-            self.nvim.command('normal! zz') # move screen to center cursor
-            self.nvim.command('redraw') # focus
-
+            self.nvim.exec_lua(jump_to_line_lua, texname, line)
         except Exception as e:
             err_notify('Failed to jumping to line')
             self.nvim.err_write(f"Error jumping to line {e}\n")
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import secrets
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from . import cache, paths
+
+if TYPE_CHECKING:
+    from .record import Record
+
+DELTA_MAX_FILES = 32 # the number of previous results to keep across projects
+
+
+def get_delta_dir() -> Path:
+    """ get directory to save the previous result of each log file """
+    return paths.get_data_dir() / 'delta'
+
+
+def get_delta_file(logfile:str, compiledir:str|None, mainpath:str|None) -> Path:
+    """ get file path to save the previous result of log file, the key is same with cache """
+    key = '\n'.join([os.path.abspath(logfile), compiledir or '', mainpath or ''])
+    return get_delta_dir() / (hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest() + '.json')
+
+
+def get_ids(records:list[Record]) -> list[str]:
+    """
+    get stable id of each record.
+    line number is not a part of id, so the record whose line is moved by editing is reported as 'change'.
+    The same messages in a file (e.g. Undefined control sequence) are distinguished by the order of them.
+    """
+    ids:list[str] = []
+    seen:dict[str, int] = {}
+    for record in records:
+        key = '\0'.join([record['kind'], record['file'] or '', record['message'], record['package'] or ''])
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        ids.append(f'{digest}.{n}' if n else digest)
+    return ids
+
+
+def load_previous(delta_file:Path) -> dict[str, Any]|None:
+    """ load the previous result, {token = str, records = {id: record}} """
+    try:
+        with open(delta_file, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        return previous if isinstance(previous, dict) and isinstance(previous.get('records'), dict) else None
+    except (OSError, ValueError):
+        return None
+
+
+def save_previous(delta_file:Path, token:str, records:dict[str, dict[str, Any]]) -> None:
+    """ save the result as base of the next delta and remove results of old projects """
+    try:
+        cache.write_json(delta_file, {'token': token, 'records': records})
+        files = sorted(get_delta_dir().glob('*.json'), key=lambda file: file.stat().st_mtime, reverse=True)
+        for file in files[DELTA_MAX_FILES:]:
+            file.unlink(missing_ok=True)
+    except OSError:
+        pass # the next call gets full snapshot
+
+
+def make_delta(logfile:str, result:list[Record], token:str|None,
+               compiledir:str|None=None, mainpath:str|None=None) -> list[dict[str, Any]]:
+    """
+    get changes of diagnostics since the previous result which the caller has.
+
+    Args:
+        logfile(str) : main log file, the previous result is saved for it
+        result(list[Record]) : the current result
+        token(str) : token of the previous output which the caller applied. None or '' to get full snapshot.
+
+    Return:
+        ops(list[dict]) : the first item is header, others are changes with stable id.
+            {op = 'reset', token}          : full snapshot, the caller removes all diagnostics and adds records
+            {op = 'delta', base, token}    : changes since the output of token 'base'
+            {op = 'add', id, <record>}     : new record
+            {op = 'change', id, <record>}  : record whose line or other fields are changed
+            {op = 'remove', id}            : record which doesn't exist anymore
+            The caller sends token of header at the next call.
+    """
+    from .parser import compact_record
+    records = {id: compact_record(record) for id, record in zip(get_ids(result), result)}
+    delta_file = get_delta_file(logfile, compiledir, mainpath)
+    previous = load_previous(delta_file) if token else None
+    new_token = secrets.token_hex(8)
+
+    ops:list[dict[str, Any]]
+    if previous is None or previous.get('token') != token:
+        # first run or the caller has other base (e.g. neovim is restarted), send full snapshot
+        ops = [{'op': 'reset', 'token': new_token}]
+        ops.extend({'op': 'add', 'id': id, **record} for id, record in records.items())
+    else:
+        ops = [{'op': 'delta', 'base': token, 'token': new_token}]
+        prev_records:dict[str, dict[str, Any]] = previous['records']
+        for id, record in records.items():
+            prev = prev_records.get(id)
+            if prev is None:
+                ops.append({'op': 'add', 'id': id, **record})
+            elif prev != record:
+                ops.append({'op': 'change', 'id': id, **record})
+        ops.extend({'op': 'remove', 'id': id} for id in prev_records if id not in records)
+
+    save_previous(delta_file, new_token, records)
+    return ops
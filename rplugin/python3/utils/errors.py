@@ -1,4 +1,3 @@
-import subprocess
 import sys
 
 
@@ -14,6 +13,7 @@ def err_notify(err_msg:str, e:str = '') -> None:
     start_cmd = 'start "" cmd /k'
     end_cmd = '&& echo. && pause && exit'
     if sys.platform == 'win32':
+        import subprocess  # it is slow to import, scripts import this module at every call
         _ = subprocess.run(f'{start_cmd} "echo {err_msg} & echo {e} {end_cmd}"', shell=True)
     else:
         print(err_msg)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+LOCK_TIMEOUT = 5.0        # seconds to wait lock of other writer
+LOCK_STALE = 10.0         # seconds after which lock file is regarded as left by crashed process
+
+
+@contextmanager
+def file_lock(lock_file:Path, timeout:float=LOCK_TIMEOUT) -> Iterator[None]:
+    """
+    hold lock file while writing shared file, other processes wait until it is released.
+    The lock is the existence of lock file which is created exclusively (O_EXCL),
+    lua can take it with vim.uv.fs_open(lock, 'wx') while flock() is not available in lua.
+    Lock file which is older than LOCK_STALE is removed, the process which has it may be crashed.
+
+    Args:
+        lock_file(Path) : path of lock file, its directory must exist
+        timeout(float) : seconds to wait lock, FileExistsError is raised after it
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock_file).st_mtime > LOCK_STALE:
+                    os.unlink(lock_file)
+                    continue
+            except OSError:
+                continue # lock is released while checking
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+    try:
+        _ = os.write(fd, str(os.getpid()).encode('ascii'))
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.unlink(lock_file)
+        except OSError:
+            pass
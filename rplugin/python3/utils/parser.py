@@ -1,21 +1,131 @@
 from __future__ import annotations
 
-import multiprocessing as mp
+import codecs
+import hashlib
+import mmap
 import os
 import re  # match string with regex
-from collections.abc import Iterator
+from collections.abc import Callable, Generator, Iterable, Iterator
+from typing import Any, BinaryIO
 
+from . import cache, paths, project, scanner, trace, unwrap
+from . import patterns as log_patterns
 from .errors import err_notify
+from .record import Record
 
 enc_candidate = ['utf-8', 'euc-kr', 'cp949', 'latin-1']
+TAIL_HASH_BLOCK_SIZE = 1 << 20 # read size to hash the committed part of log file
+PARALLEL_MIN_SIZE = 8 << 20 # log file smaller than this is parsed serially, process pool costs more
+PARALLEL_SEARCH_SIZE = 64 << 10 # range to find the line which starts with '(' for chunk boundary
+MULTI_LOG_THREADS = 4 # the number of threads to parse log files of one build
+SUBFILES_SEARCH_SIZE = 64 << 10 # range of log file to check it is log of subfiles
+UNWRAP_BLOCK_SIZE = 4 << 20 # size of block to unwrap / normalize memory-mapped log file, it ends at the next blank line
+SEVERITY_LEVELS = {'INFO': 0, 'WARN': 1, 'ERROR': 2} # order of severity to filter records
+
+# sub patterns to get information from message which is matched with group of patterns
+error1_regex     = re.compile(r'^(?P<file>.*?\.tex):(?P<line>\d+): (?P<message>.*)$')  # ./test2.tex:42: message
+warn_latex_regex = re.compile(r'^LaTeX Warning:\s+(?P<message>.*) on input line (?P<line>\d+)\.')
+package_regex    = re.compile(r'^Package (?P<package>\w+) (?:Error|Warning):')       # Package <name> Warning:
+residue_regex    = re.compile(r'^\(\w+\)\s*(?P<residue>.*)')                          # (<name>)    message
+over_regex       = re.compile(r'at lines (?P<line>\d+)')                               # Overfull ~ at lines 59--60
+blank_line_regex = re.compile(rb'\n\r?\n')                                           # block boundary of iter_blocks()
+bibtex_regex     = re.compile(r'-line (?P<line>\d+) of file (?P<file>.+)$', re.MULTILINE)   # ---line 12 of file refs.bib
+biber_line_regex = re.compile(r"(?P<file>[^\s,']+\.bib)(?:_\d+\.utf8)?, line (?P<line>\d+)")  # refs.bib_123.utf8, line 12
+biber_file_regex = re.compile(r"in file '(?P<file>[^']+\.bib)'")                     # in file 'refs.bib'
+
+
+class ParseState:
+    """
+    scanner state of log file which can be carried over to the next scan.
+    It makes possible to continue parsing from the position where the previous scan stopped.
+    """
+    offset:     int        # byte offset of log file which is parsed until
+    prefix:     str        # hash of the whole bytes until offset, to detect log file is rewritten
+    stat:       list[int]  # [mtime_ns, inode, size] of log file at the previous call
+    encoding:   str|None   # encoding of log file
+    file_stack: list[str]  # stack of files which is not closed with ')'
+    pending:    list[int]  # index of records in result which are waiting the line number from 'l.xx'
+    result:     list[Record] # result which is parsed until offset
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """ clear state to parse log file from the start """
+        self.offset = 0
+        self.prefix = ''
+        self.stat = []
+        self.encoding = None
+        self.file_stack = []
+        self.pending = []
+        self.result = []
+
+    def copy(self) -> ParseState:
+        """ get copy of state to scan more without changing this state """
+        state = ParseState()
+        state.__dict__.update(self.to_dict())
+        return state
+
+    def to_dict(self) -> dict[str, Any]:
+        """ convert state to dictionary to save as json """
+        return {
+            'offset': self.offset,
+            'prefix': self.prefix,
+            'stat': self.stat.copy(),
+            'encoding': self.encoding,
+            'file_stack': self.file_stack.copy(),
+            'pending': self.pending.copy(),
+            'result': [record.copy() for record in self.result],
+        }
+
+    @classmethod
+    def from_dict(cls, data:dict[str, Any]) -> ParseState:
+        """ restore state from dictionary which is made by to_dict() """
+        state = cls()
+        for key in state.__dict__:
+            if key in data:
+                setattr(state, key, data[key])
+        return state
+
+
+class ChunkState(ParseState):
+    """
+    scanner state of a chunk of log file which is scanned in worker process of parallel parsing.
+    A chunk doesn't know file stack and pending records of previous chunks,
+    so the changes which depend on them are kept and applied at merging.
+    """
+    start:      int         # position of log file where the chunk starts
+    end:        int         # end position of the last match of the chunk
+    underflow:  int         # the number of ')' which closes the file opened in previous chunks
+    first_line: int|None    # line number of the first 'l.xx', it is given to pending records of previous chunks
+    deferred:   list[tuple[int, str, str, int]] # (index, group, msg, underflow) of records whose file is unknown
+
+    def __init__(self, start:int=0):
+        super().__init__()
+        self.start = start
+        self.end = start
+        self.underflow = 0
+        self.first_line = None
+        self.deferred = []
+
 
 class Parser:
     file:str
     patterns:re.Pattern[str]
     encoding:str|None
-    contents:str
+    use_mmap:bool
+    engine:str
+    compiledir:str
+    mainpath:str|None
+    unwrap:int
+    on_record:Callable[[Record], None]|None # called with each record as soon as it is found by scan()
+    _contents:str|None
+    _filepaths:dict[str, str] # cache of resolved file path of file stack
+    _project:project.ProjectIndex|None
+    _exists:dict[str, bool]   # cache of existence of file path at the end of wrapped line
 
-    def __init__(self, file:str, patterns:re.Pattern[str]):
+    def __init__(self, file:str, patterns:re.Pattern[str], compiledir:str|None=None, mainpath:str|None=None,
+                 use_mmap:bool=False, engine:str='regex', unwrap:int=0):
         r"""
         initialize variable at creation
 
@@ -25,16 +135,48 @@ class Parser:
                                   If you want to parse multiple patterns,
                                   concatenate patterns with | to make one string.
                                   This pattern accept the result of re.compile()
+            compiledir(str) : directory where latex engine runs. relative path in log file is based on it.
+                              directory of log file is used if it is None.
+            mainpath(str) : absolute path of main tex file. package messages are shown in this file.
+            use_mmap(bool) : If true, scan memory-mapped log file with bytes pattern and decode matched message only.
+                             It doesn't make decoded copy of whole log file and each message is decoded
+                             with its own encoding. (e.g. euc-kr file name in utf-8 log file)
+            engine(str) : 'regex' scans with combined regex of pattern.
+                          'dispatch' finds the candidate position of each line and tries the relevant pattern only.
+                          It is available for default patterns of utils.patterns and the result is identical.
+            unwrap(int) : max_print_line of log file. If it is not 0, lines which are wrapped at this width
+                          are joined before scan (utils/unwrap.py), then max_print_line of TeX doesn't need to be changed.
 
         Caution:
-            use pattern which captures one line until it meets \n.
-            I thought that the overhead would be too high to send the structure like json which splits field by label
-            in Python, so I decided to send a bunch of single line of raw data that means up to \n.
+            use pattern which has named group for each kind of message, the group name is used to classify message.
         """
         self.file = file
         self.patterns = patterns
+        self.compiledir = compiledir or os.path.dirname(os.path.abspath(file))
+        self.mainpath = paths.path_normalize(mainpath) if mainpath else None
+        self.use_mmap = use_mmap
+        self.engine = engine
+        self.unwrap = unwrap
+        self.on_record = None
+        self._filepaths = {}
+        self._exists = {}
+        self._project = None
         self.encoding = self.check_encoding()
-        self.contents = self.get_file_contents() # don't slicing chunk
+        self._contents = None # read file contents when it is needed only
+
+    @property
+    def project(self) -> project.ProjectIndex|None:
+        """ index of tex files of main tex file, it is made at the first access """
+        if self._project is None and self.mainpath and os.path.isfile(self.mainpath):
+            self._project = project.get_index(self.mainpath)
+        return self._project
+
+    @property
+    def contents(self) -> str:
+        """ all contents of file, it is read at the first access """
+        if self._contents is None:
+            self._contents = self.get_file_contents() # don't slicing chunk
+        return self._contents
 
     def check_encoding(self, encodings:list[str]=enc_candidate) -> str|None:
         """ detect file encoding """
@@ -42,111 +184,769 @@ class Parser:
             err_notify('There is no file : ' + self.file)
             return None
 
-        with open(self.file, 'rb') as f:
-            data = f.read(256) # about one line byte
+        with trace.phase('check_encoding', file=self.file) as ph:
+            with open(self.file, 'rb') as f:
+                data = f.read(256) # about one line byte
+            ph['bytes'] = len(data)
             for enc in encodings:
                 try:
-                    # return data.decode(enc)
-                    if data.decode(enc):
-                        return enc
-                except UnicodeEncodeError:
+                    # use incremental decoder, the last character can be cut in the middle of multibyte sequence
+                    _ = codecs.getincrementaldecoder(enc)().decode(data, final=False)
+                    ph['encoding'] = enc
+                    return enc
+                except UnicodeDecodeError:
                     continue
         err_notify('This file encoding is not included in enc_candidate, Modify `enc_candidate` in ' + __file__ )
         return None
 
+    def decode(self, data:bytes) -> str:
+        """
+        decode matched message of bytes pattern.
+        It tries encoding of log file first and other candidates, latin-1 never fails as the last candidate.
+        """
+        try:
+            return data.decode(self.encoding or 'utf-8')
+        except UnicodeDecodeError:
+            pass
+        for enc in enc_candidate:
+            try:
+                return data.decode(enc)
+            except UnicodeDecodeError:
+                continue
+        return data.decode('utf-8', errors='replace')
+
     def get_file_contents(self) -> str:
         """ get all contents of file """
-        with open(self.file, 'r', encoding=(self.encoding or 'utf-8')) as f:
-            contents = f.read()
+        with trace.phase('read', file=self.file, encoding=self.encoding) as ph:
+            if self.unwrap:
+                with open(self.file, 'rb') as f:
+                    contents = self.decode_lines(self.unwrap_lines(normalize_newlines(f.read())))
+                ph['chars'] = len(contents)
+                return contents
+            try:
+                with open(self.file, 'r', encoding=(self.encoding or 'utf-8')) as f:
+                    contents = f.read()
+            except UnicodeDecodeError:
+                with open(self.file, 'rb') as f:
+                    data = f.read()
+                contents = self.decode_lines(normalize_newlines(data))
+                ph['decode_lines'] = True # some lines have other encoding
+            ph['chars'] = len(contents)
         return contents
 
-    def get_matches_chunk(self, chunk:str) -> list[str]:
+    def decode_lines(self, data:bytes, encoding:str|None=None) -> str:
+        """
+        decode part of log file to scan with str pattern.
+        If some lines have other encoding (e.g. euc-kr file name in utf-8 log file), each line is decoded
+        with its own encoding like matched message of mmap.
         """
-        get pattern from chunk
+        try:
+            return data.decode(encoding or self.encoding or 'utf-8')
+        except UnicodeDecodeError:
+            return ''.join(self.decode(line) for line in data.splitlines(keepends=True))
+
+    def unwrap_lines(self, data:bytes) -> bytes:
+        """ join lines of data which are wrapped at max_print_line """
+        with trace.phase('unwrap', file=self.file, width=self.unwrap, size=len(data)) as ph:
+            result = unwrap.unwrap_lines(data, self.unwrap, self.encoding, self.path_exists)
+            ph['joined'] = len(data) - len(result) # bytes of removed new lines
+        return result
+
+    def iter_blocks(self, buffer:bytes|mmap.mmap, start:int=0, end:int|None=None) -> Iterator[bytes]:
+        r"""
+        yield blocks of buffer from start to end, CRLF is converted to LF and wrapped lines are joined.
+        Each block ends with blank line, a message or a wrapped line doesn't continue over it,
+        so memory-mapped file is converted without copying whole file.
+        """
+        end = len(buffer) if end is None else end
+        while start < end:
+            matched = blank_line_regex.search(buffer, min(start + UNWRAP_BLOCK_SIZE, end), end)
+            stop = matched.end() if matched else end
+            block = normalize_newlines(buffer[start:stop])
+            yield self.unwrap_lines(block) if self.unwrap else block
+            start = stop
+
+    def needs_blocks(self, buffer:bytes|mmap.mmap, start:int=0, end:int|None=None) -> bool:
+        r"""
+        check buffer must be scanned with iter_blocks() instead of scanning it as it is.
+        Patterns expect \n as line ending like text mode of open(), CRLF of log file on Windows is converted.
+        """
+        return bool(self.unwrap) or buffer.find(b'\r\n', start, len(buffer) if end is None else end) >= 0
+
+    def path_exists(self, path:str) -> bool:
+        """ check file path in log file exists, relative path is based on compile directory """
+        exists = self._exists.get(path)
+        if exists is None:
+            exists = os.path.isfile(os.path.join(self.compiledir, path.strip()))
+            self._exists[path] = exists
+        return exists
+
+    def get_matches_chunk(self, start:int, stop:int) -> ChunkState:
+        """
+        get matches of pattern from a chunk of log file, it runs in worker process of parallel parsing.
+        The chunk is scanned on memory-mapped file, so a message which starts before stop
+        and continues to the next chunk is matched as the serial scan does.
 
         Args:
-            chunk(str) : part of file contents
+            start(int) : position of log file where the chunk starts, it must be the beginning of line
+            stop(int) : position of log file where the next chunk starts
 
         Return:
-            result(list[str]]) : matched sentence
-        """
-        result:list[str] = []
-
-        # Scan the entire chunk once with a err_regex, show match all at once
-        # see repr() to confirm what escape character is included
-        matcher: Iterator[re.Match[str]] = self.patterns.finditer(chunk)
-        i = 0
-        for match in matcher:
-
-            msg = match.group().rstrip('\n') # remove \n at end of line
-            msg = msg.replace('\n', '') # remove \n in the middle of message to make multi line to one line
-
-            if match.lastgroup and (match.lastgroup.startswith('error')
-                                    or match.lastgroup.startswith('warn_pdftex')):
-                i+=1
-            elif match.lastgroup and match.lastgroup.startswith('line'):
-                for n in range(i):
-                    if result[-1-n].startswith('!'): # ! l.xx ~
-                        result[-1-n] = result[-1-n][:2] + msg + result[-1-n][1:]
-                    elif result[-1-n].startswith('pdfTeX warning'): # pdfTex warning l.xx (ext4) ~
-                        result[-1-n] = result[-1-n][:15] + msg + result[-1-n][14:]
-                i = 0
-                continue
-            else: # warn
-                pass
+            state(ChunkState) : result of the chunk, it is merged to the result of previous chunks by merge_chunk()
+        """
+        state = ChunkState(start)
+        with open(self.file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                state.end = self.scan(mm, state, start, None, stop)
+        return state
 
-            result.append(msg)
-            # group(0) : all word of matched with pattern that includes out of () (default)
-            # group(1) : only included word in () at first time, next is group(2)
+    def merge_chunk(self, state:ParseState, chunk:ChunkState) -> None:
+        """
+        merge the result of chunk to the state of previous chunks.
+        It makes the same state with serial scan until the end of chunk.
 
-        return result
+        Args:
+            state(ParseState) : state of previous chunks, it is updated in place.
+            chunk(ChunkState) : result of get_matches_chunk()
+        """
+        base = len(state.result)
+        file_stack = state.file_stack
 
-    def get_matches_all(self):
-        """ get matches of pattern from all chunks """
-        file_stack:list[str] = [] # stack to save file path which matcher meets.
-        result:list[str] = [] # final result of error/warning pattern
-        i = 0
+        # the first l.xx of chunk is line number of pending records of previous chunks
+        if chunk.first_line is not None:
+            for idx in state.pending:
+                state.result[idx]['line'] = chunk.first_line
+            state.pending = []
+
+        # records which are allocated in the file of previous chunks
+        for idx, group, msg, underflow in chunk.deferred:
+            record = self.get_record(group, msg, file_stack[-1 - underflow] if underflow < len(file_stack) else None)
+            record['line'] = chunk.result[idx]['line'] # line number from l.xx in the chunk
+            chunk.result[idx] = record
+
+        state.result.extend(chunk.result)
+        state.pending.extend(base + idx for idx in chunk.pending)
+        del file_stack[max(0, len(file_stack) - chunk.underflow):]
+        file_stack.extend(chunk.file_stack)
+
+    def get_chunk_bounds(self, buffer:mmap.mmap, n:int) -> list[tuple[int, int]]:
+        """
+        split log file into n chunks at the beginning of line.
+        The line which starts with '(' is preferred, the message rarely continues to it.
+        """
+        size = len(buffer)
+        starts = [0]
+        for i in range(1, n):
+            target = max(size * i // n, starts[-1])
+            pos = buffer.find(b'\n(', target, min(size, target + PARALLEL_SEARCH_SIZE))
+            if pos < 0:
+                pos = buffer.find(b'\n', target)
+            if pos < 0:
+                break
+            if pos + 1 > starts[-1]:
+                starts.append(pos + 1)
+        return list(zip(starts, starts[1:] + [size]))
+
+    def get_matches_parallel(self, jobs:int) -> list[Record]:
+        """
+        get matches of pattern by scanning chunks of log file on process pool.
+        The result is identical with get_matches_all() with mmap.
+        Log file with CRLF is parsed serially, chunks are scanned on memory-mapped file as it is.
+
+        Args:
+            jobs(int) : the number of worker processes
+        """
+        # process pool is imported here, serial parse doesn't pay for importing multiprocessing
+        import multiprocessing as mp
+        from concurrent.futures import ProcessPoolExecutor
+
+        state = ParseState()
+        with open(self.file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0: # empty file cannot be mapped
+                return state.result
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if self.needs_blocks(mm):
+                    return self.get_matches_all()
+                # more chunks than workers to share the work evenly
+                bounds = self.get_chunk_bounds(mm, jobs * 4)
+                args = [(self.file, self.compiledir, self.mainpath, self.engine, start, stop) for start, stop in bounds]
+                with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context()) as pool:
+                    end = 0
+                    for (start, stop), chunk in zip(bounds, pool.map(_scan_chunk, args)):
+                        if end > start:
+                            # the last message of previous chunk continues in this chunk.
+                            # the chunk is scanned from different position, scan it again from the end of message
+                            end = self.scan(mm, state, end, None, stop)
+                            continue
+                        self.merge_chunk(state, chunk)
+                        end = chunk.end
+        return state.result
 
-        matcher: Iterator[re.Match[str]] = self.patterns.finditer(self.contents)
-        for match in matcher:
-            if match.lastgroup:
+    def scan(self, contents:str|bytes|mmap.mmap, state:ParseState,
+             pos:int=0, endpos:int|None=None, stop:int|None=None) -> int:
+        """
+        get matches of pattern from contents and accumulate them to state, see iter_scan() for arguments.
+        If on_record is set, it is called with each record as soon as the record is complete.
+
+        Return:
+            end(int) : end position of the last match, pos if nothing is matched
+        """
+        records = self.iter_scan(contents, state, pos, endpos, stop)
+        while True:
+            try:
+                record = next(records)
+            except StopIteration as e:
+                return e.value
+            if self.on_record:
+                self.on_record(record)
+
+    def iter_scan(self, contents:str|bytes|mmap.mmap, state:ParseState,
+                  pos:int=0, endpos:int|None=None, stop:int|None=None) -> Generator[Record, None, int]:
+        """
+        get matches of pattern from contents and accumulate them to state.
+        Each record is yielded as soon as it is complete, the record which waits the line number from l.xx
+        is yielded when l.xx is matched (it stays in state.pending if l.xx is not found until the end).
+
+        Args:
+            contents(str|bytes|mmap) : contents of log file to scan.
+                                   If it is bytes or mmap, bytes pattern is used and matched message is decoded.
+            state(ParseState) : state which is continued from previous scan. It is updated in place.
+                                If it is ChunkState, the changes which depend on previous chunks are kept in it.
+            pos(int) : position of contents where the scan starts. It must be the beginning of line.
+            endpos(int) : position of contents where the scan ends. It works like contents is sliced at endpos.
+            stop(int) : scan stops at the first match which starts at or after stop.
+                        Unlike endpos, the match which starts before stop can be continued after it.
+
+        Return:
+            end(int) : return value of generator, end position of the last match, pos if nothing is matched
+        """
+        file_stack = state.file_stack # stack to save file path which matcher meets.
+        result = state.result # final result of error/warning pattern
+        endpos = len(contents) if endpos is None else endpos
+        stop = endpos if stop is None else stop
+        chunk = state if isinstance(state, ChunkState) else None
+        end = pos
+
+        # matches of each pattern group, it is counted only if trace is enabled
+        counts:dict[str, int]|None = {} if trace.enabled() else None
+        patched = 0 # the number of records whose line number is back-patched by l.xx
+        with trace.phase('scan', file=self.file, engine=self.engine, size=endpos - pos,
+                         binary=not isinstance(contents, str)) as ph:
+            matcher: Iterator[re.Match[Any]]
+            if self.engine == 'dispatch':
+                matcher = scanner.get_scanner(not isinstance(contents, str)).finditer(contents, pos, endpos)
+            elif isinstance(contents, str):
+                matcher = self.patterns.finditer(contents, pos, endpos)
+            else:
+                matcher = get_bytes_regex(self.patterns).finditer(contents, pos, endpos)
+            for match in matcher:
+                if match.start() >= stop:
+                    break
+                end = match.end()
+                group = match.lastgroup
+                if counts is not None:
+                    counts[group or ''] = counts.get(group or '', 0) + 1
+                if not group:
+                    continue
                 # use group name to get captured word to remove \r\n from result automatically.
-                msg = match.group(match.lastgroup)
+                msg = match.group(group)
+                if not isinstance(msg, str):
+                    msg = self.decode(msg) # decode matched message only
 
                 # push to last index of file stack
-                if match.lastgroup.startswith('filestart'):
+                if group == 'filestart':
                     # default max_print_line is 79 on latex . It will make some paths Split into two lines.
                     # It prevent exact parsing of file. so you need to change this value upto 10000
                     # max length of Windows is 260, and it is 4096 in Linux
                     file_stack.append(msg) # stack all filestart. Error will belong to file unclosed parenthesis
-                    continue
                 # pop from last index of file stack
-                elif match.lastgroup.startswith('fileend'):
+                elif group == 'fileend':
                     if file_stack:
                         _ = file_stack.pop()
-                    continue
-                # error/warning post-process
+                    elif chunk:
+                        chunk.underflow += 1 # it closes the file which is opened in previous chunks
+                # l.xx is line number of previous error messages
+                elif group == 'line':
+                    lnum = int(msg[2:])
+                    if chunk and chunk.first_line is None:
+                        chunk.first_line = lnum # it is also line number of pending records of previous chunks
+                    pending = state.pending
+                    state.pending = []
+                    patched += len(pending)
+                    for idx in pending:
+                        result[idx]['line'] = lnum
+                        yield result[idx]
+                # error/warning
                 else:
-                    if match.lastgroup.startswith('error') or match.lastgroup.startswith('warn_pdftex'):
-                        i+=1
-                    elif match.lastgroup.startswith('line'):
-                        for n in range(i):
-                            if result[-1-n].startswith('!'): # ! l.xx ~
-                                result[-1-n] = result[-1-n][:2] + msg + result[-1-n][1:]
-                            elif result[-1-n].startswith('pdfTeX warning'): # pdfTex warning l.xx (ext4) ~
-                                result[-1-n] = result[-1-n][:15] + msg + result[-1-n][14:]
-                        i = 0
-                        continue
-                    else: # warn
-                        pass
-
-                if file_stack:
-                    result.append(file_stack[-1])
-                result.append(msg)
+                    record = self.get_record(group, msg, file_stack[-1] if file_stack else None)
+                    if chunk and not file_stack:
+                        # file of this record is in file stack of previous chunks, it is decided at merging
+                        chunk.deferred.append((len(result), group, msg, chunk.underflow))
+                    result.append(record)
+                    if group == 'error2' or group == 'warn_pdftex': # ! ~ / pdfTeX warning ~ are followed by l.xx
+                        state.pending.append(len(result) - 1)
+                    else:
+                        yield record
+            ph['records'] = len(result)
+            ph['patched'] = patched
+            ph['matches'] = counts
+        return end
+
+    def get_record(self, group:str, msg:str, filestart:str|None) -> Record:
+        """
+        make diagnostic record from matched message
+
+        Args:
+            group(str) : group name of pattern which is matched
+            msg(str) : matched message, it can have multiple lines
+            filestart(str) : the last item of file stack when the message is matched
+
+        Return:
+            record(Record) : classified diagnostic record
+        """
+        lines = msg.split('\n')
+        record = Record(
+            kind = group,
+            severity = 'ERROR' if group.startswith('error') else ('INFO' if group == 'warn_over' else 'WARN'),
+            file = self.get_filepath(filestart),
+            line = None,
+            message = lines[0],
+            package = None,
+        )
+
+        if group == 'error1': # ./test2.tex:42: message
+            matched = error1_regex.match(lines[0])
+            if matched:
+                record['file'] = self.get_filepath(matched.group('file'))
+                record['line'] = int(matched.group('line'))
+                record['message'] = matched.group('message')
+        elif group == 'error2': # ! message
+            record['message'] = lines[0][2:]
+        elif group == 'warn_latex': # LaTeX Warning: message on input line 7.
+            matched = warn_latex_regex.match(lines[0])
+            if matched:
+                record['line'] = int(matched.group('line'))
+                record['message'] = matched.group('message')
+        elif group == 'warn_over': # Overfull ~ at lines 10--11
+            matched = over_regex.search(lines[0])
+            if matched:
+                record['line'] = int(matched.group('line'))
+        elif group == 'warn_pkg' or group == 'error_pkg':
+            matched = package_regex.match(lines[0])
+            record['package'] = matched.group('package') if matched else None
+            # add residue message If warn_pkg has multiple sentences.
+            for line in lines[1:]:
+                residue = residue_regex.match(line)
+                if residue:
+                    record['message'] += '\n' + residue.group('residue')
+            # packages warning which is allocated in runtime file like .sty, is shown in main file to notify user.
+            if self.mainpath and record['file'] != self.mainpath:
+                if record['file']:
+                    maindir = os.path.dirname(self.mainpath)
+                    relpath = record['file']
+                    if relpath.startswith(maindir + os.sep):
+                        relpath = '.' + relpath[len(maindir):]
+                    record['message'] = 'In ' + relpath + '\n' + record['message']
+                record['file'] = self.mainpath
+
+        elif group == 'error_bibtex' or group == 'warn_bibtex': # message---line 12 of file refs.bib
+            matched = bibtex_regex.search(msg)
+            if matched:
+                record['file'] = self.get_filepath(matched.group('file'))
+                record['line'] = int(matched.group('line'))
+            record['message'] = lines[0].removeprefix('Warning--')
+        elif group == 'error_biber' or group == 'warn_biber': # ERROR - message
+            record['message'] = lines[0].split(' - ', 1)[-1]
+            matched = biber_line_regex.search(lines[0]) or biber_file_regex.search(lines[0])
+            if matched:
+                # biber reports the bib file which is copied to temporary directory, use its name only
+                path = matched.group('file')
+                if os.path.isabs(path) and not os.path.exists(path):
+                    path = os.path.basename(path)
+                record['file'] = self.get_filepath(path)
+                record['line'] = int(matched.group('line')) if matched.re is biber_line_regex else None
+        elif group == 'error_index' or group == 'warn_index': # !! location:\n -- message
+            # location is in *.idx / *.ind which user doesn't edit, it is shown in main file
+            record['message'] = lines[-1].strip().removeprefix('-- ') + '\n' + lines[0]
+            record['file'] = self.mainpath
+
+        return record
+
+    def get_filepath(self, filestart:str|None) -> str|None:
+        """
+        get absolute path of file from the item of file stack
+
+        Args:
+            filestart(str) : file path from log file like '(./chapter.tex' or 'C:\\path\\file.sty'
+                             Relative paths are relative to the path where the latex engine was run.
+        """
+        if filestart is None:
+            return None
+        filepath = self._filepaths.get(filestart)
+        if filepath is None:
+            path = filestart.lstrip('(').strip()
+            if not os.path.isabs(path):
+                path = os.path.join(self.compiledir, path)
+            filepath = paths.path_normalize(os.path.normpath(path))
+            # relative path of log file is resolved to the file of project (e.g. case of path on Windows),
+            # files of tex distribution (*.sty, *.cls ...) are not looked up
+            if not filepath.endswith(project.SYSTEM_EXTENSIONS) and self.project:
+                filepath = self.project.resolve(filepath) or filepath
+            self._filepaths[filestart] = filepath
+        return filepath
+
+    def get_matches_all(self) -> list[Record]:
+        """ get matches of pattern from all chunks """
+        state = ParseState()
+        with trace.phase('get_matches_all', file=self.file, mmap=self.use_mmap) as ph:
+            if not self.use_mmap:
+                self.scan(self.contents, state)
+            else:
+                with open(self.file, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size > 0: # empty file cannot be mapped
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            for block in (self.iter_blocks(mm) if self.needs_blocks(mm) else [mm]):
+                                self.scan(block, state)
+            ph['records'] = len(state.result)
+        return state.result
+
+    def iter_matches(self) -> Iterator[Record]:
+        """
+        yield records of whole log file as soon as each record is found.
+        Log file is always scanned on memory-mapped file, so memory doesn't grow with the size of log file
+        and the consumer can stop at any time (e.g. the first error of huge log file).
+        Records which wait the line number from l.xx are yielded after it, so the order can be
+        different from get_matches_all(). Records whose l.xx is not found are yielded at the end.
+        """
+        state = ParseState()
+        with open(self.file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0: # empty file cannot be mapped
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for block in (self.iter_blocks(mm) if self.needs_blocks(mm) else [mm]):
+                    yield from self.iter_scan(block, state)
+        for idx in state.pending:
+            yield state.result[idx]
+
+    def get_matches_tail(self, state:ParseState) -> list[Record]:
+        r"""
+        get matches of pattern from the bytes which are appended after previous scan.
+        It is used in watch mode (latexmk -pvc / tectonic watch) which checks the same log file repeatedly.
+
+        Only the part which ends with blank line (\n\n or \r\n\r\n) is committed to state, because a message can be
+        continued to the next line and it is not written yet. The rest part is scanned with copy of state
+        to show the latest result, and it will be scanned again at the next call.
+        latex engine rewrites log file at every run, so the log file whose mtime or inode is changed is
+        continued only if the hash of its whole committed part is not changed.
+        Otherwise (truncated or rewritten), state is reset and whole file is parsed.
+
+        Args:
+            state(ParseState) : state from previous call. It is updated in place.
+
+        Return:
+            result(list[Record]) : diagnostic records of whole log file
+        """
+        with open(self.file, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+
+            # check log file is continued from previous scan.
+            # A rebuild can write a log of the same length whose messages are changed in the middle,
+            # so the whole committed part is compared unless the log file is not touched at all.
+            prefix = None # hash object of bytes until state.offset, it is updated with committed part
+            if state.offset > 0 and state.stat != [stat.st_mtime_ns, stat.st_ino, size]:
+                if size >= state.offset:
+                    prefix = _hash_prefix(f, state.offset)
+                if prefix is None or prefix.hexdigest() != state.prefix:
+                    state.reset() # log file is truncated or rewritten, parse from the start
+                    prefix = None
+            state.stat = [stat.st_mtime_ns, stat.st_ino, size]
+            state.encoding = state.encoding or self.encoding
+            encoding = state.encoding or 'utf-8'
+
+            if size == state.offset: # nothing is appended
+                return state.result
+
+            # read appended part, mmap doesn't need to copy it
+            # 'start' is the position in buffer where appended part starts
+            buffer:bytes|mmap.mmap
+            if self.use_mmap:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                start = state.offset
+            else:
+                _ = f.seek(state.offset)
+                buffer = f.read(size - state.offset)
+                start = 0
+
+            # commit until last blank line, the log of Windows has \r\n\r\n
+            lf, crlf = buffer.rfind(b'\n\n', start), buffer.rfind(b'\n\r\n', start)
+            checkpoint = max(lf + 2 if lf >= 0 else start, crlf + 3 if crlf >= 0 else start)
+            if checkpoint > start:
+                prefix = prefix or _hash_prefix(f, state.offset)
+                prefix.update(buffer[start:checkpoint])
+                self._scan_part(buffer, state, start, checkpoint, encoding)
+                state.offset += checkpoint - start
+                state.prefix = prefix.hexdigest()
+
+            # scan rest part without commit
+            rest = state
+            if checkpoint < len(buffer):
+                rest = state.copy()
+                self._scan_part(buffer, rest, checkpoint, len(buffer), encoding)
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+        return rest.result
+
+    def _scan_part(self, buffer:bytes|mmap.mmap, state:ParseState, start:int, end:int, encoding:str) -> None:
+        """ scan part of buffer, decode the part before scan if mmap is not used """
+        if self.needs_blocks(buffer, start, end):
+            # part ends with blank line (or the end of log file), it is converted without the next part
+            for block in self.iter_blocks(buffer, start, end):
+                self.scan(block if self.use_mmap else self.decode_lines(block, encoding), state)
+        elif self.use_mmap:
+            self.scan(buffer, state, start, end)
+        else:
+            self.scan(self.decode_lines(buffer[start:end], encoding), state)
+
+
+_bytes_regex:dict[re.Pattern[str], re.Pattern[bytes]] = {}
+def get_bytes_regex(regex:re.Pattern[str]) -> re.Pattern[bytes]:
+    """
+    get bytes version of regex pattern to scan bytes buffer like mmap.
+    All patterns of log file are ascii, so the same pattern can be used for bytes.
+    """
+    if regex not in _bytes_regex:
+        _bytes_regex[regex] = re.compile(regex.pattern.encode('ascii'), regex.flags & ~re.UNICODE)
+    return _bytes_regex[regex]
+
+
+def normalize_newlines(data:bytes) -> bytes:
+    r""" convert CRLF to LF like text mode of open(), patterns of log file expect \n as line ending """
+    return data.replace(b'\r\n', b'\n') if b'\r' in data else data
+
+
+def _scan_chunk(args:tuple[str, str, str|None, str, int, int]) -> ChunkState:
+    """ scan a chunk of log file in worker process of parallel parsing """
+    file, compiledir, mainpath, engine, start, stop = args
+    p = Parser(file, log_patterns.get_regex(), compiledir, mainpath, True, engine)
+    return p.get_matches_chunk(start, stop)
+
+
+def parse_log(file:str, state:ParseState|None=None,
+              compiledir:str|None=None, mainpath:str|None=None, use_mmap:bool=False,
+              engine:str='regex', jobs:int=1, use_cache:bool=False, unwrap:int=0,
+              on_record:Callable[[Record], None]|None=None) -> list[Record]:
+    """
+    parse latex log file with default patterns
+
+    Args:
+        file(str) : absolute path of log file
+        state(ParseState) : If it is given, parse the appended part of log file since previous call only.
+        compiledir(str) : directory where latex engine runs
+        mainpath(str) : absolute path of main tex file
+        use_mmap(bool) : scan memory-mapped log file and decode matched message only
+        engine(str) : 'regex' | 'dispatch', scanner engine of Parser
+        jobs(int) : If it is more than 1, large log file is parsed on process pool with this number of workers.
+                    It is not used with state.
+        use_cache(bool) : If true, the result of unchanged log file is returned from cache in data directory.
+                          It is not used with state.
+        unwrap(int) : max_print_line of log file to join wrapped lines, 0 if lines are not wrapped.
+                      Log file is parsed serially with it, chunks of parallel parsing don't know wrapped lines.
+        on_record(Callable) : called with each record as soon as it is found, before the whole log file is parsed.
+                              Records can be duplicated and line of package messages is not resolved.
+                              It is not called for the result from cache and parallel parsing.
+
+    Return:
+        result(list[Record]) : diagnostic records of whole log file without duplicated one
+    """
+    # *.blg / *.ilg use their own pattern set, dispatch scanner supports patterns of latex log only
+    logtype = log_patterns.get_logtype(file)
+    if logtype != 'log':
+        engine, jobs, unwrap = 'regex', 1, 0
+    if unwrap:
+        jobs = 1
+
+    if state is not None:
+        p = Parser(file, log_patterns.get_regex(logtype), compiledir, mainpath, use_mmap, engine, unwrap)
+        p.on_record = on_record
+        # records of state are kept for the next call, line of package is resolved on copies
+        # like cache, so the moved \usepackage of main tex file is found again at the next call
+        result = [record.copy() for record in unique_records(p.get_matches_tail(state))]
+        project.resolve_package_lines(result, mainpath)
         return result
 
+    if use_cache:
+        with trace.phase('cache_load', file=file) as ph:
+            result = cache.load_result(file, compiledir, mainpath, unwrap, engine)
+            ph['hit'] = result is not None
+        if result is not None:
+            # line of package is resolved after cache, main tex file can be changed without changing log file
+            project.resolve_package_lines(result, mainpath)
+            return result
+
+    p = Parser(file, log_patterns.get_regex(logtype), compiledir, mainpath, use_mmap, engine, unwrap)
+    p.on_record = on_record
+    if jobs > 1 and os.path.getsize(file) >= PARALLEL_MIN_SIZE:
+        result = unique_records(p.get_matches_parallel(jobs))
+    else:
+        result = unique_records(p.get_matches_all())
+    if use_cache:
+        with trace.phase('cache_save', file=file):
+            cache.save_result(file, result, compiledir, mainpath, unwrap, engine)
+    project.resolve_package_lines(result, mainpath)
+    return result
+
+
+def parse_logs(files:list[str], state:ParseState|None=None,
+               compiledir:str|None=None, mainpath:str|None=None, use_mmap:bool=False,
+               engine:str='regex', jobs:int=1, use_cache:bool=False, unwrap:int=0,
+               on_record:Callable[[Record], None]|None=None) -> list[Record]:
+    """
+    parse log files of one build (e.g. *.log, *.blg, *.ilg) concurrently and merge the results
+
+    Args:
+        files(list[str]) : log files, the first one is main log file
+        state(ParseState) : state of tail mode, it is used for the first log file only.
+                            Other log files are rewritten at every build, they are parsed whole (or from cache).
+        others : same with parse_log()
+
+    Return:
+        result(list[Record]) : diagnostic records of all log files in order of files, without duplicated one
+    """
+    if len(files) == 1:
+        return parse_log(files[0], state, compiledir, mainpath, use_mmap, engine, jobs, use_cache, unwrap, on_record)
+
+    from concurrent.futures import ThreadPoolExecutor
+    with trace.phase('parse_logs', files=len(files)) as ph:
+        with ThreadPoolExecutor(max_workers=min(len(files), MULTI_LOG_THREADS)) as pool:
+            futures = [pool.submit(parse_log, file, state if i == 0 else None, compiledir, mainpath,
+                                   use_mmap, engine, jobs, use_cache, unwrap, on_record)
+                       for i, file in enumerate(files)]
+            result = unique_records([record for future in futures for record in future.result()])
+        ph['records'] = len(result)
+    return result
+
+
+def iter_log(file:str, compiledir:str|None=None, mainpath:str|None=None,
+             engine:str='regex', use_cache:bool=False, unwrap:int=0) -> Iterator[Record]:
+    """
+    parse latex log file and yield records as soon as they are found, see Parser.iter_matches().
+    Records are not unique and line of package messages is not resolved, use iter_logs() to get them.
+
+    Args:
+        use_cache(bool) : If true, records are yielded from cache if log file is not changed.
+                          The result is not saved to cache, the consumer can stop before the end of log file.
+        others : same with parse_log()
+    """
+    logtype = log_patterns.get_logtype(file)
+    if logtype != 'log':
+        engine, unwrap = 'regex', 0
+    if use_cache:
+        result = cache.load_result(file, compiledir, mainpath, unwrap, engine)
+        if result is not None:
+            yield from result
+            return
+    p = Parser(file, log_patterns.get_regex(logtype), compiledir, mainpath, True, engine, unwrap)
+    yield from p.iter_matches()
+
+
+def iter_logs(files:list[str], compiledir:str|None=None, mainpath:str|None=None, engine:str='regex',
+              use_cache:bool=False, max_errors:int|None=None, severity:str|None=None,
+              unwrap:int=0) -> Iterator[Record]:
+    """
+    parse log files of one build one by one and yield unique records as soon as they are found.
+    It gives the first error of huge log file without waiting the end of parsing.
+
+    Args:
+        files(list[str]) : log files, the first one is main log file
+        max_errors(int) : stop parsing after this number of errors are yielded
+        severity(str) : 'ERROR' | 'WARN' | 'INFO', records below this severity are not yielded
+        others : same with parse_log()
+    """
+    records = (record for file in files for record in iter_log(file, compiledir, mainpath, engine, use_cache, unwrap))
+    for record in filter_records(unique_records_iter(records), max_errors, severity):
+        project.resolve_package_lines([record], mainpath)
+        yield record
+
+
+def filter_records(records:Iterable[Record], max_errors:int|None=None, severity:str|None=None) -> Iterator[Record]:
+    """
+    filter records by severity and stop after max_errors errors
+
+    Args:
+        records(Iterable[Record]) : records, it is consumed lazily
+        max_errors(int) : the number of errors to yield, the rest records are not consumed. None or 0 for no limit
+        severity(str) : 'ERROR' | 'WARN' | 'INFO', records below this severity are not yielded. None for all
+    """
+    level = SEVERITY_LEVELS.get(severity or 'INFO', 0)
+    errors = 0
+    for record in records:
+        if SEVERITY_LEVELS.get(record['severity'], 0) < level:
+            continue
+        yield record
+        if record['severity'] == 'ERROR':
+            errors += 1
+            if max_errors and errors >= max_errors:
+                return
+
+
+def discover_logs(logfile:str) -> list[str]:
+    """
+    find log files of the same build next to main log file
+
+    Return:
+        files(list[str]) : [logfile, <name>.blg, <name>.ilg, logs of subfiles ...] which exist
+    """
+    files = [logfile]
+    base = os.path.splitext(logfile)[0]
+    for ext in ('.blg', '.ilg'):
+        if os.path.isfile(base + ext):
+            files.append(base + ext)
+
+    # each chapter of 'subfiles' package can be compiled alone, its log file uses subfiles.cls
+    logdir = os.path.dirname(os.path.abspath(logfile))
+    try:
+        entries = sorted(os.scandir(logdir), key=lambda entry: entry.name)
+    except OSError:
+        return files
+    for entry in entries:
+        if not entry.name.endswith('.log') or os.path.samefile(entry.path, logfile):
+            continue
+        try:
+            with open(entry.path, 'rb') as f:
+                if b'subfiles.cls' in f.read(SUBFILES_SEARCH_SIZE):
+                    files.append(entry.path)
+        except OSError:
+            continue
+    return files
+
+
+def unique_records(records:list[Record]) -> list[Record]:
+    """ remove duplicated records, the order of records is kept """
+    return list(unique_records_iter(records))
+
 
+def unique_records_iter(records:Iterable[Record]) -> Iterator[Record]:
+    """ yield records without duplicated one, records are consumed lazily """
+    hashes:set[tuple[Any, ...]] = set()
+    for record in records:
+        key = (record['file'], record['line'], record['severity'], record['message'])
+        if key not in hashes:
+            hashes.add(key)
+            yield record
 
 
+def compact_record(record:Record) -> dict[str, Any]:
+    """ remove empty field of record to reduce the size of data which is sent to lua """
+    return {key: value for key, value in record.items() if value is not None}
 
 
+def _hash_prefix(f:BinaryIO, offset:int) -> hashlib.blake2b:
+    """ get hash object of the first offset bytes of opened file, it can be updated with the following bytes """
+    h = hashlib.blake2b(digest_size=16)
+    _ = f.seek(0)
+    remain = offset
+    while remain > 0 and (block := f.read(min(remain, TAIL_HASH_BLOCK_SIZE))):
+        h.update(block)
+        remain -= len(block)
+    return h
@@ -1,4 +1,6 @@
 import os
+import sys
+from pathlib import Path
 
 
 def sep_change(path: str, sep_to:str|None=None):
@@ -32,3 +34,16 @@ def path_normalize(filepath: str):
     return os.path.join(drive, rest)
 
 
+def get_data_dir() -> Path:
+    """
+    get directory where texflow saves its data files (server file, parser state ...)
+
+    Returns:
+        Path : <XDG_DATA_HOME>/nvim(-data)/texflow, it follows the location of stdpath('data') in neovim
+    """
+    xdg_data_home = os.getenv('XDG_DATA_HOME')
+    if xdg_data_home is None:
+        return Path.home() / '.local' / 'share' / 'nvim-data' / 'texflow'
+    if sys.platform == 'win32':
+        return Path(xdg_data_home) / 'nvim-data' / 'texflow'
+    return Path(xdg_data_home) / 'nvim' / 'texflow'
@@ -0,0 +1,123 @@
+import os
+import re
+from functools import cache
+
+# error/warning patterns of latex log file
+# use $ to get all sentence without \n
+# (?:a) includes a
+# (?=a) not includes a
+# add \.(?:\n|$) to detect multiline message, It detects dot is the last of sentence.
+# but some warning like 'pdfTeX warning', doesn't have a dot at end of sentence.
+log_patterns = {
+    # "filestart": r'\((?P<filestart>[^\)\(\n]*)(?:\n|$)', it has problem.
+    # 1) capture ends until (,),\n with [^\)\(\n]*
+    # 2) and check the next character is ended with \n or $ with (?:\n|$).
+    # if the text is (./some/path/file),  it captures until (./some/path/file, and next character is ), not \n|$.
+    # so this whole matching line will be discard.
+
+    # filestart : Capture from the opening parenthesis until the closing parenthesis ')' or \n appears.
+    # start with '(' at anywhere, capture any word except of ')' and '\n'
+    # [^\)\(*] means the capture will be end before (,), the (,) won't be included in capture group(0).
+    # so the next match will starts from (,). it makes next match can capture <fileend>.
+    # (?:\n|$) means the capture will be end before \n|$, but \n|$ are included in capture group(0).
+    # the next match will starts from next character of \n|$.
+    # "filestart": r'\((?P<filestart>[^\)\(\n]*)(?:\(|\)|\n|$)',
+    "filestart": r'(?P<filestart>\([^\)\(\n]*)\n?',
+    # "filestart": r'\((?P<filestart>[^\)\(\n]*)',
+    "fileend": r'(?P<fileend>[\)])',                                 # fileend : capture all ')'
+    "error1": r'^(?P<error1>[^\n]*\.tex:\d+:.*?\.)(?:\n|$)',         # test2.tex:42: LaTeX Error: ~
+    # <error2> : ! LaTeX Error: message
+    # It captures all strings from '!' to \n or $ after dot(.).
+    # '.*?' means non-greedy capture '.*' + '?'. because '.*' means greedy capture which captures more than one line.
+    "error2": r'^(?P<error2>! .*?\.)(?:\n|$)',                       # ! LaTeX Error: ~
+    "error_pkg": r'^(?P<error_pkg>Package \w+ Error:.*?\.)(?:\n\n|\n$)',
+    # <line> : l.21 \beigne~
+    # capture <l.21> only, \b is added to distinguish word boundary.
+    # If \b doesn't exist, \w word right after l.21 will be captured. the line number always add white space.
+    "line": r'^(?P<line>l\.\d+)\b',                                  # l.21 ~
+    "warn_latex": r'^(?P<warn_latex>LaTeX Warning:.*?\.)(?:\n|$)',   # LaTeX Warning: There were undefined references.
+    # Package <name> Warning: messages,
+    # It can be multiple sentences with starting '(name)', so the end condition must be \n\n
+    "warn_pkg": r'^(?P<warn_pkg>Package \w+ Warning:.*?\.)(?:\n\n|\n$)',
+    "warn_pdftex": r'^(?P<warn_pdftex>pdfTeX warning.*?)(?=\s{3,})', # pdfTex warning (ext4): ~ end with multiple white spaces
+    # <warn_toc> : warning (pdf backend) : ~~ \n[1
+    # it capture until \[ but excludes \n or $
+    "warn_toc": r'^(?P<warn_toc>warning.*?)(?:\n|$)(?=\[)', # pdfTex warning (ext4): ~ end with multiple white spaces
+    "warn_over": r'^(?P<warn_over>(Overfull|Underfull).*?)(?:\n|$)(?=\[)',   # 'overfull|underfull' to before ~ 59--60 []
+
+    # If it is failed to detect some files, It shows error
+    "warn_nofile": r'^(?P<warn_nofile>No file.*?\.)(?:\n|$)',   # No file <filename>.bbl
+}
+
+# error/warning patterns of bibliography log (*.blg). biber and bibtex write different forms.
+blg_patterns = {
+    # biber : [123] Biber.pm:1234> WARN - Duplicate entry key 'foo' in file 'refs.bib', skipping ...
+    # log level and message after '> ' is captured
+    "error_biber": r'^\[\d+\] [\w.]+:\d+> (?P<error_biber>ERROR - [^\n]*)',
+    "warn_biber": r'^\[\d+\] [\w.]+:\d+> (?P<warn_biber>WARN - [^\n]*)',
+    # bibtex : I was expecting a `,' or a `}'---line 12 of file refs.bib
+    "error_bibtex": r'^(?P<error_bibtex>[^\n]*---line \d+ of file [^\n]*)',
+    # bibtex : Warning--empty journal in foo
+    # some warnings are followed by location line, --line 3 of file refs.bib
+    "warn_bibtex": r'^(?P<warn_bibtex>Warning--[^\n]*(?:\n--line \d+ of file [^\n]*)?)',
+}
+
+# error/warning patterns of index log (*.ilg) of makeindex. message is in the next line which starts with '--'
+index_patterns = {
+    # !! Input index error (file = doc.idx, line = 5):
+    #    -- Extra `@' at position 12 of first argument.
+    "error_index": r'^(?P<error_index>!! [^\n]*\n\s*-- [^\n]*)',
+    # ## Warning (input = doc.ind, line = 10; output = doc.ind, line = 20):
+    #    -- Unmatched range closing operator ).
+    "warn_index": r'^(?P<warn_index>## Warning [^\n]*\n\s*-- [^\n]*)',
+}
+
+# pattern set of each log type, log type is decided by extension of log file
+pattern_sets = {
+    'log': log_patterns,
+    'blg': blg_patterns,
+    'ilg': index_patterns,
+}
+
+# guards of patterns for dispatch scanner.
+# A pattern is tried only if the text at the position starts with one of prefixes.
+# filestart/fileend can be matched at anywhere, other patterns are matched at the beginning of line only.
+dispatch_prefixes = {
+    "filestart": ('(',),
+    "fileend": (')',),
+    "error1": None, # error1 starts with file path, it is tried if the line contains dispatch_contains
+    "error2": ('! ',),
+    "error_pkg": ('Package ',),
+    "line": ('l.',),
+    "warn_latex": ('LaTeX Warning:',),
+    "warn_pkg": ('Package ',),
+    "warn_pdftex": ('pdfTeX warning',),
+    "warn_toc": ('warning',),
+    "warn_over": ('Overfull', 'Underfull'),
+    "warn_nofile": ('No file',),
+}
+dispatch_contains = {
+    "error1": '.tex:',
+}
+
+# re.MULTILINE makes '$' means end of line, not end of document, '\Z' means end of document.
+# If not re.MULTILINE, '$' means end of document.
+regex_flags = re.MULTILINE|re.DOTALL
+
+
+def get_logtype(file:str) -> str:
+    """ get log type of file from its extension, it is 'log' if the extension is unknown """
+    ext = os.path.splitext(file)[1][1:].lower()
+    return ext if ext in pattern_sets else 'log'
+
+
+@cache
+def get_regex(logtype:str='log') -> re.Pattern[str]:
+    """
+    get compiled regex of all patterns of log type.
+    It is compiled once per process, so the resident parser in neovim python host reuses it for every log file.
+    """
+    patterns = pattern_sets[logtype]
+    combined_patterns = r'|'.join(f"{pattern}" for pattern in patterns.values()) # combine patterns to string with '|',
+    err_regex  = re.compile(combined_patterns, regex_flags) # make compile command to re-usability
+    return err_regex
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import sys
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import cast
+
+PROBE_TIMEOUT = 0.5 # seconds, deadline of each probe. neovim responds in a few ms if it is alive.
+
+# msgpack-rpc request [type=0, msgid=1, method='nvim_get_mode', params=[]]
+# nvim_get_mode is answered even if neovim is waiting user input, so it is proper to check liveness.
+# It is encoded by hand, msgpack package is not needed to probe.
+PROBE_REQUEST = b'\x94\x00\x01\xadnvim_get_mode\x90'
+PROBE_RESPONSE = b'\x94\x01\x01' # response [type=1, msgid=1, ...]
+
+
+class ProbeProtocol(asyncio.Protocol):
+    """ send probe request to neovim server and wait the response """
+    done: asyncio.Future[bool]
+    buffer: bytes
+
+    def __init__(self, done:asyncio.Future[bool]):
+        self.done = done
+        self.buffer = b''
+
+    def connection_made(self, transport:asyncio.BaseTransport) -> None:
+        cast(asyncio.Transport, transport).write(PROBE_REQUEST)
+
+    def data_received(self, data:bytes) -> None:
+        self.buffer += data
+        if len(self.buffer) >= len(PROBE_RESPONSE) and not self.done.done():
+            self.done.set_result(self.buffer.startswith(PROBE_RESPONSE))
+
+    def connection_lost(self, exc:Exception|None) -> None:
+        if not self.done.done():
+            self.done.set_result(False)
+
+
+async def probe(servername:str, timeout:float=PROBE_TIMEOUT) -> bool:
+    """
+    check neovim server is alive
+
+    Args:
+        servername(str) : v:servername of neovim. unix socket path, named pipe of windows or host:port
+        timeout(float) : deadline of connection and response
+
+    Return:
+        result(bool) : True if neovim server responds in timeout
+    """
+    loop = asyncio.get_running_loop()
+    done:asyncio.Future[bool] = loop.create_future()
+    transports:list[asyncio.BaseTransport] = []
+
+    async def connect() -> bool:
+        tcp = re.match(r'^(?P<host>[^\\/]+):(?P<port>\d+)$', servername)
+        if tcp:
+            transport, _ = await loop.create_connection(lambda: ProbeProtocol(done),
+                                                        tcp.group('host'), int(tcp.group('port')))
+        elif sys.platform == 'win32':
+            # named pipe is supported by ProactorEventLoop, the default event loop of windows
+            # typeshed declares StreamReaderProtocol as the protocol of pipe, but any protocol works
+            proactor = cast(asyncio.ProactorEventLoop, loop)
+            factory = cast(Callable[[], asyncio.StreamReaderProtocol], lambda: ProbeProtocol(done))
+            transport, _ = await proactor.create_pipe_connection(factory, servername)
+        else:
+            transport, _ = await loop.create_unix_connection(lambda: ProbeProtocol(done), servername)
+        transports.append(transport)
+        return await done
+
+    try:
+        return await asyncio.wait_for(connect(), timeout)
+    except (OSError, TimeoutError, NotImplementedError):
+        return False
+    finally:
+        for transport in transports:
+            transport.close() # close every probe connection
+
+
+async def probe_all(servernames:list[str], timeout:float=PROBE_TIMEOUT) -> dict[str, bool]:
+    """ check neovim servers concurrently """
+    names = list(dict.fromkeys(servernames)) # remove duplicated servername
+    results = await asyncio.gather(*(probe(name, timeout) for name in names))
+    return dict(zip(names, results))
+
+
+def check_alive(servernames:list[str], timeout:float=PROBE_TIMEOUT) -> dict[str, bool]:
+    """
+    check neovim servers concurrently, it takes timeout at most regardless of the number of servers.
+
+    Args:
+        servernames(list[str]) : v:servername of neovim servers
+
+    Return:
+        result(dict[str, bool]) : liveness of each servername
+    """
+    if not servernames:
+        return {}
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(probe_all(servernames, timeout))
+    # event loop is running in this thread (e.g. neovim python host), run probes in other thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, probe_all(servernames, timeout)).result()
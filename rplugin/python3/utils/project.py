@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+from bisect import bisect_right
+from typing import TYPE_CHECKING, Any
+
+from . import paths
+
+if TYPE_CHECKING:
+    from .record import Record
+
+MAX_INPUT_DEPTH = 16 # depth of nested \input to follow, it prevents infinite loop of wrong project
+SYSTEM_EXTENSIONS = ('.sty', '.cls', '.clo', '.cfg', '.def', '.fd') # files of tex distribution, not in project
+
+# \usepackage[options]{a,b} or \RequirePackage{a}, options can be written in multiple lines
+package_regex = re.compile(r'\\(?:usepackage|RequirePackage)\s*(?:\[[^\]]*\])?\s*\{(?P<packages>[^}]*)\}')
+# \input{file}, \include{file}, \subfile{file}. \input file (without brace) is also used in plain tex style
+# the command name must end, \includegraphics / \includeonly / \inputencoding are not included files
+input_regex = re.compile(r'\\(?:input|include|subfile)(?![A-Za-z@])\s*(?:\{(?P<brace>[^}]*)\}|(?P<plain>[^\s{}\\%]+))')
+# \bibliography{a,b} of bibtex, \addbibresource[options]{a.bib} of biblatex
+bibliography_regex = re.compile(r'\\(?:bibliography|addbibresource)\s*(?:\[[^\]]*\])?\s*\{(?P<bibs>[^}]*)\}')
+comment_regex = re.compile(r'(?<!\\)%.*$', re.MULTILINE) # '%' comment except of '\%'
+
+
+class SourceFile:
+    """
+    commands of one tex file which make project index.
+    It is read again only if the file is changed, other files of project are reused when the index is rebuilt.
+    """
+    file:  str
+    mtime: int|None                   # None if the file doesn't exist
+    items: list[tuple[str, str, int]] # (kind, name, line) in order of appearance, kind is 'package' | 'input' | 'bib'
+
+    def __init__(self, file:str, mtime:int|None):
+        """ read commands of tex file """
+        self.file = file
+        self.mtime = mtime
+        self.items = []
+        if mtime is None:
+            return
+        try:
+            with open(file, 'r', encoding='utf-8', errors='replace') as f:
+                contents = comment_regex.sub('', f.read()) # comment is removed in each line, line numbers are kept
+        except OSError:
+            return
+
+        # line number from position of match
+        line_starts = [0] + [m.end() for m in re.finditer(r'\n', contents)]
+        matches = sorted([*package_regex.finditer(contents), *input_regex.finditer(contents),
+                          *bibliography_regex.finditer(contents)], key=lambda m: m.start())
+        for m in matches:
+            line = bisect_right(line_starts, m.start())
+            if m.re is input_regex:
+                self.items.append(('input', (m.group('brace') or m.group('plain')).strip(), line))
+                continue
+            kind, names = ('package', m.group('packages')) if m.re is package_regex else ('bib', m.group('bibs'))
+            self.items.extend((kind, name.strip(), line) for name in names.split(',') if name.strip())
+
+
+class ProjectIndex:
+    """
+    index of tex files of project which starts from main tex file.
+    It follows \\input / \\include / \\subfile from main tex file and keeps the include graph,
+    packages and bibliographies of project. It is reused until one of the files is changed.
+    """
+    mainpath:       str
+    packages:       dict[str, tuple[str, int]] # package name -> (file, line) where the package is loaded first
+    files:          dict[str, str]             # normcase path -> path of tex files of project, for O(1) lookup
+    graph:          dict[str, list[str]]       # file -> included files in order of appearance
+    bibliographies: list[str]                  # *.bib files of project
+    mtimes:         dict[str, int|None]        # files which are read -> mtime_ns, to check the index is valid
+
+    def __init__(self, mainpath:str):
+        """ read main tex file and included files """
+        self.mainpath = paths.path_normalize(mainpath)
+        self.packages = {}
+        self.files = {}
+        self.graph = {}
+        self.bibliographies = []
+        self.mtimes = {}
+        self.scan(self.mainpath, 0)
+
+    def scan(self, file:str, depth:int) -> None:
+        """ add tex file to index, included files are added at the position where they are included """
+        if file in self.mtimes or depth > MAX_INPUT_DEPTH:
+            return
+        source = get_source(file)
+        self.mtimes[file] = source.mtime # None if it doesn't exist, it is checked again when it is created
+        if source.mtime is None:
+            return
+        self.files[os.path.normcase(file)] = file
+        children = self.graph.setdefault(file, [])
+        for kind, name, line in source.items:
+            if kind == 'package':
+                if name not in self.packages:
+                    self.packages[name] = (file, line)
+            elif kind == 'bib':
+                bib = self.get_input_path(name, '.bib')
+                if bib not in self.bibliographies:
+                    self.bibliographies.append(bib)
+            else:
+                child = self.get_input_path(name, '.tex')
+                if child not in children:
+                    children.append(child)
+                self.scan(child, depth + 1)
+
+    def get_input_path(self, name:str, ext:str) -> str:
+        """
+        get absolute path of included file.
+        Relative path is based on the directory of main tex file where latex engine runs, not the including file.
+        """
+        if not os.path.splitext(name)[1]:
+            name += ext
+        if not os.path.isabs(name):
+            name = os.path.join(os.path.dirname(self.mainpath), name)
+        return paths.path_normalize(os.path.normpath(name))
+
+    def is_valid(self) -> bool:
+        """ check the files of index are not changed """
+        return all(get_mtime(file) == mtime for file, mtime in self.mtimes.items())
+
+    def get_package_line(self, package:str) -> tuple[str, int]|None:
+        """ get (file, line) where the package is loaded """
+        return self.packages.get(package)
+
+    def resolve(self, path:str) -> str|None:
+        """
+        get path of project file from absolute path of log file or neovim
+
+        Return:
+            path(str) : path of tex file in project, None if the path is not a file of project
+        """
+        if path.endswith(SYSTEM_EXTENSIONS):
+            return None # files of tex distribution are never included by \input
+        return self.files.get(os.path.normcase(os.path.normpath(path)))
+
+    def to_dict(self) -> dict[str, Any]:
+        """ convert index to dictionary to send it to lua """
+        return {
+            'main': self.mainpath,
+            'files': list(self.files.values()),
+            'graph': self.graph,
+            'bibliographies': self.bibliographies,
+        }
+
+
+def get_mtime(file:str) -> int|None:
+    """ get mtime of file, None if it doesn't exist """
+    try:
+        return os.stat(file).st_mtime_ns
+    except OSError:
+        return None
+
+
+_sources:dict[str, SourceFile] = {}     # read tex files in this process (e.g. neovim python host)
+_indexes:dict[str, ProjectIndex] = {}   # index of each main tex file in this process
+_lock = threading.Lock()                # resident parser and lua query use index in different threads
+
+
+def get_source(file:str) -> SourceFile:
+    """ get commands of tex file, it is read again only if the file is changed """
+    mtime = get_mtime(file)
+    source = _sources.get(file)
+    if source is None or source.mtime != mtime:
+        source = SourceFile(file, mtime)
+        _sources[file] = source
+    return source
+
+
+def get_index(mainpath:str) -> ProjectIndex:
+    """
+    get index of project, it is made again if one of its files is changed.
+    Unchanged files are not read again, so editing a chapter of large project reads the chapter only.
+    """
+    key = paths.path_normalize(mainpath)
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or not index.is_valid():
+            index = ProjectIndex(key)
+            _indexes[key] = index
+        return index
+
+
+def resolve_package_lines(records:list[Record], mainpath:str|None) -> None:
+    """
+    set file and line of package warning/error which doesn't have line,
+    to the line where the package is loaded (\\usepackage / \\RequirePackage).
+
+    Args:
+        records(list[Record]) : records of log parser, they are updated in place
+        mainpath(str) : absolute path of main tex file, nothing is done if it is None
+    """
+    if not mainpath or not os.path.exists(mainpath):
+        return
+    index:ProjectIndex|None = None
+    for record in records:
+        if record['package'] is None or record['line'] is not None:
+            continue
+        index = index or get_index(mainpath) # index is made only if there are package messages
+        location = index.get_package_line(record['package'])
+        if location:
+            record['file'], record['line'] = location
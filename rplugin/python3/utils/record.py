@@ -0,0 +1,18 @@
+# diagnostic record which is shared by log parser, cache and project index
+# It doesn't import other modules of utils, so modules which use the type don't make import cycle.
+from __future__ import annotations
+
+from typing import TypedDict
+
+
+class Record(TypedDict):
+    """
+    diagnostic record of log file which is classified by the group name of pattern.
+    It is sent to lua as it is, and lua uses it to make vim.Diagnostic
+    """
+    kind:     str       # group name of pattern which matches this message (error1, warn_pkg ...)
+    severity: str       # 'ERROR' | 'WARN' | 'INFO', key of vim.diagnostic.severity
+    file:     str|None  # absolute path of file which the message belongs to
+    line:     int|None  # line number (1-index) of file, None if the log doesn't mention it
+    message:  str
+    package:  str|None  # package name of warn_pkg / error_pkg
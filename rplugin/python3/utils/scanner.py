@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Iterator
+from functools import cache
+from typing import Any
+
+from . import patterns
+
+
+class DispatchScanner:
+    """
+    scanner which finds the same matches with combined regex of patterns.get_regex().
+
+    The combined regex tries all alternatives at every character of log file.
+    This scanner searches filestart / fileend and the beginning of line which starts with one of
+    dispatch_prefixes only. At the beginning of line, it tries the sub patterns which can be matched there
+    in the order of alternatives. The result is identical with finditer() of the combined regex,
+    because the alternatives which are skipped can never be matched at the position.
+    """
+    binary:     bool
+    head_size:  int             # the length of the longest prefix
+    candidate:  re.Pattern[Any] # filestart | fileend | beginning of line which can be matched with other patterns
+    line_rules: list[tuple[tuple[Any, ...]|None, Any, re.Pattern[Any]]] # (prefixes, contains, pattern)
+
+    def __init__(self, binary:bool=False):
+        """
+        Args:
+            binary(bool) : If true, scan bytes (or mmap) instead of str
+        """
+        self.binary = binary
+        encode = (lambda text: text.encode('ascii')) if binary else (lambda text: text)
+
+        self.line_rules = []
+        candidates:list[str] = []
+        line_heads:list[str] = []
+        for name, pattern in patterns.log_patterns.items():
+            prefixes = patterns.dispatch_prefixes.get(name)
+            contains = patterns.dispatch_contains.get(name)
+            # filestart / fileend can be matched at anywhere, the match of candidate is used as it is.
+            if name == 'filestart' or name == 'fileend':
+                candidates.append(pattern)
+                continue
+            self.line_rules.append((tuple(encode(p) for p in prefixes) if prefixes else None,
+                                    encode(contains) if contains else None,
+                                    re.compile(encode(pattern), patterns.regex_flags)))
+            # candidate position of other patterns is the beginning of line
+            if prefixes:
+                line_heads.extend(re.escape(p) for p in prefixes)
+            if contains:
+                line_heads.append(r'[^\n]*' + re.escape(contains))
+        candidates.append(r'^(?=' + '|'.join(line_heads) + ')') # zero width match at the beginning of line
+        self.candidate = re.compile(encode('|'.join(candidates)), patterns.regex_flags)
+        self.head_size = max(len(p) for prefixes, _, _ in self.line_rules for p in (prefixes or ()))
+
+    def finditer(self, contents:Any, pos:int=0, endpos:int|None=None) -> Iterator[re.Match[Any]]:
+        """
+        find matches of patterns like re.Pattern.finditer()
+
+        Args:
+            contents(str|bytes|mmap) : contents of log file
+            pos(int) : position of contents where the scan starts
+            endpos(int) : position of contents where the scan ends
+        """
+        endpos = len(contents) if endpos is None else endpos
+        nl = b'\n' if self.binary else '\n'
+
+        restart = True
+        while restart:
+            restart = False
+            for found in self.candidate.finditer(contents, pos, endpos):
+                start = found.start()
+                # skip candidates in the message which is matched at the beginning of line
+                if start < pos:
+                    if found.end() > pos: # the candidate covers next position, search again from there
+                        restart = True
+                        break
+                    continue
+
+                # filestart / fileend
+                if found.lastgroup:
+                    yield found
+                    pos = found.end()
+                    continue
+
+                # other patterns are matched at the beginning of line, check them in the order of alternatives
+                # mmap doesn't have startswith(), compare with the head of line
+                head = contents[start:min(start + self.head_size, endpos)]
+                line_end = contents.find(nl, start, endpos)
+                line_end = endpos if line_end < 0 else line_end
+                for prefixes, contains, regex in self.line_rules:
+                    if prefixes is not None and not head.startswith(prefixes):
+                        continue
+                    if contains is not None and contents.find(contains, start, line_end) < 0:
+                        continue
+                    match = regex.match(contents, start, endpos)
+                    if match:
+                        yield match
+                        pos = match.end()
+                        break
+
+
+@cache
+def get_scanner(binary:bool=False) -> DispatchScanner:
+    """ get dispatch scanner which is made once per process """
+    return DispatchScanner(binary)
@@ -1,37 +1,23 @@
-import json
-import os
 import re  # match string with regex
 import sys
 from pathlib import Path  # supports expandvars automatically
-from typing import cast
 
 import pynvim
 
 from .errors import err_notify
+from .store import ServerStore
 
-# get config file to save mapping data
-xdg_data_home = os.getenv('XDG_DATA_HOME')
-server_file:Path
-if xdg_data_home is None:
-    server_file = Path.home() / '.local' / 'share' / 'nvim-data' / 'texflow' / 'texflow_server.json'
-else:
-    if sys.platform == 'win32':
-        server_file = Path(xdg_data_home) / 'nvim-data' / 'texflow' / 'texflow_server.json'
-    else:
-        server_file = Path(xdg_data_home) / 'nvim' / 'texflow' / 'texflow_server.json'
 
 @pynvim.plugin
 class ServerManager:
-    server_file:    Path
-    mapping_result: dict[str, str]
+    store:          ServerStore # server mapping (alias -> servername) in data directory
     nvim:           pynvim.Nvim # declare pynvim.Nvim as type of nvim
     servername:     str
 
     # def __init__(self, nvim:pynvim.Nvim, alias:str='', server_file:Path=server_file):
     def __init__(self, nvim:pynvim.Nvim|None=None, alias:str=''):
         """ initialize variable at creation"""
-        self.server_file = server_file
-        self.mapping_result = self.load_server_mapping()
+        self.store = ServerStore()
         if nvim is not None:
             self.nvim = nvim # for python integration in neovim lua
         else:
@@ -43,19 +29,22 @@ class ServerManager:
     @pynvim.function('Texflow_save_server_mapping', sync=True)
     def save_server_mapping(self, args: list[str]|None = None):
         """
-        save server mapping data to json file
+        save server mapping data to store file
+        Only one line is appended to store file, whole mapping isn't rewritten.
         Args:
             args(list[str]) : only one string is required if you call it from lua.
-                              It will be a key in mapping_result dictionary
+                              It will be a key in server mapping
                               and the value is servername of current neovim instance
+                              If it is empty, store file is compacted to live entries.
         """
-        if args:
-            self.mapping_result[args[0]] = self.nvim.vvars['servername']
         try:
-            self.server_file.parent.mkdir(parents=True, exist_ok=True) # mkdir if not exists
-            with open(self.server_file, 'w', encoding='utf-8') as f:
-                json.dump(self.mapping_result, f, indent=4) # write dictionary data to json file with json format
-        except IOError as e:
+            if args:
+                self.store.set(args[0], self.nvim.vvars['servername'])
+            else:
+                self.store.migrate()
+                with self.store.locked():
+                    self.store.compact()
+        except OSError as e:
             err_notify('cannot open config file to save data', str(e))
 
         # self.nvim.vars[] = get 'vim.g' variable
@@ -68,30 +57,31 @@ class ServerManager:
 
     @pynvim.function('Texflow_load_server_mapping', sync=True)
     def load_server_mapping(self, args: list[str]|None=None) -> dict[str, str]:
-        """ load server mapping data from json file """
-        if self.server_file.exists():
-            try:
-                with open(self.server_file, 'r') as f:
-                    return cast(dict[str, str], json.load(f)) # read json file
-            except (json.JSONDecodeError, IOError) as e:
-                err_notify('cannot open config file to load data', str(e))
-                return {}
-        return {}
+        """ load server mapping data from store file """
+        return self.store.load()
 
     @pynvim.function('Texflow_prune_server_mapping', sync=True)
-    def prune_server_mapping(self, args: list[str]|None=None) -> None:
-        """ prune dead server mapping data from json file """
-        temp_dict = self.mapping_result.copy() # avoid runtime error from editing dict while for loop
-        for alias, servername in temp_dict.items():
-            try:
-                _ = pynvim.attach('socket', path=servername)
-            except Exception:
-                del self.mapping_result[alias]
+    def prune_server_mapping(self, args: list[str]|None=None) -> list[str]:
+        """
+        prune dead server mapping data from store file
+        All servers are checked concurrently with deadline, a hung server doesn't stall pruning.
 
-        self.save_server_mapping()
+        Return:
+            removed(list[str]) : aliases which are removed from store file
+        """
+        from . import probe  # asyncio is imported only when servers are checked
+        mapping = self.store.load()
+        alive = probe.check_alive(list(mapping.values()))
+        removed = [alias for alias, servername in mapping.items() if not alive.get(servername)]
+        try:
+            self.store.delete(removed)
+        except OSError as e:
+            err_notify('cannot open config file to save data', str(e))
+        return removed
 
 
-    def is_fullservername(self, alias:str) -> bool:
+    @staticmethod
+    def is_fullservername(alias:str) -> bool:
         r"""
         check the servername is full name.
         It the servername is absolute format, return true
@@ -109,41 +99,53 @@ class ServerManager:
         return re.match(pattern, alias) is not None
 
 
+    def resolve_servername(self, alias:str) -> str|None:
+        r"""
+        get servername from alias
+        If alias is full server name like '\\.\pipe\<alias>.19234.0', use it literally.
+        Otherwise, find servername of alias from server mapping. 'recent' is used if there are no mapping.
+        """
+        if self.is_fullservername(alias):
+            return alias # if full server name is entered, use literally
+        return self.store.get(alias) or self.store.get('recent') # if it is alias, check mapping server
+
+    def attach(self, servername:str) -> pynvim.Nvim:
+        """ connect to neovim server, exit if it fails """
+        try:
+            return pynvim.attach('socket', path=servername)
+        except Exception as e:
+            err_notify('There are no opened neovim instance to connect', str(e))
+            sys.exit(201)
+
     def get_server(self, alias:str=''):
         r"""
         find server using alias/absolute format and get the server handle
         if you access to server with <alias>, it a corresponding full server name like '\\.\pipe\<alias>.19234.0'
+        The server of alias and 'recent' are checked concurrently with deadline before connection,
+        so inverse search doesn't block on dead server.
         """
 
         if not alias:
             alias = 'recent'
 
-        if self.is_fullservername(alias):
-            servername = alias # if full server name is entered, use literally
-        else:
-            servername = self.mapping_result.get(alias) # if it is alias, check mapping server
-            if not servername:
-                servername = self.mapping_result['recent'] # if there are no mapping
+        from . import probe  # asyncio is imported only when servers are checked
+        servername = self.resolve_servername(alias)
+        recent = self.store.get('recent')
+        alive = probe.check_alive([name for name in (servername, recent) if name])
 
-        try:
-            nvim = pynvim.attach('socket', path=servername) # check this server is alive
-            return nvim
-        except Exception as e:
-            if alias != 'recent':
-                if alias in self.mapping_result:
-                    del self.mapping_result[alias] # if the server is dead, remove mapping
-                    self.save_server_mapping()
-
-                try:
-                    servername = self.mapping_result['recent']
-                    nvim = pynvim.attach('socket', path=servername)
-                    return nvim
-                except Exception as f:
-                    err_notify('There are no opened neovim instance to connect', str(f))
-                    sys.exit(201)
-            else:
-                err_notify('There are no opened neovim instance to connect', str(e))
-                sys.exit(202)
+        if servername and alive.get(servername):
+            return self.attach(servername)
+
+        if alias == 'recent':
+            err_notify('There are no opened neovim instance to connect', str(servername))
+            sys.exit(202)
+
+        if servername and servername != recent and self.store.get(alias) == servername:
+            self.store.delete([alias]) # if the server is dead, remove mapping
+        if recent and alive.get(recent):
+            return self.attach(recent)
+        err_notify('There are no opened neovim instance to connect', str(recent))
+        sys.exit(201)
 
 
 
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, cast
+
+import pynvim
+
+from . import patterns, project, synctex
+from .delta import make_delta
+from .parser import (
+    ParseState,
+    Record,
+    compact_record,
+    discover_logs,
+    filter_records,
+    parse_logs,
+)
+
+# lua function which receives the result of resident parser
+on_parsed_lua = "require('texflow.diagnostic').on_parsed(...)"
+# lua function which receives the first errors before the whole log file is parsed
+on_preview_lua = "require('texflow.diagnostic').on_preview(...)"
+PREVIEW_MIN_SIZE = 1 << 20 # smaller log file is parsed quickly, the result is sent without preview
+PREVIEW_MAX_ERRORS = 5     # the number of errors to send before the result
+
+
+@pynvim.plugin
+class LogParserService:
+    nvim:     pynvim.Nvim
+    executor: ThreadPoolExecutor
+    states:   dict[str, ParseState] # parser state of each log file for tail mode
+
+    def __init__(self, nvim:pynvim.Nvim):
+        """ initialize variable at creation """
+        self.nvim = nvim
+        # one worker thread is enough, it keeps the order of parsing requests of the same log file
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='texflow-logparser')
+        self.states = {}
+        _ = patterns.get_regex() # compile patterns once when the python host loads this plugin
+
+    # sync=False : neovim doesn't wait the return, the result is sent to lua by on_parsed()
+    @pynvim.function('Texflow_parse_log', sync=False)
+    def parse_log(self, args:list[Any]) -> None:
+        """
+        parse log file in resident python host instead of new python process
+
+        Args:
+            args(list) : [logfile, opts]
+                logfile(str) : absolute path of log file
+                opts(dict) : {tail = boolean, compiledir = string, main = string, mmap = boolean, engine = string,
+                              cache = boolean, discover = boolean, delta = string, max_errors = number,
+                              severity = string, unwrap = number}
+                             tail is same with texflow.checkopts, others are same with arguments of LogParser.py.
+                             If delta is given, the result is changes since the output of the token (utils/delta.py)
+        """
+        logfile = str(args[0])
+        opts = cast(dict[str, Any], args[1]) if len(args) > 1 and isinstance(args[1], dict) else {}
+        _ = self.executor.submit(self.parse_core, logfile, opts)
+
+    def parse_core(self, logfile:str, opts:dict[str, Any]) -> None:
+        """ parse log file off the event loop and send the result to lua """
+        try:
+            if not os.path.exists(logfile):
+                raise FileNotFoundError('LogParse cannot find the log file : ' + logfile)
+            state = None
+            if opts.get('tail'):
+                state = self.states.setdefault(logfile, ParseState())
+            # *.blg / *.ilg and logs of subfiles are parsed together if discover is set
+            files = discover_logs(logfile) if opts.get('discover') else [logfile]
+            # tail mode parses the appended part only, it is fast enough without preview
+            on_record = None
+            if state is None and os.path.getsize(logfile) >= PREVIEW_MIN_SIZE:
+                on_record = self.get_preview(opts.get('main'))
+            result = parse_logs(files, state, opts.get('compiledir'), opts.get('main'), bool(opts.get('mmap')),
+                                opts.get('engine') or 'regex', use_cache=opts.get('cache', True),
+                                unwrap=int(opts.get('unwrap') or 0), on_record=on_record)
+            if opts.get('max_errors') or opts.get('severity'):
+                result = list(filter_records(result, opts.get('max_errors'), opts.get('severity')))
+            token = opts.get('delta')
+            if isinstance(token, str):
+                items = make_delta(logfile, result, token, opts.get('compiledir'), opts.get('main'))
+            else:
+                items = [compact_record(record) for record in result]
+            self.nvim.async_call(self.send_result, items, None)
+        except Exception as e:
+            self.nvim.async_call(self.send_result, None, str(e))
+
+    def get_preview(self, mainpath:str|None) -> Callable[[Record], None]:
+        """
+        get callback of parser which sends the first errors to lua as soon as they are found,
+        so the error of huge log file is shown without waiting the end of parsing.
+        The result which is sent after parsing replaces them.
+        """
+        errors:list[dict[str, Any]] = []
+        lock = threading.Lock() # log files of one build are parsed in threads
+
+        def on_record(record:Record) -> None:
+            if record['severity'] != 'ERROR' or len(errors) >= PREVIEW_MAX_ERRORS:
+                return
+            record = record.copy() # the record of parser is not changed
+            project.resolve_package_lines([record], mainpath)
+            with lock:
+                if len(errors) >= PREVIEW_MAX_ERRORS:
+                    return
+                errors.append(compact_record(record))
+                items = errors.copy()
+            self.nvim.async_call(self.send_preview, items)
+        return on_record
+
+    def send_preview(self, errors:list[dict[str, Any]]) -> None:
+        """ call lua callback of preview in the event loop of python host """
+        self.nvim.exec_lua(on_preview_lua, errors, async_=True)
+
+    def send_result(self, result:list[dict[str, Any]]|None, err:str|None) -> None:
+        """ call lua callback in the event loop of python host """
+        self.nvim.exec_lua(on_parsed_lua, result, err, async_=True)
+
+
+@pynvim.plugin
+class SyncTexService:
+    """
+    lookup of synctex file in resident python host.
+    The index of synctex file is built once and kept until the file is changed (utils/synctex.py),
+    so each lookup doesn't parse synctex file again.
+    """
+    nvim: pynvim.Nvim
+
+    def __init__(self, nvim:pynvim.Nvim):
+        """ initialize variable at creation """
+        self.nvim = nvim
+
+    @pynvim.function('Texflow_synctex_forward', sync=True)
+    def forward(self, args:list[Any]) -> dict[str, Any]|None:
+        """
+        get position in pdf of source line
+
+        Args:
+            args(list) : [pdf, file, line]
+                pdf(str) : path of pdf file or its synctex file (*.synctex.gz / *.synctex)
+                file(str) : path of source tex file
+                line(int) : line number of source tex file
+
+        Return:
+            result(dict) : {page, x, y, width, height}, position is big point from the top-left of page.
+                           nil if there are no synctex file or the line is not found.
+        """
+        synctex_file = synctex.find_synctex(str(args[0]))
+        if synctex_file is None:
+            return None
+        result = synctex.forward(synctex_file, str(args[1]), int(args[2]))
+        return dict(result) if result else None
+
+    @pynvim.function('Texflow_synctex_inverse', sync=True)
+    def inverse(self, args:list[Any]) -> dict[str, Any]|None:
+        """
+        get source line of position in pdf
+
+        Args:
+            args(list) : [pdf, page, x, y], x and y are big point from the top-left of page
+
+        Return:
+            result(dict) : {file, line}, nil if there are no synctex file or the page has no record.
+        """
+        synctex_file = synctex.find_synctex(str(args[0]))
+        if synctex_file is None:
+            return None
+        result = synctex.inverse(synctex_file, int(args[1]), float(args[2]), float(args[3]))
+        return dict(result) if result else None
+
+
+@pynvim.plugin
+class ProjectService:
+    """
+    include graph of tex project in resident python host.
+    The index is kept until one of tex files is changed (utils/project.py),
+    lua looks up files of project in the result instead of resolving path at every event.
+    """
+    nvim: pynvim.Nvim
+
+    def __init__(self, nvim:pynvim.Nvim):
+        """ initialize variable at creation """
+        self.nvim = nvim
+
+    @pynvim.function('Texflow_project', sync=True)
+    def get_project(self, args:list[Any]) -> dict[str, Any]|None:
+        """
+        get files of project which are included from main tex file
+
+        Args:
+            args(list) : [mainpath], absolute path of main tex file
+
+        Return:
+            result(dict) : {main, files, graph, bibliographies}
+                           files : tex files of project including main tex file
+                           graph : {file = included files in order}
+                           bibliographies : *.bib files of \\bibliography / \\addbibresource
+                           nil if main tex file doesn't exist.
+        """
+        mainpath = str(args[0])
+        if not os.path.isfile(mainpath):
+            return None
+        return project.get_index(mainpath).to_dict()
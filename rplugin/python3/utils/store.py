@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import paths
+from .lock import file_lock
+
+COMPACT_SIZE = 32 << 10   # store file is compacted when it is larger than this after append
+READ_BLOCK_SIZE = 4096    # block size to read store file from the end
+
+
+class ServerStore:
+    """
+    server mapping store (alias -> servername) with append log.
+    Each line of store file is one update, {"k": alias, "v": servername} or {"k": alias, "v": null} for deletion.
+    The last line of the alias is valid, so an update appends one line without rewriting whole file
+    and a lookup reads lines from the end until it finds the alias.
+    Writers hold the lock file, and the file is compacted to live entries when it grows.
+    neovim (lua/texflow/io.lua) appends lines to the same file with the same lock file,
+    so a line which is appended while compacting is not lost.
+    """
+    file:        Path # texflow_server.jsonl
+    legacy_file: Path # texflow_server.json, it is migrated to store file at first access
+    lock_file:   Path
+
+    def __init__(self, data_dir:Path|None=None):
+        data_dir = data_dir or paths.get_data_dir()
+        self.file = data_dir / 'texflow_server.jsonl'
+        self.legacy_file = data_dir / 'texflow_server.json'
+        self.lock_file = data_dir / 'texflow_server.lock'
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        hold lock file while writing store file, other processes wait until it is released.
+        lua/texflow/io.lua takes the same lock file, see utils/lock.py
+        """
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.lock_file):
+            yield
+
+    def migrate(self) -> None:
+        """ make store file from legacy json file which has whole mapping """
+        if self.file.exists() or not self.legacy_file.exists():
+            return
+        try:
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self.locked():
+            if not self.file.exists(): # other process can migrate while waiting lock
+                self.write_all({str(k): str(v) for k, v in legacy.items()} if isinstance(legacy, dict) else {})
+
+    def get(self, alias:str) -> str|None:
+        """ get servername of alias, it reads lines from the end of store file until alias is found """
+        self.migrate()
+        for key, value in self.iter_reverse():
+            if key == alias:
+                return value
+        return None
+
+    def load(self) -> dict[str, str]:
+        """ get all live entries of store file """
+        self.migrate()
+        return self.read_all()
+
+    def read_all(self) -> dict[str, str]:
+        """ read all live entries of store file without migration, it can be called while the lock is held """
+        mapping:dict[str, str] = {}
+        try:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = self.parse_line(line)
+                    if entry is None:
+                        continue
+                    key, value = entry
+                    if value is None:
+                        _ = mapping.pop(key, None)
+                    else:
+                        mapping[key] = value
+        except OSError:
+            pass
+        return mapping
+
+    def set(self, alias:str, servername:str) -> None:
+        """ update servername of alias """
+        self.append([(alias, servername)])
+
+    def delete(self, aliases:list[str]) -> None:
+        """ remove aliases """
+        if aliases:
+            self.append([(alias, None) for alias in aliases])
+
+    def append(self, entries:list[tuple[str, str|None]]) -> None:
+        """ append updates to store file and compact it if it is too large """
+        self.migrate()
+        data = ''.join(json.dumps({'k': k, 'v': v}, ensure_ascii=False) + '\n' for k, v in entries)
+        with self.locked():
+            with open(self.file, 'a+b') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size > 0:
+                    _ = f.seek(size - 1)
+                    if f.read(1) != b'\n': # the last line is written partially by crashed process
+                        data = '\n' + data
+                _ = f.write(data.encode('utf-8'))
+                size = f.tell()
+            if size > COMPACT_SIZE:
+                self.compact()
+
+    def compact(self) -> None:
+        """
+        rewrite store file with live entries, the lock must be held.
+        Store file is read right before it is replaced, all lines which other writers appended are kept.
+        """
+        self.write_all(self.read_all())
+
+    def write_all(self, mapping:dict[str, str]) -> None:
+        """ rewrite store file with live entries atomically, the lock must be held """
+        tmp_file = self.file.with_name(f'{self.file.name}.{os.getpid()}.tmp')
+        with open(tmp_file, 'w', encoding='utf-8', newline='\n') as f:
+            _ = f.write(''.join(json.dumps({'k': k, 'v': v}, ensure_ascii=False) + '\n' for k, v in mapping.items()))
+        os.replace(tmp_file, self.file)
+
+    def iter_reverse(self) -> Iterator[tuple[str, str|None]]:
+        """ iterate entries from the end of store file """
+        try:
+            with open(self.file, 'rb') as f:
+                pos = f.seek(0, os.SEEK_END)
+                rest = b''
+                while pos > 0:
+                    size = min(READ_BLOCK_SIZE, pos)
+                    pos -= size
+                    _ = f.seek(pos)
+                    lines = (f.read(size) + rest).split(b'\n')
+                    rest = lines[0] # it can be cut in the middle of line, join it with previous block
+                    for line in reversed(lines[1:]):
+                        entry = self.parse_line(line)
+                        if entry is not None:
+                            yield entry
+                entry = self.parse_line(rest)
+                if entry is not None:
+                    yield entry
+        except OSError:
+            return
+
+    @staticmethod
+    def parse_line(line:str|bytes) -> tuple[str, str|None]|None:
+        """ parse one line of store file, None if it is empty or broken line """
+        if not line.strip():
+            return None
+        try:
+            data = json.loads(line)
+            value = data['v']
+            return str(data['k']), (None if value is None else str(value))
+        except (ValueError, KeyError, TypeError):
+            return None # line which is written partially by crashed process
@@ -0,0 +1,443 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, BinaryIO, TypedDict
+
+from . import paths
+
+INDEX_VERSION = 2        # version of index file, index files of other version are ignored
+INDEX_MAGIC = b'TEXFLOW-SYNCTEX\n' # the first bytes of index file
+INDEX_MAX_FILES = 8      # the number of index files to keep in data directory
+SP_PER_BP = 65781.76     # TeX scaled points per big point (pdf unit)
+
+# records of synctex file which have position
+# '[' / '(' : vbox / hbox        [tag,line:h,v:W,H,D
+# 'v' / 'h' : void vbox / hbox   v1,10:h,v:W,H,D
+# 'k'       : kern               k1,10:h,v:W
+# 'g' / '$' / 'x' : glue / math / current position   g1,10:h,v
+# '{page' starts records of page, 'Input:tag:path' declares source file of tag
+record_regex = re.compile(
+    rb'^(?:'
+    rb'(?P<kind>[\[\(vhkg$x])(?P<tag>\d+),(?P<line>\d+)(?:,-?\d+)?:(?P<h>-?\d+),(?P<v>-?\d+)'
+    rb'(?::(?P<W>-?\d+)(?:,(?P<H>-?\d+),(?P<D>-?\d+))?)?'
+    rb'|\{(?P<page>\d+)'
+    rb'|Input:(?P<input>\d+):(?P<path>[^\r\n]*)'
+    rb')', re.MULTILINE)
+preamble_regex = re.compile(rb'^(?P<key>Unit|Magnification|X Offset|Y Offset):(?P<value>-?[\d.]+)', re.MULTILINE)
+HBOX_KINDS = b'(h' # horizontal boxes, they are lines of text
+VBOX_KINDS = b'[v' # vertical boxes, they can be as tall as the whole page
+# arrays of SyncTexIndex which are saved to index file as raw bytes
+INDEX_ARRAYS = ('tags', 'lines', 'pages', 'h', 'v', 'width', 'height', 'depth', 'keys', 'order', 'vorder', 'vkeys', 'vboxes')
+
+
+class ForwardResult(TypedDict):
+    page:   int
+    x:      float # left of box in big point (pdf unit) from the left of page
+    y:      float # top of box in big point from the top of page
+    width:  float
+    height: float
+
+
+class InverseResult(TypedDict):
+    file: str
+    line: int
+
+
+class SyncTexIndex:
+    """
+    index of synctex file which maps source (file, line) <-> pdf (page, position).
+
+    Records are kept in parallel arrays instead of objects, so large synctex file is indexed
+    with a few bytes per record and the index can be saved / loaded quickly.
+    Records are in page order of synctex file, forward lookup uses another order sorted by (tag, line).
+    Inverse lookup uses records of each page sorted by v, only the records whose box can reach
+    the position vertically are checked. vboxes are checked separately, they can be as tall as the page.
+    """
+    synctex:    str               # path of synctex file
+    mtime:      int
+    size:       int
+    inputs:     dict[int, str]    # tag -> normalized path of source file
+    unit:       float             # multiplier from raw value of record to big point
+    x_offset:   float             # big point
+    y_offset:   float             # big point
+    kinds:      bytes             # kind of each record
+    tags:       array[int]        # array('i')
+    lines:      array[int]        # array('i')
+    pages:      array[int]        # array('i')
+    h:          array[int]        # array('i'), raw value of synctex file
+    v:          array[int]        # array('i')
+    width:      array[int]        # array('i'), 0 if the record has no size
+    height:     array[int]        # array('i')
+    depth:      array[int]        # array('i')
+    page_start: dict[int, tuple[int, int]] # page -> (first record, end record)
+    keys:       array[int]        # array('q'), (tag << 32 | line) in sorted order
+    order:      array[int]        # array('i'), record index of each key
+    vorder:     array[int]        # array('i'), record index sorted by v in each page, vorder[start:end] is the page
+    vkeys:      array[int]        # array('i'), v of each record of vorder
+    vboxes:     array[int]        # array('i'), record index of vboxes in page order
+    reach:      dict[int, tuple[int, int]] # page -> (max height, max depth) of records except vboxes
+
+    def __init__(self, synctex:str, parse:bool=True):
+        """ parse synctex file and build index, attributes are set by load() if parse is false """
+        self.synctex = os.path.abspath(synctex)
+        # arrays of inverse lookup, they are built by build_pages() or set by load()
+        self.vorder, self.vkeys, self.vboxes = array('i'), array('i'), array('i')
+        self.reach = {}
+        if not parse:
+            return
+        stat = os.stat(self.synctex)
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+        opener = gzip.open if self.synctex.endswith('.gz') else open
+        with opener(self.synctex, 'rb') as f:
+            data = f.read()
+        self.parse(data)
+
+    def parse(self, data:bytes) -> None:
+        """ read records of synctex file to arrays """
+        content_pos = data.find(b'\nContent:')
+        preamble = data[:content_pos if content_pos >= 0 else len(data)]
+        values = {m.group('key'): float(m.group('value')) for m in preamble_regex.finditer(preamble)}
+        magnification = values.get(b'Magnification', 1000) or 1000
+        self.unit = values.get(b'Unit', 1) * magnification / 1000 / SP_PER_BP
+        self.x_offset = values.get(b'X Offset', 0) * self.unit
+        self.y_offset = values.get(b'Y Offset', 0) * self.unit
+
+        basedir = os.path.dirname(self.synctex)
+        self.inputs = {}
+        self.page_start = {}
+        records:list[tuple[bytes, ...]] = []
+        pages:list[int] = []
+        page = 0
+        # findall() and conversion of each column are much faster than group() of each match
+        for row in record_regex.findall(data):
+            if row[0]:
+                records.append(row)
+                pages.append(page)
+            elif row[8]:
+                self.close_page(page, len(records))
+                page = int(row[8])
+                self.page_start[page] = (len(records), len(records))
+            else:
+                # relative path is based on the directory where latex engine runs
+                path = os.fsdecode(row[10].strip())
+                self.inputs[int(row[9])] = normalize(os.path.join(basedir, path))
+        self.close_page(page, len(records))
+
+        self.kinds = b''.join([row[0] for row in records])
+        self.tags, self.lines = (array('i', [int(row[i]) for row in records]) for i in (1, 2))
+        self.pages = array('i', pages)
+        self.h, self.v = (array('i', [int(row[i]) for row in records]) for i in (3, 4))
+        self.width, self.height, self.depth = (array('i', [int(row[i] or 0) for row in records]) for i in (5, 6, 7))
+
+        # sort records by (tag, line) for forward lookup, records of the same line keep page order
+        keys = [tag << 32 | line for tag, line in zip(self.tags, self.lines)]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.order = array('i', order)
+        self.keys = array('q', (keys[i] for i in order))
+        self.build_pages()
+
+    def build_pages(self) -> None:
+        """ sort records of each page by v for inverse lookup """
+        vorder = list(range(len(self.kinds))) # records out of pages (invalid synctex) keep their position
+        self.reach = {}
+        for page, (start, end) in self.page_start.items():
+            vorder[start:end] = sorted(range(start, end), key=self.v.__getitem__)
+            boxes = [i for i in range(start, end) if self.kinds[i] not in VBOX_KINDS]
+            self.reach[page] = (max((self.height[i] for i in boxes), default=0),
+                                max((self.depth[i] for i in boxes), default=0))
+        self.vorder = array('i', vorder)
+        self.vkeys = array('i', (self.v[i] for i in vorder))
+        self.vboxes = array('i', (i for i in range(len(self.kinds)) if self.kinds[i] in VBOX_KINDS))
+
+    def close_page(self, page:int, end:int) -> None:
+        """ set the end record of page """
+        if page in self.page_start:
+            self.page_start[page] = (self.page_start[page][0], end)
+
+    def is_valid(self) -> bool:
+        """ check synctex file is not changed since indexing """
+        try:
+            stat = os.stat(self.synctex)
+        except OSError:
+            return False
+        return stat.st_mtime_ns == self.mtime and stat.st_size == self.size
+
+    def get_tag(self, file:str) -> int|None:
+        """ get tag of source file """
+        file = normalize(file)
+        for tag, path in self.inputs.items():
+            if path == file:
+                return tag
+        return None
+
+    def forward(self, file:str, line:int) -> ForwardResult|None:
+        """
+        get position in pdf of source line
+
+        Args:
+            file(str) : path of source file
+            line(int) : line number of source file
+
+        Return:
+            result(ForwardResult) : the first box of the line. If the line has no record (e.g. comment line),
+                                    the nearest next line is used, the previous line if there are no next line.
+                                    None if the file is not included in synctex file.
+        """
+        tag = self.get_tag(file)
+        if tag is None:
+            return None
+        lo = bisect_left(self.keys, tag << 32)
+        hi = bisect_left(self.keys, (tag + 1) << 32)
+        if lo >= hi:
+            return None
+        pos = bisect_left(self.keys, tag << 32 | line, lo, hi)
+        if pos >= hi:
+            pos = bisect_left(self.keys, self.keys[hi - 1], lo, hi) # after the last line, use the last line
+        end = bisect_right(self.keys, self.keys[pos], pos, hi)
+
+        # prefer hbox (a line of text) to vbox which may contain the whole page, other records are points
+        candidates = [self.order[i] for i in range(pos, end) if self.width[self.order[i]] > 0]
+        hboxes = [i for i in candidates if self.kinds[i] in HBOX_KINDS]
+        idx = (hboxes or candidates or [self.order[pos]])[0]
+        return {
+            'page': self.pages[idx],
+            'x': self.h[idx] * self.unit + self.x_offset,
+            'y': (self.v[idx] - self.height[idx]) * self.unit + self.y_offset,
+            'width': self.width[idx] * self.unit,
+            'height': (self.height[idx] + self.depth[idx]) * self.unit,
+        }
+
+    def inverse(self, page:int, x:float, y:float) -> InverseResult|None:
+        """
+        get source line of position in pdf
+
+        Args:
+            page(int) : page number starts with 1
+            x(float) : big point from the left of page
+            y(float) : big point from the top of page
+
+        Return:
+            result(InverseResult) : source of the smallest box which contains the position.
+                                    If no box contains it, the nearest record is used.
+                                    None if the page has no record.
+        """
+        start, end = self.page_start.get(page, (0, 0))
+        h = (x - self.x_offset) / self.unit # compare with raw values of records
+        v = (y - self.y_offset) / self.unit
+        idx = self.find_box(page, start, end, h, v)
+        if idx < 0:
+            idx = self.find_nearest(start, end, h, v)
+        if idx < 0:
+            return None
+        return {'file': self.inputs[self.tags[idx]], 'line': self.lines[idx]}
+
+    def is_source(self, i:int) -> bool:
+        """ check the record has source line """
+        return self.lines[i] > 0 and self.tags[i] in self.inputs
+
+    def find_box(self, page:int, start:int, end:int, h:float, v:float) -> int:
+        """
+        get the smallest box of page which contains the position, -1 if there are no box.
+        The box of record contains v if v - depth <= record v <= v + height,
+        so only records in this range of max height / depth of the page are checked with vboxes.
+        Boxes of the same area are ordered by record index.
+        """
+        max_height, max_depth = self.reach.get(page, (0, 0))
+        lo = bisect_left(self.vkeys, v - max_depth, start, end)
+        hi = bisect_right(self.vkeys, v + max_height, start, end)
+        vbox_lo = bisect_left(self.vboxes, start)
+        vbox_hi = bisect_left(self.vboxes, end)
+        best, best_area = -1, 0
+        for i in (*self.vorder[lo:hi], *self.vboxes[vbox_lo:vbox_hi]):
+            width = self.width[i]
+            if width > 0 and self.h[i] <= h <= self.h[i] + width \
+                and self.v[i] - self.height[i] <= v <= self.v[i] + self.depth[i] and self.is_source(i):
+                area = width * (self.height[i] + self.depth[i])
+                if best < 0 or (area, i) < (best_area, best):
+                    best, best_area = i, area
+        return best
+
+    def find_nearest(self, start:int, end:int, h:float, v:float) -> int:
+        """
+        get the nearest record of page from the position (distance is |dh| + |dv|), -1 if there are no record.
+        Records are visited from v of the position to both sides, it stops when |dv| is larger than the nearest.
+        """
+        nearest, nearest_dist = -1, 0.0
+        pos = bisect_left(self.vkeys, v, start, end)
+        below, above = pos, pos - 1
+        while below < end or above >= start:
+            # visit the side whose v is closer to the position
+            if above < start or (below < end and self.vkeys[below] - v <= v - self.vkeys[above]):
+                j, below = below, below + 1
+            else:
+                j, above = above, above - 1
+            if nearest >= 0 and abs(self.vkeys[j] - v) > nearest_dist:
+                break
+            i = self.vorder[j]
+            if not self.is_source(i):
+                continue
+            dist = abs(self.h[i] - h) + abs(self.v[i] - v)
+            if nearest < 0 or (dist, i) < (nearest_dist, nearest):
+                nearest, nearest_dist = i, dist
+        return nearest
+
+    def dump(self, f:BinaryIO) -> None:
+        """
+        write index to file. Arrays are written as raw bytes after json header,
+        so the index is loaded without parsing synctex file and without pickle.
+        """
+        arrays = {name: getattr(self, name) for name in INDEX_ARRAYS}
+        header = {
+            'version': INDEX_VERSION,
+            'byteorder': sys.byteorder,
+            'synctex': self.synctex,
+            'mtime': self.mtime,
+            'size': self.size,
+            'inputs': self.inputs,
+            'unit': self.unit,
+            'x_offset': self.x_offset,
+            'y_offset': self.y_offset,
+            'page_start': self.page_start,
+            'reach': self.reach,
+            'kinds': len(self.kinds),
+            'arrays': {name: [a.typecode, a.itemsize, len(a)] for name, a in arrays.items()},
+        }
+        data = json.dumps(header).encode('utf-8')
+        _ = f.write(INDEX_MAGIC + struct.pack('<I', len(data)) + data + self.kinds)
+        for a in arrays.values():
+            a.tofile(f)
+
+    @classmethod
+    def load(cls, f:BinaryIO) -> SyncTexIndex|None:
+        """
+        read index which is written by dump(), None if it is written by other version or machine.
+        It raises EOFError / ValueError if index file is broken, load_index() builds the index again.
+        """
+        if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            return None
+        size, = struct.unpack('<I', f.read(4))
+        header:dict[str, Any] = json.loads(f.read(size))
+        if header.get('version') != INDEX_VERSION or header.get('byteorder') != sys.byteorder:
+            return None
+        index = cls(header['synctex'], parse=False)
+        index.mtime = header['mtime']
+        index.size = header['size']
+        index.inputs = {int(tag): path for tag, path in header['inputs'].items()} # json key is string
+        index.unit = header['unit']
+        index.x_offset = header['x_offset']
+        index.y_offset = header['y_offset']
+        index.page_start = {int(page): (start, end) for page, (start, end) in header['page_start'].items()}
+        index.reach = {int(page): (height, depth) for page, (height, depth) in header['reach'].items()}
+        index.kinds = f.read(header['kinds'])
+        for name in INDEX_ARRAYS:
+            typecode, itemsize, length = header['arrays'][name]
+            a = array(typecode)
+            if a.itemsize != itemsize:
+                return None
+            a.fromfile(f, length)
+            setattr(index, name, a)
+        return index
+
+
+def normalize(file:str) -> str:
+    """ normalize path of source file to compare paths of synctex file and neovim """
+    return os.path.normcase(os.path.normpath(paths.path_normalize(os.path.abspath(file))))
+
+
+def find_synctex(pdf_or_synctex:str) -> str|None:
+    """ get synctex file from pdf path (or synctex path itself) """
+    if pdf_or_synctex.endswith(('.synctex.gz', '.synctex')):
+        return pdf_or_synctex if os.path.exists(pdf_or_synctex) else None
+    base = os.path.splitext(pdf_or_synctex)[0]
+    for ext in ('.synctex.gz', '.synctex'):
+        if os.path.exists(base + ext):
+            return base + ext
+    return None
+
+
+def get_index_dir() -> Path:
+    """ get directory to save index of synctex files """
+    return paths.get_data_dir() / 'synctex'
+
+
+def get_index_file(synctex:str) -> Path:
+    """ get file path to save index of synctex file """
+    key = hashlib.blake2b(os.path.abspath(synctex).encode('utf-8'), digest_size=16).hexdigest()
+    return get_index_dir() / (key + '.index')
+
+
+def load_index(synctex:str) -> SyncTexIndex|None:
+    """ load index from data directory if synctex file is not changed """
+    try:
+        with open(get_index_file(synctex), 'rb') as f:
+            index = SyncTexIndex.load(f)
+        if index is not None and index.synctex == os.path.abspath(synctex) and index.is_valid():
+            os.utime(get_index_file(synctex)) # the most recently used index is evicted at last
+            return index
+    except Exception:
+        pass # broken or old index, build it again
+    return None
+
+
+def save_index(index:SyncTexIndex) -> None:
+    """ save index to data directory and remove least recently used index files """
+    index_dir = get_index_dir()
+    try:
+        index_dir.mkdir(parents=True, exist_ok=True)
+        index_file = get_index_file(index.synctex)
+        tmp_file = index_file.with_name(f'{index_file.stem}.{os.getpid()}.tmp')
+        with open(tmp_file, 'wb') as f:
+            index.dump(f)
+        os.replace(tmp_file, index_file)
+
+        for old_file in index_dir.glob('*.pickle'): # index files of previous version
+            old_file.unlink(missing_ok=True)
+        files = sorted(index_dir.glob('*.index'), key=lambda file: file.stat().st_mtime, reverse=True)
+        for file in files[INDEX_MAX_FILES:]:
+            file.unlink(missing_ok=True)
+    except OSError:
+        pass # index file is optional, it will be built again
+
+
+_indexes:dict[str, SyncTexIndex] = {} # index of this process (e.g. neovim python host)
+
+
+def get_index(synctex:str) -> SyncTexIndex:
+    """
+    get index of synctex file. It is built once and reused until synctex file is changed.
+    The index is kept in memory of this process and saved in data directory
+    for the next process (InverseSearch.py runs at every click).
+
+    Args:
+        synctex(str) : path of *.synctex.gz or *.synctex
+    """
+    key = os.path.abspath(synctex)
+    index = _indexes.get(key)
+    if index is None or not index.is_valid():
+        index = load_index(key)
+        if index is None:
+            index = SyncTexIndex(key)
+            save_index(index)
+        _indexes[key] = index
+    return index
+
+
+def forward(synctex:str, file:str, line:int) -> ForwardResult|None:
+    """ get position in pdf of source line, see SyncTexIndex.forward() """
+    return get_index(synctex).forward(file, line)
+
+
+def inverse(synctex:str, page:int, x:float, y:float) -> InverseResult|None:
+    """ get source line of position in pdf, see SyncTexIndex.inverse() """
+    return get_index(synctex).inverse(page, x, y)
+
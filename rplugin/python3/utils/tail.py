@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from . import paths
+from .parser import ParseState
+
+TAIL_MAX_FILES = 32 # the number of log files to keep parser state across projects
+
+
+def get_state_dir() -> Path:
+    """ get directory to save parser state of log files """
+    return paths.get_data_dir() / 'tail'
+
+
+def get_state_file(logfile:str) -> Path:
+    """
+    get file path to save parser state of log file.
+    Each log file has its own state file whose name is hash of its absolute path.
+    """
+    key = hashlib.blake2b(os.path.abspath(logfile).encode('utf-8'), digest_size=16).hexdigest()
+    return get_state_dir() / (key + '.json')
+
+
+def load_state(logfile:str) -> ParseState:
+    """ load parser state of log file, return new state if it is not saved before """
+    state_file = get_state_file(logfile)
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return ParseState.from_dict(json.load(f))
+    except (OSError, ValueError):
+        return ParseState()
+
+
+def save_state(logfile:str, state:ParseState) -> None:
+    """ save parser state of log file to continue parsing at the next call and remove states of old log files """
+    state_file = get_state_file(logfile)
+    try:
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = state_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp_file, state_file) # replace atomically to avoid broken state with concurrent call
+        files = sorted(get_state_dir().glob('*.json'), key=lambda file: file.stat().st_mtime, reverse=True)
+        for file in files[TAIL_MAX_FILES:]:
+            file.unlink(missing_ok=True)
+    except OSError:
+        pass # state is cache only, full parsing will be done at the next call
@@ -0,0 +1,88 @@
+# opt-in trace of log parse pipeline
+# Set TEXFLOW_TRACE to enable it, each phase is written as one json line.
+#   TEXFLOW_TRACE=1 (or stderr) : write to stderr
+#   TEXFLOW_TRACE=<file path>   : append to the file
+# Phases can be nested (e.g. scan in get_matches_all), disabled trace costs one check per phase.
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+ENV_NAME = 'TEXFLOW_TRACE'
+
+target:str|None = os.environ.get(ENV_NAME) or None # destination of trace, None if it is disabled
+
+
+def enable(dest:str='stderr') -> None:
+    """
+    enable trace at runtime (e.g. --trace of LogParser.py)
+    It is set to environment variable also, worker processes of parallel parsing write trace too.
+    """
+    global target
+    target = dest
+    os.environ[ENV_NAME] = dest
+
+
+def enabled() -> bool:
+    """ check trace is enabled """
+    return target is not None
+
+
+def peak_rss_kb() -> int|None:
+    """ get peak resident memory of this process in KB, None if it is not supported (Windows) """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss # darwin reports bytes
+
+
+def emit(event:dict[str, Any]) -> None:
+    """ write one trace event as json line """
+    if target is None:
+        return
+    line = json.dumps(event, ensure_ascii=False, default=str)
+    if target in ('1', 'stderr'):
+        print(line, file=sys.stderr, flush=True)
+        return
+    try:
+        with open(target, 'a', encoding='utf-8') as f:
+            _ = f.write(line + '\n')
+    except OSError:
+        pass # trace must not break parsing
+
+
+@contextmanager
+def phase(name:str, **fields:Any) -> Iterator[dict[str, Any]]:
+    """
+    measure wall time of phase and emit it with fields
+
+    Args:
+        name(str) : name of phase
+        fields : information of phase (e.g. file, bytes), the yielded dict can be updated in the phase
+
+    Usage:
+        with trace.phase('read', file=file) as ph:
+            contents = f.read()
+            ph['bytes'] = len(contents)
+    """
+    if target is None:
+        yield fields
+        return
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        emit({
+            'phase': name,
+            'ms': round((time.perf_counter() - start) * 1000, 3),
+            **fields,
+            'pid': os.getpid(),
+            'peak_rss_kb': peak_rss_kb(),
+        })
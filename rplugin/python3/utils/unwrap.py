@@ -0,0 +1,105 @@
+# rejoin lines of log file which are wrapped by TeX at max_print_line
+#
+# TeX breaks the line of log file whenever it has max_print_line characters (79 by default),
+# so file paths and messages are split into multiple lines if max_print_line is not increased in texmf.cnf.
+# TeX counts bytes in pdfTeX and characters in XeTeX / LuaTeX, a line of exactly the width in either unit
+# is continued to the next line except:
+#   - the next line is empty     : the message ended at the width and TeX wrote its own new line after wrapping
+#   - the next line is a message : TeX starts messages at the beginning of line (print_nl / \write),
+#                                  they are not wrapped part of the previous line
+#   - the next line is an error of -file-line-error : it starts with file path, not with fixed prefix (./main.tex:12:)
+#   - the line ends with file path which exists, but the path joined with the next line doesn't exist
+from __future__ import annotations
+
+import re
+from collections.abc import Callable
+from functools import cache
+
+from . import patterns
+
+# prefixes of messages which start at the beginning of line, '(' / ')' can be a wrapped part of line
+message_prefixes = tuple(prefix.encode('ascii') for name, prefixes in patterns.dispatch_prefixes.items()
+                         if prefixes and name not in ('filestart', 'fileend') for prefix in prefixes)
+path_head_regex = re.compile(rb'[^\s()]*') # the first part of the next line which can continue file path
+# head of error1 (./main.tex:12:), it can be in the next line of page numbers [1] [2] ... which have the width
+error1_head_regex = re.compile(re.escape(patterns.dispatch_contains['error1'].encode('ascii')) + rb'\d+:')
+
+
+@cache
+def get_line_regex(width:int) -> re.Pattern[bytes]:
+    r"""
+    get pattern of lines which have width bytes or more except of the first line.
+    It starts with literal \n, so the lines are found without trying the pattern at every position.
+    \r of the line is included, [^\n] is much faster than [^\r\n].
+    """
+    return re.compile(rb'\n([^\n]{%d,})' % width)
+
+
+def is_wrapped(line:bytes, next_line:bytes, width:int, encoding:str, exists:Callable[[str], bool]) -> bool:
+    """
+    check the line is wrapped by TeX and continued to the next line
+
+    Args:
+        line(bytes) : line without new line characters
+        next_line(bytes) : the next line without new line characters
+        width(int) : max_print_line of log file
+        encoding(str) : encoding of log file, to count characters of XeTeX / LuaTeX log
+        exists(Callable) : check the file path exists, relative path is based on compile directory
+    """
+    if len(line) != width and (len(line) < width or len(line.decode(encoding, errors='replace')) != width):
+        return False
+    if not next_line.rstrip(b'\r') or next_line.startswith(message_prefixes) or error1_head_regex.search(next_line):
+        return False
+
+    # the line ends with file path, e.g. (/usr/share/texlive/texmf-dist/tex/latex/base/artic + le.cls
+    start = line.rfind(b'(')
+    if start >= 0:
+        path = line[start + 1:]
+        head = path_head_regex.match(next_line)
+        if path and head and head.group() and b' ' not in path and b')' not in path:
+            decoded = path.decode(encoding, errors='replace')
+            if exists(decoded) and not exists(decoded + head.group().decode(encoding, errors='replace')):
+                return False # the path is complete at the end of line
+    return True
+
+
+def unwrap_lines(data:bytes, width:int, encoding:str|None, exists:Callable[[str], bool]) -> bytes:
+    """
+    rejoin lines of data which are wrapped at max_print_line
+
+    Args:
+        data(bytes) : part of log file which starts at the beginning of line
+        width(int) : max_print_line of log file
+        encoding(str) : encoding of log file
+        exists(Callable) : check the file path exists, it is called for the end of wrapped line only
+
+    Return:
+        data(bytes) : data without new lines of wrapping, it is data itself if nothing is wrapped
+    """
+    encoding = encoding or 'utf-8'
+    first_end = data.find(b'\n')
+    if first_end < 0:
+        return data
+    spans = [(0, first_end)]
+    spans.extend(m.span(1) for m in get_line_regex(width).finditer(data))
+
+    cuts:list[tuple[int, int]] = [] # (start, end) of new line characters to remove
+    for start, newline in spans:
+        end = newline - 1 if data[newline - 1:newline] == b'\r' else newline
+        if end - start < width or newline >= len(data):
+            continue
+        next_start = newline + 1
+        next_end = data.find(b'\n', next_start)
+        next_line = data[next_start:next_end if next_end >= 0 else len(data)]
+        if is_wrapped(data[start:end], next_line, width, encoding, exists):
+            cuts.append((end, next_start))
+    if not cuts:
+        return data
+
+    pieces:list[bytes] = []
+    pos = 0
+    for start, end in cuts:
+        pieces.append(data[pos:start])
+        pos = end
+    pieces.append(data[pos:])
+    return b''.join(pieces)